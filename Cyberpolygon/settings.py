@@ -14,6 +14,7 @@ from pathlib import Path
 import os
 import logging.config
 import sys
+import tempfile
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -56,6 +57,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'interface.instrumentation.RequestTimingMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -111,6 +113,48 @@ else:
         }
     }
 
+# Общий для всех воркеров gunicorn кэш (таблицы результатов и т.п.)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'cyberpolygon_cache')),
+    }
+}
+if 'test' in sys.argv:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Потоки server-sent events: время жизни одного соединения и период проверки изменений (секунды)
+SSE_STREAM_LIFETIME = int(os.environ.get('SSE_STREAM_LIFETIME', 300))
+SSE_POLL_INTERVAL = int(os.environ.get('SSE_POLL_INTERVAL', 2))
+
+# Параллельное создание лаб в PNET: размер пула и лимит одновременных операций на один хост PNET
+PROVISIONING_WORKERS = int(os.environ.get('PROVISIONING_WORKERS', 8))
+PNET_HOST_CONCURRENCY = int(os.environ.get('PNET_HOST_CONCURRENCY', 4))
+# Очистка после экзамена: не больше PNET_CLEANUP_RATE удалений лаб в секунду
+# и PNET_CLEANUP_CONCURRENCY одновременно на один хост PNET
+PNET_CLEANUP_RATE = float(os.environ.get('PNET_CLEANUP_RATE', 5))
+PNET_CLEANUP_CONCURRENCY = int(os.environ.get('PNET_CLEANUP_CONCURRENCY', 4))
+# Сколько элементов топологии лабы (узлов, сетей, соединений) отправлять в PNET одновременно
+PNET_TOPOLOGY_WINDOW = int(os.environ.get('PNET_TOPOLOGY_WINDOW', 8))
+# Сколько правок пользователей PNET отправлять одновременно при синхронизации
+PNET_USER_SYNC_CONCURRENCY = int(os.environ.get('PNET_USER_SYNC_CONCURRENCY', 8))
+# Как часто (в секундах) runapscheduler выбирает задания из очереди подготовки лаб
+PROVISIONING_POLL_INTERVAL = int(os.environ.get('PROVISIONING_POLL_INTERVAL', 5))
+# Через сколько минут после окончания соревнования удаляются лабы участников и команд
+LAB_TEARDOWN_GRACE = int(os.environ.get('LAB_TEARDOWN_GRACE', 60))
+TEAM_LAB_TEARDOWN_GRACE = int(os.environ.get('TEAM_LAB_TEARDOWN_GRACE', 10))
+# Elasticsearch: размер пула соединений общего клиента и число одновременных запросов в массовых операциях
+ELASTIC_CONNECTIONS_PER_NODE = int(os.environ.get('ELASTIC_CONNECTIONS_PER_NODE', 16))
+ELASTIC_BULK_CONCURRENCY = int(os.environ.get('ELASTIC_BULK_CONCURRENCY', 8))
+# Замеры запросов: заголовок Server-Timing (по умолчанию выключен)
+# и токен, с которым /metrics доступен без входа (Authorization: Bearer <токен>); пустой — только сотрудникам
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'False') == 'True'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
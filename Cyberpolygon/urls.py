@@ -19,6 +19,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from interface.views import registration, change_password
+from interface.instrumentation import metrics
 
 admin.site.site_url = '/cyberpolygon/lab_menu'
 
@@ -32,7 +33,8 @@ urlpatterns = [
     path("select2/", include("django_select2.urls")),
     path("accounts/", include("django.contrib.auth.urls")),
     path("registration/change_password", change_password, name="change_password"),
-    path('api/', include(('interface.api_urls', 'interface'), namespace='interface_api'))
+    path('api/', include(('interface.api_urls', 'interface'), namespace='interface_api')),
+    path('metrics', metrics, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -4,4 +4,8 @@ from django.apps import AppConfig
 class DynamicConfigConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dynamic_config'
-    verbose_name = 'Конфигурация'
\ No newline at end of file
+    verbose_name = 'Конфигурация'
+
+    def ready(self):
+        # Подключаем сброс снимка конфигурации при изменении записей
+        from . import utils  # noqa: F401
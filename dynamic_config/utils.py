@@ -1,12 +1,70 @@
+"""
+Чтение динамической конфигурации.
+
+Все записи ``ConfigEntry`` загружаются в неизменяемый снимок процесса, и чтение
+ключа стоит поиска в словаре. Сохранение или удаление записи меняет общую версию
+в кэше Django; каждый процесс сверяет версию не чаще раза в секунду и при
+расхождении перечитывает снимок одним запросом.
+"""
+import threading
+import time
+from types import MappingProxyType
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
 from .models import ConfigEntry
 
+CONFIG_VERSION_KEY = "dynamic_config_version"
+# Как часто (в секундах) процесс сверяет версию снимка с общей
+SNAPSHOT_CHECK_INTERVAL = 1.0
+
+_snapshot = None
+_snapshot_version = None
+_checked_at = 0.0
+_snapshot_lock = threading.Lock()
+
+
+def _shared_version():
+    version = cache.get(CONFIG_VERSION_KEY)
+    if version is None:
+        cache.add(CONFIG_VERSION_KEY, uuid4().hex, None)
+        version = cache.get(CONFIG_VERSION_KEY)
+    return version
+
+
+def get_snapshot():
+    """Возвращает актуальный снимок конфигурации (только для чтения)."""
+    global _snapshot, _snapshot_version, _checked_at
+
+    now = time.monotonic()
+    if _snapshot is not None and now - _checked_at < SNAPSHOT_CHECK_INTERVAL:
+        return _snapshot
+
+    with _snapshot_lock:
+        if _snapshot is not None and now - _checked_at < SNAPSHOT_CHECK_INTERVAL:
+            return _snapshot
+        version = _shared_version()
+        if _snapshot is None or version != _snapshot_version:
+            _snapshot = MappingProxyType(dict(ConfigEntry.objects.values_list('key', 'value')))
+            _snapshot_version = version
+        _checked_at = now
+        return _snapshot
+
+
+def invalidate():
+    """Сбрасывает снимок этого процесса и меняет общую версию для остальных."""
+    global _snapshot
+
+    cache.set(CONFIG_VERSION_KEY, uuid4().hex, None)
+    with _snapshot_lock:
+        _snapshot = None
+
 
 def get_config(key, default=None):
-    try:
-        entry = ConfigEntry.objects.get(key=key)
-        return entry.value
-    except ConfigEntry.DoesNotExist:
-        return default
+    return get_snapshot().get(key, default)
 
 
 def get_bool_config(key, default=False):
@@ -24,4 +82,15 @@ def get_elastic_config():
         'password': get_config('ELASTIC_PASSWORD', 'elastic'),
         'use_https': get_bool_config('ELASTIC_USE_HTTPS', True),  # По умолчанию HTTP для development
         'ca_cert_path': get_config('ELASTIC_CA_CERT_PATH', 'sre/compose/certs/ca/ca.crt'),
-    }
\ No newline at end of file
+    }
+
+
+def on_config_changed(sender, **kwargs):
+    # Сразу — чтобы этот процесс видел изменение, и после коммита — чтобы другие
+    # процессы не закэшировали снимок, прочитанный до фиксации транзакции
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+post_save.connect(on_config_changed, sender=ConfigEntry)
+post_delete.connect(on_config_changed, sender=ConfigEntry)
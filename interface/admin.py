@@ -1,8 +1,9 @@
 import random
 import json
 import logging
+import uuid
 
-from django.contrib import admin
+from django.contrib import admin, messages
 from django_summernote.admin import SummernoteModelAdmin
 from django.contrib.auth.admin import UserAdmin
 from django_json_widget.widgets import JSONEditorWidget
@@ -16,11 +17,21 @@ from .forms import (
     KkzLabInlineForm,
     Competition2UserInlineForm,
     LabForm,
+    RosterImportForm,
 )
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseRedirect
+from django.shortcuts import get_object_or_404
 from django.db.models import DurationField, JSONField
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.db import transaction
+from django.utils import timezone
 from django_apscheduler.admin import DjangoJob, DjangoJobExecution
 
+from .elastic_utils import user_deletion_batch
+from .onboarding import read_roster
+
 
 class CustomJSONEditorWidget(JSONEditorWidget):
     class Media:
@@ -172,6 +183,62 @@ class MyUserAdmin(UserAdmin):
     list_filter = ("is_staff", "platoon")
     search_fields = ("first_name", "last_name")
     exclude = ('pnet_login', )
+    change_list_template = 'admin/interface/user/change_list.html'
+
+    def delete_queryset(self, request, queryset):
+        # Пользователи Elasticsearch удаляются одним пакетом, а не по одному на сигнал post_delete
+        with user_deletion_batch():
+            super().delete_queryset(request, queryset)
+
+    def get_urls(self):
+        urls = [
+            path('import-roster/', self.admin_site.admin_view(self.import_roster_view), name='interface_user_import_roster'),
+        ]
+        return urls + super().get_urls()
+
+    def import_roster_view(self, request):
+        """
+        Массовое зачисление студентов из CSV или JSON. Список ставится в очередь заданий,
+        страница задания показывает его статус и итог по каждому студенту.
+        """
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        job = None
+        if request.GET.get('job'):
+            job = get_object_or_404(ProvisioningJob, pk=request.GET['job'], kind=ProvisioningJob.Kind.ROSTER_IMPORT)
+        form = RosterImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            roster = form.cleaned_data['roster']
+            try:
+                rows = read_roster(roster, roster.name)
+            except ValueError as e:
+                form.add_error('roster', f'Не удалось прочитать список: {e}')
+            else:
+                # Пароли в данные задания не попадают: список хранится отдельно и удаляется
+                # после первой же попытки, поэтому повтор — новая загрузка того же списка
+                with transaction.atomic():
+                    job = ProvisioningJob.objects.create(
+                        kind=ProvisioningJob.Kind.ROSTER_IMPORT,
+                        idempotency_key=f'roster:{uuid.uuid4().hex}',
+                        payload={'students': len(rows)},
+                        max_attempts=1,
+                    )
+                    RosterImport.objects.create(job=job, rows=rows)
+                messages.info(request, f'Список из {len(rows)} студентов поставлен в очередь')
+                return HttpResponseRedirect(f'{request.path}?job={job.pk}')
+
+        outcomes = job.payload.get('outcomes') if job else None
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            title='Зачисление студентов из списка',
+            form=form,
+            job=job,
+            in_progress=job is not None and job.status in (ProvisioningJob.Status.PENDING, ProvisioningJob.Status.RUNNING),
+            outcomes=outcomes,
+            failed=sum(bool(outcome['error']) for outcome in outcomes or []),
+        )
+        return TemplateResponse(request, 'admin/interface/user/import_roster.html', context)
 
 
 class Competition2UserInline(admin.TabularInline):
@@ -408,6 +475,29 @@ class PlatoonAdmin(admin.ModelAdmin):
     list_display = ('number', 'learning_year')
 
 
+class ProvisioningJobAdmin(admin.ModelAdmin):
+    model = ProvisioningJob
+    list_display = ('kind', 'status', 'group', 'attempts', 'run_after', 'updated_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('idempotency_key', 'group')
+    readonly_fields = ('payload', 'lease')
+    actions = ['retry_jobs']
+
+    @admin.action(description='Повторить выбранные задания')
+    def retry_jobs(self, request, queryset):
+        queryset.filter(status=ProvisioningJob.Status.FAILED).update(
+            status=ProvisioningJob.Status.PENDING, attempts=0, run_after=timezone.now()
+        )
+
+
+class DeletedDuplicateAdmin(admin.ModelAdmin):
+    model = DeletedDuplicate
+    list_display = ('model', 'object_id', 'kept_id', 'deleted_at')
+    list_filter = ('model',)
+    search_fields = ('object_id', 'kept_id')
+    readonly_fields = ('model', 'object_id', 'kept_id', 'data', 'deleted_at')
+
+
 admin.site.register(Lab, LabModelAdmin)
 admin.site.register(Platoon, PlatoonAdmin)
 admin.site.register(Competition, CompetitionAdmin)
@@ -418,4 +508,6 @@ admin.site.register(TeamCompetition, TeamCompetitionAdmin)
 # admin.site.register(TeamCompetition2Team, admin.ModelAdmin)
 admin.site.unregister(DjangoJob)
 admin.site.unregister(DjangoJobExecution)
-admin.site.register(Kkz, KkzAdmin)
\ No newline at end of file
+admin.site.register(Kkz, KkzAdmin)
+admin.site.register(ProvisioningJob, ProvisioningJobAdmin)
+admin.site.register(DeletedDuplicate, DeletedDuplicateAdmin)
\ No newline at end of file
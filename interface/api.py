@@ -8,24 +8,25 @@ from interface.utils import get_kibana_url
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.db.models import Q
 from datetime import timedelta, datetime
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_GET, require_POST
 
 
-from .models import Competition, LabLevel, Lab, LabTask, Answers, User, TeamCompetition, LabTasksType, Kkz, Platoon, LabType, KkzPreview, Competition2User
+from .models import Competition, LabLevel, Lab, LabTask, Answers, User, TeamCompetition, LabTasksType, Kkz, Platoon, LabType, KkzPreview, Competition2User, ProvisioningJob
 from .serializers import LabLevelSerializer, LabTaskSerializer
 from .api_utils import get_issue
+from . import scoreboard_cache, competition_events, jobs, lab_catalogue, progress
 from .config import get_pnet_base_dir, get_pnet_url, get_web_url
 from .utils import get_pnet_lab_name
+from .instrumentation import KIBANA, PNET, track_session
 
 
 @api_view(['GET'])
@@ -51,156 +52,18 @@ def get_time(request, competition_id):  # pragma: no cover
         return Response({'error': 'Competition not found'}, status=404)
 
 
-def make_solution_data(solution, competition):
-    user = User.objects.get(pk=solution["user_id"])
-    return {
-        "pos": 0,
-        "user_first_name": user.first_name,
-        "user_last_name": user.last_name,
-        "user_platoon": str(user.platoon),
-        "spent": str(solution["datetime"] - competition.start).split(".")[0] if solution["datetime"] else "",
-        "datetime": solution["datetime"].strftime("%H:%M:%S") if solution["datetime"] else "",
-        "raw_datetime": solution["datetime"],
-        "team_name": "",
-        "user_id": solution["user_id"]
-    }
-
-
 @api_view(['GET'])
 def get_solutions(request, slug):
-    try:
-        competition = TeamCompetition.objects.get(slug=slug)
-    except TeamCompetition.DoesNotExist:
-        competition = get_object_or_404(Competition, slug=slug)
-    total_tasks = competition.num_tasks
-    is_team_competition = hasattr(competition, 'teams')
-
-    all_individual_users = User.objects.filter(
-        platoon__in=competition.platoons.all()) | competition.non_platoon_users.all()
-    if is_team_competition:
-        team_user_ids = User.objects.filter(team__in=competition.teams.all()).values_list("id", flat=True)
-        all_individual_users = all_individual_users.exclude(id__in=team_user_ids)
-
-    individual_filter = Q(user__isnull=False) & (
-            Q(user__platoon__in=competition.platoons.all()) |
-            Q(user__in=competition.non_platoon_users.all())
-    )
-    individual_answers_qs = Answers.objects.filter(
-        individual_filter,
-        lab=competition.lab,
-        datetime__lte=competition.finish,
-        datetime__gte=competition.start
-    )
+    entry = scoreboard_cache.get_entry(slug)
+    if entry is None:
+        raise Http404
 
-    # 2a. If team competition, also query team answers.
-    team_answers_qs = Answers.objects.none()
-    if is_team_competition:
-        team_answers_qs = Answers.objects.filter(
-            team__in=competition.teams.all(),
-            lab=competition.lab,
-            datetime__lte=competition.finish,
-            datetime__gte=competition.start,
-            team__isnull=False
-        )
-
-    individual_data = {}
-    for answer in individual_answers_qs:
-        uid = answer.user.id
-        if uid not in individual_data:
-            individual_data[uid] = {
-                'answers': [],
-                'progress': 0,
-                'raw_datetime': answer.datetime
-            }
-        individual_data[uid]['answers'].append(answer)
-        if total_tasks > 0:
-            individual_data[uid]['progress'] = len(individual_data[uid]['answers'])
-        else:
-            individual_data[uid]['progress'] = 1  # if lab has no tasks, a single answer gives progress 1.
-        if answer.datetime > individual_data[uid]['raw_datetime']:
-            individual_data[uid]['raw_datetime'] = answer.datetime
-
-    for user in all_individual_users:
-        if user.id not in individual_data:
-            individual_data[user.id] = {
-                'answers': [],
-                'progress': 0,
-                'raw_datetime': None
-            }
-
-    solutions_data = []
-    # Create solution entries for individual answers.
-    for uid, data in individual_data.items():
-        dummy_solution = {
-            "user_id": uid,
-            "datetime": data['raw_datetime']
-        }
-        sol = make_solution_data(dummy_solution, competition)
-        sol["progress"] = data['progress']
-        solutions_data.append(sol)
-
-    # 4. Process team answers if applicable – group by team.
-    if is_team_competition:
-        team_data = {}
-        for answer in team_answers_qs:
-            tid = answer.team.id
-            if tid not in team_data:
-                team_data[tid] = {
-                    'answers': [],
-                    'progress': 0,
-                    'raw_datetime': answer.datetime,
-                    'team': answer.team
-                }
-            team_data[tid]['answers'].append(answer)
-            if total_tasks > 0:
-                team_data[tid]['progress'] = len(team_data[tid]['answers'])
-            else:
-                team_data[tid]['progress'] = 1
-            if answer.datetime > team_data[tid]['raw_datetime']:
-                team_data[tid]['raw_datetime'] = answer.datetime
-
-        for team in competition.teams.all():
-            if team.id not in team_data:
-                team_data[team.id] = {
-                    'answers': [],
-                    'progress': 0,
-                    'raw_datetime': None,
-                    'team': team
-                }
-
-        # For every team, create a solution entry for each member.
-        for tid, data in team_data.items():
-            team_obj = data['team']
-            for user in team_obj.users.all():
-                dummy_solution = {
-                    "user_id": user.id,
-                    "datetime": data['raw_datetime']
-                }
-                sol = make_solution_data(dummy_solution, competition)
-                sol["progress"] = data['progress']
-                sol["team_name"] = team_obj.name
-                solutions_data.append(sol)
-
-    # 5. Sorting: sort first by progress (descending), then by team_name (if present) and by submission time.
-    solutions_data.sort(key=lambda x: (-x["progress"], x["raw_datetime"], x["team_name"]))
-
-    # Re-assign positions based on sorted order.
-    pos = 1
-    for sol in solutions_data:
-        sol["pos"] = pos
-        pos += 1
-
-    # 3.a. If lab has tasks, include the total_tasks in the JSON.
-    response = {
-        "solutions": solutions_data,
-        "max_total_progress": competition.participants,
-        "total_progress":  sum(solution["progress"] for solution in solutions_data),
-        "total_tasks": 1
-    }
-    if total_tasks:
-        response["max_total_progress"] = competition.participants * total_tasks
-        response["total_tasks"] = total_tasks
-    return JsonResponse(response)
+    if request.headers.get('If-None-Match') == entry['etag']:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entry['content'], content_type='application/json')
+    response['ETag'] = entry['etag']
+    return response
 
 
 @api_view(['GET'])
@@ -251,17 +114,17 @@ def press_button(request, action):  # pragma: no cover
         if action == "start":
             competition.start = timezone.now()
             competition.save()
-            cache.set("competitions_update", True, timeout=60)
+            competition_events.record_competition_change(competition, action)
             return JsonResponse({"redirect_url": competition_url}, status=200)
         elif action == "end":
             competition.finish = timezone.now()
             competition.save()
-            cache.set("competitions_update", True, timeout=60)
+            competition_events.record_competition_change(competition, action)
             return JsonResponse({"message": "Competition ended", "redirect_url": competition_url}, status=200)
         elif action == "resume":
             competition.finish = timezone.now() + timedelta(minutes=15)
             competition.save()
-            cache.set("competitions_update", True, timeout=60)
+            competition_events.record_competition_change(competition, action)
             return JsonResponse({"message": "Competition resumed", "redirect_url": competition_url}, status=200)
         else:
             return JsonResponse({"error": "Unknown action"}, status=400)
@@ -272,11 +135,89 @@ def press_button(request, action):  # pragma: no cover
 
 
 @api_view(['GET'])
-def check_updates(request):  # pragma: no cover
-    last_update = cache.get("competitions_update", False)
-    if last_update:
-        cache.delete("competitions_update")
-    return JsonResponse({"update_required": last_update})
+def check_updates(request):
+    """
+    Лента изменений экзаменов. Клиент передаёт ``since`` — последнюю увиденную ревизию —
+    и получает текущую ревизию и изменения после неё. Без ``since`` возвращается только ревизия.
+    """
+    since = request.GET.get('since')
+    if since is not None:
+        if not since.isdigit():
+            return JsonResponse({"error": "since must be a non-negative integer"}, status=400)
+        since = int(since)
+
+    revision, changes = competition_events.competition_changes(since)
+    return JsonResponse(
+        {"revision": revision, "changes": changes, "update_required": bool(changes)},
+        encoder=DjangoJSONEncoder
+    )
+
+
+def _event_stream_response(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Отключаем буферизацию ответа в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_GET
+def competitions_events(request):
+    return _event_stream_response(competition_events.competitions_stream())
+
+
+@require_GET
+def competition_events_stream(request, slug):
+    if competition_events.get_competition_state(slug) is None:
+        raise Http404
+    with_scoreboard = request.GET.get('scoreboard') == '1'
+    return _event_stream_response(competition_events.competition_stream(slug, with_scoreboard))
+
+
+@require_GET
+def provisioning_status(request, slug):
+    """Состояние очереди подготовки лаб экзамена: число заданий по статусам и последние ошибки."""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    counts = jobs.jobs_status(slug)
+    errors = list(
+        ProvisioningJob.objects.filter(group=slug, status=ProvisioningJob.Status.FAILED)
+        .order_by('-updated_at')
+        .values('kind', 'idempotency_key', 'last_error')[:20]
+    )
+    in_progress = counts[ProvisioningJob.Status.PENDING] + counts[ProvisioningJob.Status.RUNNING]
+    return JsonResponse({"counts": counts, "done": in_progress == 0, "errors": errors})
+
+
+@require_GET
+def progress_report(request):
+    """
+    Успеваемость взводов для дашбордов: назначено, выполнено и процент по каждому взводу.
+    С параметром ``platoon`` (номер взвода) добавляются итоги его пользователей.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    report = progress.get_report()
+    data = {"platoons": [
+        {"id": platoon.pk, "number": platoon.number, **progress.platoon_progress(platoon.pk, report)}
+        for platoon in Platoon.objects.filter(number__gt=0).order_by('number')
+    ]}
+
+    number = request.GET.get('platoon')
+    if number is not None:
+        platoon = Platoon.objects.filter(number=number).first() if number.isdigit() else None
+        if platoon is None:
+            return JsonResponse({'error': 'Platoon not found'}, status=404)
+        data["users"] = [
+            {
+                "id": user.pk, "username": user.username,
+                "first_name": user.first_name, "last_name": user.last_name,
+                **totals,
+            }
+            for user, totals in progress.platoon_users_progress(platoon)
+        ]
+    return JsonResponse(data)
 
 
 @api_view(['GET'])
@@ -366,20 +307,11 @@ def end_lab(request):
         if issue.tasks.count() > 0:
             return JsonResponse({'message': 'Task finished'})
 
-        if hasattr(issue, 'user'):
-            Answers.objects.update_or_create(
-                lab=issue.competition.lab, 
-                user=issue.user,
-                lab_task=None,
-                defaults={'datetime': timezone.now()}
-            )
-        elif hasattr(issue, 'team'):
-            Answers.objects.update_or_create(
-                lab=issue.competition.lab,
-                team=issue.team,
-                lab_task=None,
-                defaults={'datetime': timezone.now()}
-            )
+        with scoreboard_cache.answers_batch():
+            if hasattr(issue, 'user'):
+                Answers.mark_finished(issue.competition, user=issue.user)
+            elif hasattr(issue, 'team'):
+                Answers.mark_finished(issue.competition, team=issue.team)
 
         return JsonResponse({'message': 'Task finished'})
 
@@ -397,7 +329,7 @@ def get_pnet_auth(request):
 
     try:
         pnet_url = f"{get_web_url()}/pnetlab"
-        session = requests.Session()
+        session = track_session(requests.Session(), PNET)
         session.verify = False
 
         # Получаем XSRF-TOKEN
@@ -470,7 +402,7 @@ def check_kibana_auth_status(request):
 
     try:
         kibana_url = get_kibana_url()
-        session = requests.Session()
+        session = track_session(requests.Session(), KIBANA)
         session.verify = False
 
         # Проверяем статус аутентификации через API Kibana
@@ -522,7 +454,7 @@ def get_kibana_auth(request):
 
     try:
         kibana_url = get_kibana_url()
-        session = requests.Session()
+        session = track_session(requests.Session(), KIBANA)
         session.verify = False
 
         # Получаем главную страницу Kibana для получения версии
@@ -946,44 +878,24 @@ def kkz_save_preview(request):
 def get_labs_for_platoon(request):
     platoon_id = request.GET.get('platoon_id')
 
-    print(f"get_labs_for_platoon called with platoon_id: {platoon_id}")
-
     if not platoon_id:
         return JsonResponse({'error': 'platoon_id required'}, status=400)
 
     try:
         platoon = Platoon.objects.get(id=platoon_id)
-        print(f"Found platoon: {platoon.number}, learning_year: {platoon.learning_year}")
     except Platoon.DoesNotExist:
         return JsonResponse({'error': 'Platoon not found'}, status=404)
 
-    labs = Lab.objects.filter(
-        lab_type=LabType.EXAM,
-        learning_years__contains=[platoon.learning_year]
-    )
-
-    print(f"Found {labs.count()} labs for learning_year {platoon.learning_year}")
-
-    labs_data = []
-    for lab in labs:
-        tasks = LabTask.objects.filter(lab=lab)
-        tasks_data = [
-            {
-                'id': task.id,
-                'description': task.description
-            }
-            for task in tasks
-        ]
-
-        labs_data.append({
-            'id': lab.id,
-            'name': lab.name,
-            'slug': lab.slug,
-            'tasks': tasks_data,
-            'default_duration': str(lab.default_duration) if lab.default_duration else None
-        })
-
-        print(f"  Lab: {lab.name} with {len(tasks_data)} tasks")
+    labs_data = [
+        {
+            'id': lab['id'],
+            'name': lab['name'],
+            'slug': lab['slug'],
+            'tasks': tasks,
+            'default_duration': str(lab['default_duration']) if lab['default_duration'] else None
+        }
+        for lab, tasks in lab_catalogue.exam_labs_for_year(platoon.learning_year)
+    ]
 
     return JsonResponse({'labs': labs_data})
 
@@ -1042,42 +954,43 @@ def check_task_answers(request):
         
         # Результаты проверки
         results = {}
-        
-        for task in user_tasks:
-            task_id = str(task.id)
+
+        with scoreboard_cache.answers_batch():
+            for task in user_tasks:
+                task_id = str(task.id)
             
-            # Проверяем, есть ли вопрос у задания
-            if not task.question or task.question.strip() == '':
-                continue
+                # Проверяем, есть ли вопрос у задания
+                if not task.question or task.question.strip() == '':
+                    continue
             
-            # Получаем ответ пользователя
-            user_answer = answers.get(task_id, '').strip()
+                # Получаем ответ пользователя
+                user_answer = answers.get(task_id, '').strip()
             
-            # Если ответ не предоставлен, пропускаем
-            if not user_answer:
-                results[task_id] = {
-                    'status': 'skipped',
-                    'message': 'Ответ не предоставлен'
-                }
-                continue
+                # Если ответ не предоставлен, пропускаем
+                if not user_answer:
+                    results[task_id] = {
+                        'status': 'skipped',
+                        'message': 'Ответ не предоставлен'
+                    }
+                    continue
             
-            # Проверяем ответ
-            correct_answer = task.answer.strip() if task.answer else ''
-            is_correct = user_answer.lower() == correct_answer.lower()
+                # Проверяем ответ
+                correct_answer = task.answer.strip() if task.answer else ''
+                is_correct = user_answer.lower() == correct_answer.lower()
             
-            results[task_id] = {
-                'status': 'correct' if is_correct else 'incorrect',
-                'message': 'Верно!' if is_correct else 'Неверно'
-            }
+                results[task_id] = {
+                    'status': 'correct' if is_correct else 'incorrect',
+                    'message': 'Верно!' if is_correct else 'Неверно'
+                }
             
-            # Если ответ правильный, создаем объект Answers
-            if is_correct:
-                Answers.objects.get_or_create(
-                    lab=competition.lab,
-                    user=request.user,
-                    lab_task=task,
-                    defaults={'datetime': timezone.now()}
-                )
+                # Если ответ правильный, создаем объект Answers
+                if is_correct:
+                    Answers.objects.get_or_create(
+                        lab=competition.lab,
+                        user=request.user,
+                        lab_task=task,
+                        defaults={'datetime': timezone.now()}
+                    )
         
         return JsonResponse({
             'success': True,
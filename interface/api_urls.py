@@ -12,6 +12,10 @@ urlpatterns = [
     path('press_button/<str:action>/', press_button, name='press_button'),
     path('check_availability/<slug:slug>/', check_availability, name='check_availability'),
     path('check_updates/', check_updates, name='check_updates'),
+    path('events/', competitions_events, name='competitions_events'),
+    path('events/<slug:slug>/', competition_events_stream, name='competition_events'),
+    path('provisioning_status/<slug:slug>/', provisioning_status, name='provisioning_status'),
+    path('progress/', progress_report, name='progress_report'),
     path('get_users_in_platoons/', get_users_in_platoons, name='get_users_in_platoons'),
     path('get_competition_solutions/<slug:slug>/', get_solutions, name='get_solutions'),
     path('get_pnet_auth/', get_pnet_auth, name='get_pnet_auth'),
@@ -1,52 +1,7 @@
-from django.db.models import Q, Case, When, IntegerField
-from .models import User, Competition2User, TeamCompetition2Team
 from django.http import JsonResponse
 from rest_framework import status
-from slugify import slugify
 
-
-def get_lab_type_priority_order():
-    """
-    Создает сортировку по приоритету lab_type:
-    EXAM < PZ < COMPETITION < HW
-    """
-    return Case(
-        When(competition__lab__lab_type='EXAM', then=0),
-        When(competition__lab__lab_type='PZ', then=1),
-        When(competition__lab__lab_type='COMPETITION', then=2),
-        When(competition__lab__lab_type='HW', then=3),
-        default=4,
-        output_field=IntegerField(),
-    )
-
-
-def try_find_issue_by_lab(lab_filter, user, competition_filters):
-    team_issue_filters = {
-        'team__users': user
-    }
-    team_issue_filters.update(lab_filter)
-    team_issue_filters.update(competition_filters)
-
-    # Добавляем сортировку по приоритету lab_type
-    issue = TeamCompetition2Team.objects.filter(**team_issue_filters).order_by(
-        get_lab_type_priority_order(),
-        '-competition__start'
-    ).first()
-
-    if issue is None:
-        issue_filters = {
-            'user': user
-        }
-        issue_filters.update(lab_filter)
-        issue_filters.update(competition_filters)
-
-        # Добавляем сортировку по приоритету lab_type
-        issue = Competition2User.objects.filter(**issue_filters).order_by(
-            get_lab_type_priority_order(),
-            '-competition__start'
-        ).first()
-
-    return issue
+from .issue_resolver import resolve_issue
 
 
 def get_issue(data, competition_filters):
@@ -68,36 +23,19 @@ def get_issue(data, competition_filters):
             JsonResponse({'message': 'Wrong request format'}, status=status.HTTP_400_BAD_REQUEST)
         )
 
-    if username:
-        user = User.objects.filter(username=username).first()
-        if not user:
-            # Fallback: try to find by pnet_login if username not found
-            user = User.objects.filter(pnet_login=username).first()
-    else:
-        user = User.objects.filter(pnet_login=pnet_login).first()
-
-    if not user:
+    user_found, issue = resolve_issue(
+        competition_filters,
+        username=username,
+        pnet_login=pnet_login,
+        lab_name=lab_name,
+        lab_slug=lab_slug,
+    )
+    if not user_found:
         return (
             None,
             JsonResponse({'message': 'User or lab does not exist'}, status=status.HTTP_404_NOT_FOUND)
         )
 
-    if lab_name:
-        # Сначала пытаемся найти по slug, затем по name
-        lab_filter = {'competition__lab__name': lab_name}
-        issue = try_find_issue_by_lab(lab_filter, user, competition_filters)
-        if issue is None:
-            lab_filter = {'competition__lab__pnet_slug': lab_name}
-            issue = try_find_issue_by_lab(lab_filter, user, competition_filters)
-        if issue is None:
-            lab_filter = {'competition__lab__pnet_slug': slugify(lab_name)}
-            issue = try_find_issue_by_lab(lab_filter, user, competition_filters)
-    else:
-        lab_filter = {'competition__lab__pnet_slug': lab_slug}
-        issue = try_find_issue_by_lab(lab_filter, user, competition_filters)
-
-
-
     if issue:
         return issue, None
     else:
@@ -6,3 +6,10 @@ class InterfaceConfig(AppConfig):
     name = 'interface'
     verbose_name = 'Основной функционал'
 
+    def ready(self):
+        # Подключаем обработчики сигналов, поддерживающие кэш таблицы результатов и состояния соревнований,
+        # кэш поиска заданий участников, кэш состояния заданий на странице соревнования,
+        # отчёт об успеваемости, каталог лаб и регистрацию заданий очистки лаб
+        from . import (  # noqa: F401
+            scoreboard_cache, competition_events, teardown, issue_resolver, task_status, progress, lab_catalogue,
+        )
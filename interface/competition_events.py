@@ -0,0 +1,185 @@
+"""
+Потоки server-sent events для страниц соревнований.
+
+Поток опрашивает только кэш (состояние соревнования, таблицу результатов,
+версию списка соревнований) и пишет событие лишь при изменении. Под gevent
+каждый поток — отдельный гринлет, спящий между проверками, поэтому сотни
+открытых вкладок не создают периодических HTTP-запросов к Django.
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+
+from . import scoreboard_cache
+from .models import Competition, CompetitionChange, TeamCompetition
+
+COMPETITIONS_VERSION_KEY = "competitions_update_version"
+
+
+def competition_state_key(slug):
+    return f"competition_state:{slug}"
+
+
+def _stream_lifetime():
+    # Ограничиваем время жизни потока: браузер переподключится сам (поле retry)
+    return getattr(settings, 'SSE_STREAM_LIFETIME', 300)
+
+
+def _poll_interval():
+    return getattr(settings, 'SSE_POLL_INTERVAL', 2)
+
+
+def format_event(event, data, event_id=None):
+    """Сериализует одно событие в формате text/event-stream."""
+    if not isinstance(data, str):
+        data = json.dumps(data, cls=DjangoJSONEncoder)
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.extend(f"data: {line}" for line in data.splitlines() or [""])
+    return "\n".join(lines) + "\n\n"
+
+
+def publish_competition_state(competition):
+    cache.set(
+        competition_state_key(competition.slug),
+        {"start": competition.start, "finish": competition.finish},
+        None
+    )
+
+
+def get_competition_state(slug):
+    """Возвращает {'start', 'finish'} соревнования из кэша, при промахе — из БД. None, если соревнования нет."""
+    state = cache.get(competition_state_key(slug))
+    if state is None:
+        competition = Competition.objects.filter(slug=slug).only('slug', 'start', 'finish').first()
+        if competition is None:
+            return None
+        publish_competition_state(competition)
+        state = {"start": competition.start, "finish": competition.finish}
+    return state
+
+
+def notify_competitions_update(revision):
+    """Сообщает открытым страницам списка соревнований, что список нужно перезагрузить."""
+    cache.set(COMPETITIONS_VERSION_KEY, revision, None)
+
+
+def record_competition_change(competition, action):
+    """Записывает изменение экзамена в ленту изменений и возвращает его ревизию."""
+    change = CompetitionChange.objects.create(competition=competition, action=action)
+    notify_competitions_update(change.id)
+    return change.id
+
+
+def competition_changes(since=None):
+    """
+    Возвращает (текущая ревизия, изменения после ``since``).
+    По каждому экзамену отдаётся только последнее изменение с его текущим временем начала и окончания.
+    """
+    revision = CompetitionChange.objects.aggregate(revision=Max('id'))['revision'] or 0
+    if since is None or since >= revision:
+        return revision, []
+
+    latest = {}
+    changes = (
+        CompetitionChange.objects
+        .filter(id__gt=since, id__lte=revision)
+        .select_related('competition')
+        .order_by('id')
+    )
+    for change in changes:
+        latest[change.competition_id] = {
+            "revision": change.id,
+            "slug": change.competition.slug,
+            "action": change.action,
+            "start": change.competition.start,
+            "finish": change.competition.finish,
+        }
+    return revision, sorted(latest.values(), key=lambda item: item["revision"])
+
+
+def _state_payload(state):
+    remaining = max(int((state["finish"] - timezone.now()).total_seconds()), 0)
+    return {
+        "start": state["start"],
+        "finish": state["finish"],
+        "remaining": remaining,
+        "available": remaining > 0,
+    }
+
+
+def _ticks():
+    """Итерирует такты потока до истечения его времени жизни."""
+    deadline = time.monotonic() + _stream_lifetime()
+    interval = _poll_interval()
+    while True:
+        yield
+        if time.monotonic() >= deadline:
+            return
+        time.sleep(interval)
+
+
+def competition_stream(slug, with_scoreboard=False):
+    """
+    События одного соревнования:
+    ``state`` — изменились время начала/окончания (press_button, админка);
+    ``availability`` — соревнование стало доступно или завершилось;
+    ``scoreboard`` — новая таблица результатов (тот же JSON, что отдаёт get_solutions).
+    """
+    yield f"retry: {_poll_interval() * 1000}\n\n"
+
+    state = available = etag = None
+    for _ in _ticks():
+        new_state = get_competition_state(slug)
+        if new_state is None:
+            yield format_event("deleted", {})
+            return
+        payload = _state_payload(new_state)
+        if new_state != state:
+            state = new_state
+            yield format_event("state", payload)
+        if payload["available"] != available:
+            available = payload["available"]
+            yield format_event("availability", {"available": available})
+
+        if with_scoreboard:
+            entry = scoreboard_cache.get_entry(slug)
+            if entry is not None and entry['etag'] != etag:
+                etag = entry['etag']
+                yield format_event("scoreboard", entry['content'].decode('utf-8'), event_id=etag)
+
+        # Комментарий позволяет серверу заметить закрытое соединение
+        yield ": ping\n\n"
+
+
+def competitions_stream():
+    """События страницы списка соревнований: ``update`` — список нужно перезагрузить."""
+    yield f"retry: {_poll_interval() * 1000}\n\n"
+
+    version = cache.get(COMPETITIONS_VERSION_KEY)
+    for _ in _ticks():
+        new_version = cache.get(COMPETITIONS_VERSION_KEY)
+        if new_version != version:
+            version = new_version
+            yield format_event("update", {"revision": version})
+        yield ": ping\n\n"
+
+
+def on_competition_saved(sender, instance, **kwargs):
+    publish_competition_state(instance)
+
+
+def on_competition_deleted(sender, instance, **kwargs):
+    cache.delete(competition_state_key(instance.slug))
+
+
+post_save.connect(on_competition_saved, sender=Competition)
+post_save.connect(on_competition_saved, sender=TeamCompetition)
+post_delete.connect(on_competition_deleted, sender=Competition)
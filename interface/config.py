@@ -1,43 +1,19 @@
 import os
 import sys
-import time
-from functools import wraps
 from django.conf import settings
 
 if 'makemigrations' not in sys.argv and 'migrate' and 'loaddata' not in sys.argv:
-    from dynamic_config.utils import get_config
+    from dynamic_config.utils import get_bool_config, get_config
 else:
     def get_config(key, default):
         return default
 
+    def get_bool_config(key, default=False):
+        return default
 
-def cache_for_minutes(minutes):
-    """Simple cache decorator that caches function results for specified minutes"""
-    def decorator(func):
-        cache = {}
-        
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            # Create a cache key based on function name and arguments
-            cache_key = f"{func.__name__}:{hash(str(args) + str(sorted(kwargs.items())))}"
-            current_time = time.time()
-            
-            # Check if we have a cached result and it's still valid
-            if cache_key in cache:
-                cached_result, cached_time = cache[cache_key]
-                if current_time - cached_time < minutes * 60:  # Convert minutes to seconds
-                    return cached_result
-            
-            # If not cached or expired, call the function and cache the result
-            result = func(*args, **kwargs)
-            cache[cache_key] = (result, current_time)
-            return result
-        
-        return wrapper
-    return decorator
+# Значения читаются из снимка dynamic_config (поиск в словаре), поэтому отдельный кэш не нужен
 
 
-@cache_for_minutes(1)
 def get_pnet_url():
     config = get_config('PNET_URL', 'http://172.18.4.160')
     if 'http' not in config:
@@ -45,7 +21,6 @@ def get_pnet_url():
     return config
 
 
-@cache_for_minutes(1)
 def get_pnet_base_dir():
     if settings.DEBUG:
         return get_config('PNET_BASE_DIR', '/Practice work/Test_Labs/api_test_dir')
@@ -55,7 +30,11 @@ def get_pnet_base_dir():
         )
 
 
-@cache_for_minutes(1)
+def get_pnet_lab_cloning():
+    """Создавать лабы участников копированием эталонной лабы экзамена вместо поэлементной сборки"""
+    return get_bool_config('PNET_LAB_CLONING', False)
+
+
 def get_student_workspace():
     """Возвращает путь к рабочему пространству студента"""
     return get_config('STUDENT_WORKSPACE', 'Practice work/Test_Labs')
@@ -1,14 +1,47 @@
+"""
+Пользователи и роли Elasticsearch для доступа студентов к Kibana.
+
+Клиент Elasticsearch один на процесс: пул соединений переиспользуется, а результат
+ping кэшируется, поэтому операции не создают клиент и не проверяют связь каждый раз.
+Клиент пересоздаётся, если изменились настройки в dynamic_config.
+Массовые операции (``bulk_create_elastic_users``, ``bulk_delete_elastic_users``)
+выполняются через общий клиент с ограниченным параллелизмом.
+"""
 import os
 import logging
-from elasticsearch import Elasticsearch
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from elasticsearch import Elasticsearch, ConnectionError as ElasticConnectionError
 from django.conf import settings
+from django.db import transaction
 from dynamic_config.utils import get_elastic_config
 
+from .instrumentation import ELASTIC, track, tracked
+
 logger = logging.getLogger(__name__)
 
+# Сколько секунд доверять результату ping: успешному и неуспешному
+ELASTIC_HEALTH_TTL = 30
+ELASTIC_UNHEALTHY_TTL = 5
 
-def get_elastic_client():
-    """Создать клиент Elasticsearch с настройками из конфигурации"""
+_client = None
+_client_key = None
+_healthy = False
+_health_checked_until = 0.0
+_client_lock = threading.Lock()
+_ping_lock = threading.Lock()
+_deletion_batch = threading.local()
+
+
+def _bulk_concurrency():
+    return getattr(settings, 'ELASTIC_BULK_CONCURRENCY', 8)
+
+
+def _client_settings():
+    """Адрес, учётные данные и настройки TLS из конфигурации"""
     config = get_elastic_config()
 
     # Определяем протокол и формируем полный URL
@@ -33,24 +66,97 @@ def get_elastic_client():
             logger.warning(f"CA certificate not found at {ca_cert_path}, using verify_certs=False")
             ssl_settings['verify_certs'] = False
 
-    try:
-        client = Elasticsearch(
-            url,
-            basic_auth=(config['username'], config['password']),
-            **ssl_settings
-        )
+    return url, (config['username'], config['password']), ssl_settings
+
+
+def get_elastic_client():
+    """
+    Возвращает общий для процесса клиент Elasticsearch или None, если кластер недоступен.
+    Связь проверяется ping не чаще раза в ELASTIC_HEALTH_TTL секунд.
+    """
+    global _client, _client_key, _healthy, _health_checked_until
 
-        # Проверяем подключение
-        if client.ping():
+    url, basic_auth, ssl_settings = _client_settings()
+    key = (url, basic_auth, tuple(sorted(ssl_settings.items())))
+
+    with _client_lock:
+        if _client is None or key != _client_key:
+            if _client is not None:
+                _client.close()
+            try:
+                _client = Elasticsearch(
+                    url,
+                    basic_auth=basic_auth,
+                    connections_per_node=getattr(settings, 'ELASTIC_CONNECTIONS_PER_NODE', 16),
+                    request_timeout=10,
+                    max_retries=2,
+                    retry_on_timeout=True,
+                    **ssl_settings
+                )
+            except Exception as e:
+                logger.error(f"Failed to create Elasticsearch client: {e}")
+                _client = None
+                return None
+            _client_key = key
+            _health_checked_until = 0.0
+
+        client = _client
+        if time.monotonic() < _health_checked_until:
+            return client if _healthy else None
+
+    # ping выполняется вне _client_lock: при недоступном кластере он может идти
+    # секундами, и остальные потоки не должны ждать его ради общего клиента.
+    # Проверяет связь один поток, прочие берут прошлый результат, а если
+    # проверки ещё не было — дожидаются первой.
+    if not _ping_lock.acquire(blocking=False):
+        with _client_lock:
+            checked = _health_checked_until > 0.0
+        if checked:
+            return client if _healthy else None
+        with _ping_lock:
+            return client if _healthy else None
+
+    try:
+        try:
+            with track(ELASTIC):
+                healthy = bool(client.ping())
+        except Exception as e:
+            logger.error(f"Failed to ping Elasticsearch: {e}")
+            healthy = False
+        if healthy:
             logger.info("Successfully connected to Elasticsearch")
-            return client
         else:
             logger.error("Failed to ping Elasticsearch")
-            return None
+        with _client_lock:
+            # Клиент могли пересоздать, пока шёл ping: его результат к новому не относится
+            if _client is client:
+                _healthy = healthy
+                _health_checked_until = time.monotonic() + (
+                    ELASTIC_HEALTH_TTL if healthy else ELASTIC_UNHEALTHY_TTL
+                )
+    finally:
+        _ping_lock.release()
 
-    except Exception as e:
-        logger.error(f"Failed to create Elasticsearch client: {e}")
-        return None
+    return client if healthy else None
+
+
+def mark_elastic_unhealthy():
+    """Сбрасывает кэш проверки связи: следующий вызов get_elastic_client выполнит ping."""
+    global _health_checked_until
+
+    with _client_lock:
+        _health_checked_until = 0.0
+
+
+def reset_elastic_client():
+    """Закрывает общий клиент; следующий вызов создаст новый."""
+    global _client, _client_key
+
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _client_key = None
 
 
 def transliterate_username(username):
@@ -79,22 +185,8 @@ def transliterate_username(username):
 
     return result
 
-def create_elastic_user(username, password, index="suricata-*"):
-    """
-    Создать пользователя в Elasticsearch с ролью для доступа к указанному индексу
-
-    Args:
-        username (str): Имя пользователя
-        password (str): Пароль пользователя
-        index (str): Индекс для доступа (по умолчанию suricata-*)
-
-    Returns:
-        str: Результат операции ('created', 'role was not created', 'user was not created', 'connection failed')
-    """
-    client = get_elastic_client()
-    if not client:
-        return 'connection failed'
-
+@tracked(ELASTIC)
+def _create_user(client, username, password, index):
     try:
         # Создаем роль для пользователя (транслитерируем имя для совместимости)
         safe_username = transliterate_username(username)
@@ -136,11 +228,58 @@ def create_elastic_user(username, password, index="suricata-*"):
         logger.info(f"Successfully created Elasticsearch user: {username}")
         return 'created'
 
+    except ElasticConnectionError as e:
+        mark_elastic_unhealthy()
+        logger.error(f"Failed to create Elasticsearch user {username}: {e}")
+        return 'connection failed'
     except Exception as e:
         logger.error(f"Failed to create Elasticsearch user {username}: {e}")
         return 'error'
 
 
+@tracked(ELASTIC)
+def _delete_user(client, username):
+    role_name = f"user_{username}_role"
+
+    # Удаляем пользователя
+    try:
+        client.security.delete_user(username=username)
+        logger.info(f"Deleted Elasticsearch user: {username}")
+    except ElasticConnectionError as e:
+        mark_elastic_unhealthy()
+        logger.error(f"Failed to delete Elasticsearch user {username}: {e}")
+        return 'connection failed'
+    except Exception as e:
+        logger.warning(f"Failed to delete user {username}: {e}")
+
+    # Удаляем роль
+    try:
+        client.security.delete_role(name=role_name)
+        logger.info(f"Deleted Elasticsearch role: {role_name}")
+    except Exception as e:
+        logger.warning(f"Failed to delete role {role_name}: {e}")
+
+    return 'deleted'
+
+
+def create_elastic_user(username, password, index="suricata-*"):
+    """
+    Создать пользователя в Elasticsearch с ролью для доступа к указанному индексу
+
+    Args:
+        username (str): Имя пользователя
+        password (str): Пароль пользователя
+        index (str): Индекс для доступа (по умолчанию suricata-*)
+
+    Returns:
+        str: Результат операции ('created', 'role was not created', 'user was not created', 'connection failed')
+    """
+    client = get_elastic_client()
+    if not client:
+        return 'connection failed'
+    return _create_user(client, username, password, index)
+
+
 def delete_elastic_user(username):
     """
     Удалить пользователя и его роль из Elasticsearch
@@ -154,26 +293,107 @@ def delete_elastic_user(username):
     client = get_elastic_client()
     if not client:
         return 'connection failed'
+    return _delete_user(client, username)
+
 
+def get_elastic_usernames():
+    """
+    Имена всех пользователей Elasticsearch одним запросом
+    или None, если кластер недоступен.
+    """
+    client = get_elastic_client()
+    if not client:
+        return None
     try:
-        role_name = f"user_{username}_role"
+        with track(ELASTIC):
+            return set(client.security.get_user())
+    except ElasticConnectionError as e:
+        mark_elastic_unhealthy()
+        logger.error(f"Failed to list Elasticsearch users: {e}")
+    except Exception as e:
+        logger.error(f"Failed to list Elasticsearch users: {e}")
+    return None
 
-        # Удаляем пользователя
-        try:
-            client.security.delete_user(username=username)
-            logger.info(f"Deleted Elasticsearch user: {username}")
-        except Exception as e:
-            logger.warning(f"Failed to delete user {username}: {e}")
 
-        # Удаляем роль
-        try:
-            client.security.delete_role(name=role_name)
-            logger.info(f"Deleted Elasticsearch role: {role_name}")
-        except Exception as e:
-            logger.warning(f"Failed to delete role {role_name}: {e}")
+def _run_bulk(operation, items, keys):
+    with ThreadPoolExecutor(max_workers=min(_bulk_concurrency(), len(items))) as executor:
+        return dict(zip(keys, executor.map(operation, items)))
 
-        return 'deleted'
 
-    except Exception as e:
-        logger.error(f"Failed to delete Elasticsearch user {username}: {e}")
-        return 'error'
+def bulk_create_elastic_users(users, index="suricata-*"):
+    """
+    Создать много пользователей с ролями одним вызовом: общий клиент, одна проверка связи,
+    не больше ELASTIC_BULK_CONCURRENCY запросов одновременно.
+
+    Args:
+        users: пары (имя пользователя, пароль)
+        index (str): Индекс для доступа
+
+    Returns:
+        dict: имя пользователя -> результат, как у create_elastic_user
+    """
+    users = list(users)
+    if not users:
+        return {}
+    client = get_elastic_client()
+    if not client:
+        return {username: 'connection failed' for username, _ in users}
+    return _run_bulk(
+        lambda user: _create_user(client, user[0], user[1], index),
+        users,
+        [username for username, _ in users],
+    )
+
+
+def bulk_delete_elastic_users(usernames):
+    """
+    Удалить много пользователей и их роли одним вызовом.
+
+    Returns:
+        dict: имя пользователя -> результат, как у delete_elastic_user
+    """
+    usernames = list(dict.fromkeys(usernames))
+    if not usernames:
+        return {}
+    client = get_elastic_client()
+    if not client:
+        return {username: 'connection failed' for username in usernames}
+    return _run_bulk(lambda username: _delete_user(client, username), usernames, usernames)
+
+
+@contextmanager
+def user_deletion_batch():
+    """
+    Откладывает удаление пользователей Elasticsearch до конца блока,
+    чтобы массовое удаление пользователей выполнялось одним пакетом.
+    Пакет отправляется после фиксации транзакции и только если блок завершился без ошибки.
+    """
+    if getattr(_deletion_batch, 'pending', None) is not None:
+        yield
+        return
+    _deletion_batch.pending = []
+    try:
+        yield
+    except BaseException:
+        # Удаление из базы откатилось — пользователи Elasticsearch остаются
+        _deletion_batch.pending = None
+        raise
+    pending, _deletion_batch.pending = _deletion_batch.pending, None
+    if pending:
+        transaction.on_commit(lambda: _delete_pending_users(pending))
+
+
+def _delete_pending_users(usernames):
+    results = bulk_delete_elastic_users(usernames)
+    failed = [username for username, result in results.items() if result != 'deleted']
+    if failed:
+        logger.warning(f"Failed to delete {len(failed)} Elasticsearch users: {', '.join(failed)}")
+
+
+def defer_user_deletion(username):
+    """Добавляет пользователя в текущий пакет удаления. False — пакета нет, удалять нужно сразу."""
+    pending = getattr(_deletion_batch, 'pending', None)
+    if pending is None:
+        return False
+    pending.append(username)
+    return True
@@ -1,9 +1,18 @@
 import requests
 from slugify import slugify
 import logging
+import hashlib
 import json
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from urllib.parse import quote
+
+from django.conf import settings
 
 from .config import *
+from .pnet_client import get_pnet_client
 
 logger = logging.getLogger(__name__)
 
@@ -16,17 +25,17 @@ def get_user_workspace_relative_path():
         base_dir = base_dir.replace('//', '/')
     return base_dir
 
+
 def pf_login(url, name, password):
     url2 = url + '/store/public/auth/login/login'
-    header1 = {
+    header = {
         'Content-Type': 'application/json;charset=UTF-8'
     }
-    session = requests.Session()
-    r1 = session.get(url, headers=header1, verify=False)
-    header2 = {
-        'Content-Type': 'application/json;charset=UTF-8',
-        'Cookie': f'_session={session.cookies.get_dict()["_session"]}',
-    }
+    r1 = get_pnet_client().get(url, headers=header)
+    # Кука сессии может прийти и в одном из ответов-редиректов
+    session_cookie = None
+    for response in r1.history + [r1]:
+        session_cookie = response.cookies.get('_session', session_cookie)
     payload2 = json.dumps(
         {
             'username': '' + name + '',
@@ -34,37 +43,46 @@ def pf_login(url, name, password):
             'html': '0', 'captcha': ''
         }
     )
-    r2 = requests.post(url2, headers=header2, data=payload2, verify=False)
-    return r2.cookies, session.cookies.get_dict()["_session"]
+    r2 = get_pnet_client().post(url2, headers=header, data=payload2, cookies={'_session': session_cookie})
+    return r2.cookies, session_cookie
+
+
+def user_create_params(username, password, user_workspace=None):
+    """Параметры нового пользователя PNET; рабочая папка по умолчанию — личная папка пользователя."""
+    return {
+        "username": username,
+        "password": password,
+        "role": "1",
+        "user_status": "1",
+        "active_time": "",
+        "expired_time": "",
+        "user_workspace": user_workspace or f'{get_user_workspace_relative_path()}/{username}',
+        "note": "",
+        "max_node": "",
+        "max_node_lab": ""
+    }
+
+
+def create_users(url, users_params, cookie):
+    """Создаёт несколько пользователей одним запросом offAdd."""
+    r = get_pnet_client().post(
+        url=url + '/store/public/admin/users/offAdd',
+        json={"data": users_params},
+        cookies=cookie,
+        verify=False
+    )
+    logger.debug("Users {} created\nServer response\t{}".format(
+        ", ".join(params["username"] for params in users_params), r.text)
+    )
+    return r
 
 
 def create_user(url, username, password, user_role, cookie):
-    relative_path = get_user_workspace_relative_path()
-    user_params = {
-        "data": [
-            {
-                "username": username,
-                "password": password,
-                "role": "1",
-                "user_status": "1",
-                "active_time": "",
-                "expired_time": "",
-                "user_workspace": f'{relative_path}/{username}',
-                "note": "",
-                "max_node": "",
-                "max_node_lab": ""
-            }
-        ]
-    }
+    user_params = user_create_params(username, password)
     try:
-        r = requests.post(
-            url=url + '/store/public/admin/users/offAdd',
-            json=user_params,
-            cookies=cookie,
-            verify=False
-        )
+        r = create_users(url, [user_params], cookie)
         logger.debug("User {} created\npasswd: {}\nworkspace: {}\nServer response\t{}".format(
-            username, password, f'{relative_path}/{username}', r.text)
+            username, password, user_params["user_workspace"], r.text)
         )
     except Exception as e:
         logger.debug("Error with creating user\n{}\n".format(e))
@@ -76,7 +94,7 @@ def create_directory(url, path, dir_name, cookie):
         "path": path,
         "name": dir_name
     }
-    r = requests.post(
+    r = get_pnet_client().post(
         url + '/api/folders/add',
         json=directory,
         headers={'content-type': 'application/json'},
@@ -89,7 +107,7 @@ def logout(url):
     header = {
         'content-type': 'application/json'
     }
-    r = requests.get(url + '/api/auth/logout', headers=header, verify=False)
+    r = get_pnet_client().get(url + '/api/auth/logout', headers=header, verify=False)
     logger.debug(r.text)
 
 
@@ -113,7 +131,7 @@ def create_lab(url, lab_name, lab_description, lab_path, cookie, xsrf, username)
     }
 
     try:
-        r = requests.post(
+        r = get_pnet_client().post(
             url + '/api/labs',
             json=lab_parameters,
             cookies=cookie,
@@ -127,7 +145,7 @@ def create_lab(url, lab_name, lab_description, lab_path, cookie, xsrf, username)
         logger.debug("Error with creating lab\n{}\n".format(e))
 
 
-def filter_user(url, cookie, xsrf):
+def filter_user(url, cookie, xsrf, page_number=1, page_quantity=1000, data_sort=None):
     header = {
         "Content-Type": "application/json;charset=UTF-8",
         "X-XSRF-TOKEN": xsrf
@@ -136,19 +154,19 @@ def filter_user(url, cookie, xsrf):
     payload = json.dumps(
         {
             "data": {
-                "page_number": 1,
-                "page_quantity": 1000,
+                "page_number": page_number,
+                "page_quantity": page_quantity,
                 "page_total": 0,
                 "flag_filter_change": True,
                 "flag_filter_logic": "and",
-                "data_sort": {
+                "data_sort": data_sort or {
                     "online_time": "desc"
                 },
                 "data_filter": {}
             }
         }
     )
-    r = requests.post(
+    r = get_pnet_client().post(
         url + '/store/public/admin/users/filter',
         headers=header,
         data=payload,
@@ -159,13 +177,10 @@ def filter_user(url, cookie, xsrf):
     return r
 
 
-def get_user_params(url, cookie, xsrf, pnet_login):
-    users = filter_user(url, cookie, xsrf).json()
-    user_params = None
-    for user in users["data"]["data_table"]:
-        if user["username"] == pnet_login:
-            user_params = user
-    return user_params
+def get_user_params(url, cookie, xsrf, pnet_login, session_index=None):
+    if session_index is not None:
+        return session_index.user(pnet_login)
+    return PNetUserDirectory(url, cookie, xsrf).user(pnet_login)
 
 
 def change_user_params(url, cookie, xsrf, new_params):
@@ -181,7 +196,7 @@ def change_user_params(url, cookie, xsrf, new_params):
         }
     }
     )
-    r = requests.post(
+    r = get_pnet_client().post(
         url + '/store/public/admin/users/offEdit',
         headers=header,
         data=payload,
@@ -191,24 +206,30 @@ def change_user_params(url, cookie, xsrf, new_params):
     return r
 
 
-def change_user_password(url, cookie, xsrf, pnet_login, new_password):
-    user_params = get_user_params(url, cookie, xsrf, pnet_login)
+def change_user_password(url, cookie, xsrf, pnet_login, new_password, session_index=None):
+    user_params = get_user_params(url, cookie, xsrf, pnet_login, session_index)
     if user_params:
         user_params["password"] = new_password
-        return change_user_params(url, cookie, xsrf, user_params)
+        r = change_user_params(url, cookie, xsrf, user_params)
+        if session_index is not None:
+            session_index.update_user(user_params)
+        return r
     return None
 
 
-def change_user_workspace(url, cookie, xsrf, pnet_login, new_workspace):
-    user_params = get_user_params(url, cookie, xsrf, pnet_login)
+def change_user_workspace(url, cookie, xsrf, pnet_login, new_workspace, session_index=None):
+    user_params = get_user_params(url, cookie, xsrf, pnet_login, session_index)
     if user_params:
         user_params["user_workspace"] = new_workspace
-        return change_user_params(url, cookie, xsrf, user_params)
+        r = change_user_params(url, cookie, xsrf, user_params)
+        if session_index is not None:
+            session_index.update_user(user_params)
+        return r
     return None
 
 
 def get_sessions_count(url, cookie):
-    r = requests.get(
+    r = get_pnet_client().get(
         url + '/store/public/admin/lab_sessions/count',
         headers={'content-type': 'application/json'},
         cookies=cookie,
@@ -238,7 +259,7 @@ def filter_session(url, cookie, xsrf, page_number=1, page_quantity=25):
             }
         }
     )
-    r = requests.post(
+    r = get_pnet_client().post(
         url + '/store/public/admin/lab_sessions/filter',
         headers=header,
         data=payload,
@@ -247,9 +268,267 @@ def filter_session(url, cookie, xsrf, page_number=1, page_quantity=25):
     return r
 
 
+def _user_sync_concurrency():
+    return getattr(settings, 'PNET_USER_SYNC_CONCURRENCY', 8)
+
+
+@dataclass
+class UserSyncResult:
+    created: list = field(default_factory=list)
+    updated: list = field(default_factory=list)
+    unchanged: list = field(default_factory=list)
+    # Пользователей нет в PNET, а создать их нельзя: не задан пароль
+    missing: list = field(default_factory=list)
+    failed: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        return not self.missing and not self.failed
+
+    @property
+    def errors(self):
+        errors = {pnet_login: "User does not exist in PNET" for pnet_login in self.missing}
+        errors.update(self.failed)
+        return errors
+
+
+class PNetUserDirectory:
+    """
+    Таблица пользователей PNET, проиндексированная по логину и pod.
+
+    Таблица скачивается постранично (без ограничения в 1000 записей) один раз,
+    дальше подгружаются только новые пользователи (список отсортирован по
+    убыванию pod). Отправленные правки запоминаются в индексе.
+    Один справочник безопасно использовать из нескольких потоков.
+    """
+    PAGE_SIZE = 1000
+
+    def __init__(self, url, cookie, xsrf):
+        self._url = url
+        self._cookie = cookie
+        self._xsrf = xsrf
+        self._lock = threading.Lock()
+        self._users = None
+        self._by_pod = {}
+        self._max_pod = None
+
+    def _page(self, page_number):
+        r = filter_user(self._url, self._cookie, self._xsrf, page_number, self.PAGE_SIZE, {"pod": "desc"})
+        return r.json()["data"]["data_table"] or []
+
+    def _load(self, full=False):
+        if full or self._users is None:
+            self._users, self._by_pod, self._max_pod = {}, {}, -1
+        known_max_pod = self._max_pod
+        page_number = 1
+        while True:
+            items = self._page(page_number)
+            new_items = [user for user in items if int(user["pod"]) > known_max_pod]
+            for user in new_items:
+                self._users[user["username"]] = user
+                self._by_pod[user["pod"]] = user["username"]
+                self._max_pod = max(self._max_pod, int(user["pod"]))
+            if len(new_items) < len(items) or len(items) < self.PAGE_SIZE:
+                return
+            page_number += 1
+
+    def _ensure(self, pnet_logins=()):
+        # Вызывается под блокировкой: загружает таблицу и догружает новых, если кого-то нет
+        if self._users is None:
+            self._load(full=True)
+        elif any(pnet_login not in self._users for pnet_login in pnet_logins):
+            self._load()
+
+    def refresh(self, full=False):
+        """Подгружает новых пользователей; при ``full`` — всю таблицу."""
+        with self._lock:
+            self._load(full)
+
+    def user(self, pnet_login):
+        """Параметры пользователя PNET (копия, её можно менять) или None."""
+        with self._lock:
+            self._ensure([pnet_login])
+            user = self._users.get(pnet_login)
+            return dict(user) if user else None
+
+    def missing_users(self, pnet_logins):
+        """Логины, которых нет в PNET (после одной догрузки новых пользователей)."""
+        with self._lock:
+            self._ensure(pnet_logins)
+            return [pnet_login for pnet_login in pnet_logins if pnet_login not in self._users]
+
+    def username_for_pod(self, pod):
+        with self._lock:
+            if self._users is None or pod not in self._by_pod:
+                self._load()
+            return self._by_pod.get(pod, "")
+
+    def update_user(self, user_params):
+        """Запоминает отправленные в PNET параметры, чтобы следующие правки их не затёрли."""
+        with self._lock:
+            if self._users is not None:
+                self._users[user_params["username"]] = dict(user_params)
+
+    def _edit_user(self, user_params):
+        try:
+            r = change_user_params(self._url, self._cookie, self._xsrf, user_params)
+        except Exception as e:
+            return str(e)
+        if not pnet_response_ok(r):
+            return f"PNET responded with {r.status_code}: {r.text[:200]}"
+        self.update_user(user_params)
+        return None
+
+    def edit_users(self, users_params):
+        """Отправляет правки пользователей параллельно. Возвращает ошибки по логинам."""
+        if not users_params:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(_user_sync_concurrency(), len(users_params))) as executor:
+            results = executor.map(self._edit_user, users_params)
+            errors = dict(zip((params["username"] for params in users_params), results))
+        return {pnet_login: error for pnet_login, error in errors.items() if error}
+
+    def sync_users(self, desired_state):
+        """
+        Приводит пользователей PNET к ``desired_state`` — словарю {логин: {поле: значение}},
+        например ``{"student": {"password": "...", "user_workspace": "/student"}}``.
+        Отсутствующие пользователи создаются одним запросом (если задан пароль),
+        у остальных отправляются только отличающиеся значения.
+        """
+        result = UserSyncResult()
+        with self._lock:
+            self._ensure(desired_state)
+            current = {
+                pnet_login: dict(self._users[pnet_login])
+                for pnet_login in desired_state if pnet_login in self._users
+            }
+
+        to_create, to_edit = [], []
+        for pnet_login, fields in desired_state.items():
+            user = current.get(pnet_login)
+            if user is None:
+                if fields.get("password"):
+                    to_create.append(user_create_params(pnet_login, fields["password"], fields.get("user_workspace")))
+                else:
+                    result.missing.append(pnet_login)
+            elif any(user.get(key) != value for key, value in fields.items()):
+                user.update(fields)
+                to_edit.append(user)
+            else:
+                result.unchanged.append(pnet_login)
+
+        if to_create:
+            try:
+                r = create_users(self._url, to_create, self._cookie)
+                error = None if pnet_response_ok(r) else f"PNET responded with {r.status_code}: {r.text[:200]}"
+            except Exception as e:
+                error = str(e)
+            created_logins = [params["username"] for params in to_create]
+            not_created = set(self.missing_users(created_logins)) if error is None else set(created_logins)
+            for pnet_login in created_logins:
+                if pnet_login in not_created:
+                    result.failed[pnet_login] = error or "User was not created"
+                else:
+                    result.created.append(pnet_login)
+
+        errors = self.edit_users(to_edit)
+        result.failed.update(errors)
+        result.updated.extend(user["username"] for user in to_edit if user["username"] not in errors)
+
+        logger.info(f"PNET users sync: {len(result.created)} created, {len(result.updated)} updated, "
+                    f"{len(result.unchanged)} unchanged, {len(result.errors)} failed")
+        return result
+
+
+class PNetSessionIndex:
+    """
+    Индекс сессий лаб и пользователей PNET для пакета операций.
+
+    Таблица сессий скачивается целиком один раз, дальше подгружаются только
+    новые сессии (список отсортирован по убыванию id). Пользователи загружаются
+    через ``PNetUserDirectory`` и догружаются, только если нужного пользователя нет в индексе.
+    Один индекс безопасно использовать из нескольких потоков.
+    """
+    PAGE_SIZE = 100
+
+    def __init__(self, url, cookie, xsrf):
+        self._url = url
+        self._cookie = cookie
+        self._xsrf = xsrf
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._by_path = defaultdict(set)
+        self._max_session_id = None
+        self.users = PNetUserDirectory(url, cookie, xsrf)
+
+    def _session_page(self, page_number, page_quantity):
+        r = filter_session(self._url, self._cookie, self._xsrf, page_number, page_quantity)
+        try:
+            return r.json()["data"]["data_table"] or []
+        except (ValueError, KeyError, TypeError):
+            logger.error("Failed to parse lab sessions list")
+            return []
+
+    def _add_sessions(self, items):
+        for item in items:
+            session_id = int(item["lab_session_id"])
+            self._sessions[session_id] = item
+            self._by_path[item["lab_session_path"]].add(session_id)
+            self._max_session_id = max(self._max_session_id or 0, session_id)
+
+    def _load_all_sessions(self):
+        count_labs = get_sessions_count(self._url, self._cookie).json()["data"]
+        self._sessions.clear()
+        self._by_path.clear()
+        self._max_session_id = 0
+        self._add_sessions(self._session_page(1, max(1, count_labs)))
+
+    def _load_new_sessions(self):
+        page_number = 1
+        while True:
+            items = self._session_page(page_number, self.PAGE_SIZE)
+            new_items = [item for item in items if int(item["lab_session_id"]) > self._max_session_id]
+            self._add_sessions(new_items)
+            if len(new_items) < len(items) or len(items) < self.PAGE_SIZE:
+                return
+            page_number += 1
+
+    def refresh(self, full=False):
+        """
+        Подгружает новые сессии; при ``full`` или первом вызове — всю таблицу.
+        Возвращает True, если таблица была перечитана целиком.
+        """
+        with self._lock:
+            if full or self._max_session_id is None:
+                self._load_all_sessions()
+                return True
+            self._load_new_sessions()
+            return False
+
+    def sessions_for_path(self, lab_session_path):
+        with self._lock:
+            return [self._sessions[session_id] for session_id in sorted(self._by_path.get(lab_session_path, ()))]
+
+    def discard(self, session_id):
+        with self._lock:
+            item = self._sessions.pop(int(session_id), None)
+            if item:
+                self._by_path[item["lab_session_path"]].discard(int(session_id))
+
+    def username_for_pod(self, pod):
+        return self.users.username_for_pod(pod)
+
+    def user(self, pnet_login):
+        """Параметры пользователя PNET (копия, её можно менять) или None."""
+        return self.users.user(pnet_login)
+
+    def update_user(self, user_params):
+        self.users.update_user(user_params)
+
+
 def create_session(url, lab, cookie):
     lab = '{ "path": "' + lab + '.unl" }'
-    r = requests.post(
+    r = get_pnet_client().post(
         url + '/api/labs/session/factory/create',
         data=lab,
         headers={'content-type': 'application/json'},
@@ -261,7 +540,7 @@ def create_session(url, lab, cookie):
 
 def join_session(url, lab_session_id, cookie):
     lab_session_id = '{"lab_session":"' + str(lab_session_id) + '"}'
-    r = requests.post(
+    r = get_pnet_client().post(
         url + '/api/labs/session/factory/join',
         data=lab_session_id,
         headers={'content-type': 'application/json'},
@@ -272,40 +551,9 @@ def join_session(url, lab_session_id, cookie):
     logger.debug(r)
 
 
-def create_node(url, node_params, cookie, xsrf):
-    try:
-        r = requests.post(
-            url + '/api/labs/session/nodes/add',
-            json=node_params,
-            cookies=cookie,
-            verify=False,
-            timeout=4  # 4 секунды таймаут для создания узла
-        )
-        logger.debug(
-            "Node {} has been created\nServer response\t{}".format(node_params["template"], r.json()["message"]))
-    except Exception as e:
-        r = "False"
-        logger.debug("Error with creating node\n{}\n".format(e))
-
-
-def create_p2p(url, p2p_params, cookie):
-    try:
-        r = requests.post(
-            url + '/api/labs/session/networks/p2p',
-            json=p2p_params,
-            cookies=cookie,
-            verify=False,
-            timeout=4  # 4 секунды таймаут для создания P2P соединения
-        )
-        logger.debug("P2P {} has been created \nServer response\t{}".format(p2p_params["name"], r.json()["message"]))
-    except Exception as e:
-        r = "False"
-        logger.debug("Error with creating P2P\n{}\n".format(e))
-
-
 def destroy_session(url, lab_session_id, cookie):
     lab_session_id = '{"lab_session":"' + str(lab_session_id) + '"}'
-    r = requests.post(
+    r = get_pnet_client().post(
         url + '/api/labs/session/factory/destroy',
         data=lab_session_id,
         headers={'content-type': 'application/json'},
@@ -315,42 +563,10 @@ def destroy_session(url, lab_session_id, cookie):
     logger.debug(r)
 
 
-def create_network(url, net_params, cookie):
-    try:
-        r = requests.post(
-            url + '/api/labs/session/networks/add',
-            json=net_params,
-            cookies=cookie,
-            verify=False,
-            timeout=4  # 4 секунды таймаут для создания сети
-        )
-        logger.debug(
-            "Network {} has been created \nServer response\t{}".format(net_params["name"], r.json()["message"]))
-    except Exception as e:
-        r = "False"
-        logger.debug("Error with creating network\n{}\n".format(e))
-
-
-def create_p2p_nat(url, p2p_params, cookie):
-    try:
-        r = requests.post(
-            url + '/api/labs/session/interfaces/edit',
-            json=p2p_params,
-            cookies=cookie,
-            verify=False,
-            timeout=4  # 4 секунды таймаут для редактирования интерфейса
-        )
-        logger.debug(
-            "P2P_NAT {} has been created\nServer response\t{}".format(p2p_params["node_id"], r.json()["message"]))
-    except Exception as e:
-        r = "False"
-        logger.debug("Error with creating P2P_NAT\n{}\n".format(e))
-
-
 def delete_lab(url, cookie, lab_path):
     try:
         path = '{"path":"' + str(lab_path) + '.unl"}'
-        r = requests.delete(
+        r = get_pnet_client().delete(
             url + '/api/labs',
             data=path,
             cookies=cookie,
@@ -363,7 +579,154 @@ def delete_lab(url, cookie, lab_path):
     return r
 
 
-def create_all_lab_nodes_and_connectors(url, lab_object, lab_path, lab_name, cookie, xsrf, username):
+def pnet_response_ok(r):
+    """Успешный ли ответ PNET: HTTP-статус и поле code в JSON."""
+    if r is None or r.status_code >= 400:
+        return False
+    try:
+        data = r.json()
+    except ValueError:
+        return True
+    code = data.get("code", r.status_code) if isinstance(data, dict) else r.status_code
+    return not (isinstance(code, int) and code >= 400)
+
+
+def lab_exists(url, lab_path, cookie):
+    """Есть ли лаба ``lab_path`` (путь без .unl)."""
+    r = get_pnet_client().get(url + '/api/labs' + quote(lab_path + '.unl'), cookies=cookie)
+    return pnet_response_ok(r)
+
+
+def clone_lab(url, source_path, name, cookie):
+    """Копирует лабу ``source_path`` (без .unl) в ту же папку под именем ``name``."""
+    return get_pnet_client().post(
+        url + '/api/labs',
+        json={"source": source_path + '.unl', "name": name},
+        cookies=cookie,
+        timeout=10
+    )
+
+
+def move_lab(url, lab_path, destination_dir, cookie):
+    """Переносит лабу ``lab_path`` (без .unl) в папку ``destination_dir``."""
+    return get_pnet_client().put(
+        url + '/api/labs' + quote(lab_path + '.unl') + '/move',
+        json={"path": destination_dir},
+        cookies=cookie
+    )
+
+# Фазы создания топологии: (название, поле лабы, endpoint, создаёт ли фаза новые объекты).
+# Каждая фаза начинается только после завершения предыдущей.
+TOPOLOGY_PHASES = (
+    ("nodes", "NodesData", "/api/labs/session/nodes/add", True),
+    ("networks", "NetworksData", "/api/labs/session/networks/add", True),
+    ("p2p", "ConnectorsData", "/api/labs/session/networks/p2p", True),
+    ("cloud", "Connectors2CloudData", "/api/labs/session/interfaces/edit", False),
+)
+TOPOLOGY_ELEMENT_TIMEOUT = 4  # секунды на создание одного элемента
+
+
+@dataclass
+class TopologyFailure:
+    phase: str
+    index: int
+    error: str
+
+
+def _topology_window():
+    return getattr(settings, 'PNET_TOPOLOGY_WINDOW', 8)
+
+
+def topology_digest(lab_object):
+    """Хэш JSON топологии лабы: по нему видно, что топология изменилась."""
+    data = [getattr(lab_object, name, None) for _, name, _, _ in TOPOLOGY_PHASES]
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _creates_one_numbered_object(params):
+    """Элемент создаёт ровно один объект с явно заданным целым номером."""
+    object_id, count = params.get("id"), params.get("count", 1)
+    if isinstance(object_id, bool) or not isinstance(object_id, (int, str)) or not str(object_id).isdigit():
+        return False
+    try:
+        return int(count) <= 1
+    except (TypeError, ValueError):
+        return False
+
+
+def plan_lab_topology(lab_object):
+    """
+    Проверяет JSON топологии лабы один раз и раскладывает элементы по фазам.
+    Возвращает (фазы, ошибки): фаза — (название, endpoint, параллельно ли, [(номер, параметры)]).
+
+    PNET нумерует новые узлы и сети в порядке поступления запросов, а соединения
+    ссылаются на эти номера. Поэтому фаза, создающая объекты, отправляется параллельно
+    только если каждый её элемент создаёт один объект (``count`` не больше 1)
+    с явно заданным целым номером (``id``); иначе элементы идут по одному.
+    """
+    phases, failures = [], []
+    for phase, field, endpoint, creates_objects in TOPOLOGY_PHASES:
+        data = getattr(lab_object, field, None) or []
+        if not isinstance(data, list):
+            failures.append(TopologyFailure(phase, -1, f"{field} должен быть списком"))
+            continue
+        elements = []
+        for index, params in enumerate(data):
+            if not params:
+                continue
+            if not isinstance(params, dict):
+                failures.append(TopologyFailure(phase, index, "элемент должен быть объектом"))
+                continue
+            elements.append((index, params))
+        concurrent = not creates_objects or all(_creates_one_numbered_object(params) for _, params in elements)
+        phases.append((phase, endpoint, concurrent, elements))
+    return phases, failures
+
+
+def push_topology_element(url, endpoint, params, cookie):
+    """Отправляет один элемент топологии; при ошибке PNET поднимает исключение."""
+    r = get_pnet_client().post(url + endpoint, json=params, cookies=cookie, timeout=TOPOLOGY_ELEMENT_TIMEOUT)
+    try:
+        data = r.json()
+    except ValueError:
+        data = {}
+    code = data.get("code", r.status_code) if isinstance(data, dict) else r.status_code
+    if r.status_code >= 400 or (isinstance(code, int) and code >= 400):
+        message = data.get("message") if isinstance(data, dict) else None
+        raise RuntimeError(f"{code}: {message or r.text[:200]}")
+    return data
+
+
+def push_lab_topology(url, lab_object, cookie, window=None):
+    """
+    Создаёт узлы, сети, p2p-соединения и подключения к облаку в текущей сессии лабы.
+    Внутри фазы держит до ``window`` запросов одновременно. Возвращает список ошибок по элементам.
+    """
+    window = window or _topology_window()
+    phases, failures = plan_lab_topology(lab_object)
+
+    def _push(phase, endpoint, index, params):
+        try:
+            push_topology_element(url, endpoint, params, cookie)
+        except Exception as e:
+            return TopologyFailure(phase, index, str(e))
+        return None
+
+    with ThreadPoolExecutor(max_workers=max(1, window)) as executor:
+        for phase, endpoint, concurrent, elements in phases:
+            if concurrent and len(elements) > 1:
+                results = list(executor.map(lambda element: _push(phase, endpoint, *element), elements))
+            else:
+                results = [_push(phase, endpoint, *element) for element in elements]
+            failures.extend(result for result in results if result)
+            logger.debug(f"Topology phase {phase}: {len(elements)} elements")
+
+    for failure in failures:
+        logger.error(f"Topology element {failure.phase}[{failure.index}] failed: {failure.error}")
+    return failures
+
+
+def create_all_lab_nodes_and_connectors(url, lab_object, lab_path, lab_name, cookie, xsrf, username, session_index=None):
     username = slugify(username)
     lab_path += "/" + username
 
@@ -371,59 +734,34 @@ def create_all_lab_nodes_and_connectors(url, lab_object, lab_path, lab_name, coo
     lab = lab_path + lab_slash_name
     logger.debug(lab)
 
+    if session_index is None:
+        session_index = PNetSessionIndex(url, cookie, xsrf)
+
     create_session(url, lab, cookie)
-    filter_user(url, cookie, xsrf).text
-    users = filter_user(url, cookie, xsrf).json()
-
-    r = get_sessions_count(url, cookie).json()
-    count_labs = r["data"]
-    logger.debug(count_labs)
-
-    response_json = filter_session(url, cookie, xsrf, 1, count_labs).json()
-    session_list = []
-
-    for item in response_json["data"]["data_table"]:
-        if item["lab_session_path"] == lab + '.unl':
-            username = ""
-            for user in users["data"]["data_table"]:
-                if user["pod"] == item["lab_session_pod"]:
-                    username = user["username"]
-            session = [
-                item["lab_session_id"],
-                username,
-                item["lab_session_path"]
-            ]
-            session_list.append(session)
-
-    logger.debug(session_list)
+    full_reload = session_index.refresh()
+    sessions = session_index.sessions_for_path(lab + '.unl')
+    if not sessions and not full_reload:
+        # Сессию могли не увидеть при частичном обновлении — перечитываем таблицу целиком
+        session_index.refresh(full=True)
+        sessions = session_index.sessions_for_path(lab + '.unl')
+    logger.debug(sessions)
 
     sess_id = 0
-    for session in session_list:
-        if session[1] == 'pnet_scripts':
-            sess_id = session[0]
+    for item in sessions:
+        if session_index.username_for_pod(item["lab_session_pod"]) == 'pnet_scripts':
+            sess_id = item["lab_session_id"]
+            break
 
     join_session(url, sess_id, cookie)
-
-    for node in lab_object.NodesData:
-        if node:
-            create_node(url, node, cookie, xsrf)
-
-    for network in lab_object.NetworksData:
-        if network:
-            create_network(url, network, cookie)
-
-    for connector in lab_object.ConnectorsData:
-        if connector:
-            create_p2p(url, connector, cookie)
-
-    for cloudConnector in lab_object.Connectors2CloudData:
-        if cloudConnector:
-            create_p2p_nat(url, cloudConnector, cookie)
+    failures = push_lab_topology(url, lab_object, cookie)
 
     destroy_session(url, sess_id, cookie)
+    session_index.discard(sess_id)
+    return failures
 
 
-def delete_lab_with_session_destroy(url: object, lab_name: object, lab_path: object, cookie: object, xsrf: object, username: object) -> object:
+def delete_lab_with_session_destroy(url: object, lab_name: object, lab_path: object, cookie: object, xsrf: object, username: object,
+                                    session_index=None) -> object:
     username = slugify(username)
     lab_path += "/" + username
 
@@ -431,24 +769,13 @@ def delete_lab_with_session_destroy(url: object, lab_name: object, lab_path: obj
     lab = lab_path + lab_slash_name
     logger.debug(lab)
 
-    r = get_sessions_count(url, cookie).json()
-    count_labs = r["data"]
-    logger.debug(count_labs)
-
-    response_json = filter_session(url, cookie, xsrf, 1, max(1, count_labs))
-
-    if (
-            response_json.status_code != 204 and
-            response_json.headers["content-type"].strip().startswith("application/json")
-    ):
-        try:
-            response_json = response_json.json()
-        except ValueError:
-            logger.error("Failed to parse json in delete_lab_with_session_destroy")
+    if session_index is None:
+        session_index = PNetSessionIndex(url, cookie, xsrf)
 
-    for item in response_json["data"]["data_table"]:
-        if item["lab_session_path"] == lab + '.unl':
-            logger.debug(destroy_session(url, item["lab_session_id"], cookie))
+    session_index.refresh()
+    for item in session_index.sessions_for_path(lab + '.unl'):
+        logger.debug(destroy_session(url, item["lab_session_id"], cookie))
+        session_index.discard(item["lab_session_id"])
 
     r = delete_lab(url, cookie, lab).json()
     logger.debug(r)
@@ -457,7 +784,7 @@ def delete_lab_with_session_destroy(url: object, lab_name: object, lab_path: obj
 def get_lab_topology(url, cookie):
     """Получает топологию лаборатории из PNET"""
     try:
-        response = requests.get(
+        response = get_pnet_client().get(
             f"{url}/api/labs/session/topology",
             cookies=cookie,
             verify=False,
@@ -477,7 +804,7 @@ def get_lab_topology(url, cookie):
 def get_guacamole_url(url, node_id, cookie):
     """Получает ссылку на Guacamole консоль для указанной ноды"""
     try:
-        response = requests.get(
+        response = get_pnet_client().get(
             f"{url}/api/labs/session/console_guac_link?&node_id={node_id}",
             cookies=cookie,
             verify=False,
@@ -510,7 +837,7 @@ def create_pnet_lab_session_common(url, user_pnet_login, lab_path, cookie):
         full_url = f"{url}/api/labs/session/factory/create"
         payload = {'path': lab_path}
 
-        create_session_response = requests.post(
+        create_session_response = get_pnet_client().post(
             full_url,
             headers={
                 'Content-Type': 'application/json;charset=UTF-8',
@@ -544,7 +871,7 @@ def create_pnet_lab_session_common(url, user_pnet_login, lab_path, cookie):
 def turn_on_node(url, node_id, cookie):
     """Включает ноду в PNET"""
     try:
-        response = requests.post(
+        response = get_pnet_client().post(
             f"{url}/api/labs/session/nodes/start",
             headers={
                 'Content-Type': 'application/json;charset=UTF-8',
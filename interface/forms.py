@@ -5,10 +5,11 @@ from datetime import timedelta
 
 from django import forms
 from durationwidget.widgets import TimeDurationWidget
+from django.db.models import Q
 from django.utils import timezone
 
 from interface.utils import get_pnet_password
-from interface.elastic_utils import create_elastic_user
+from interface.kkz_assignment import assign_tasks, draw_tasks
 from .models import (
     LabType,
     User,
@@ -25,10 +26,11 @@ from .models import (
     Team,
     TeamCompetition2Team,
     LearningYear,
+    ProvisioningJob,
 )
 from django.core.exceptions import ValidationError
 from django.contrib.auth.forms import UserCreationForm
-from interface.pnet_session_manager import ensure_admin_pnet_session, with_pnet_session_if_needed
+from interface.pnet_session_manager import ensure_admin_pnet_session
 from django.contrib.admin.widgets import FilteredSelectMultiple
 from django_select2 import forms as s2forms
 from .config import *
@@ -138,23 +140,12 @@ class CustomUserCreationForm(UserCreationForm):  # pragma: no cover
             pnet_session.create_directory(get_pnet_base_dir(), user.username)
             pnet_session.create_user(user.pnet_login, user.pnet_password)
 
-        # Создаем пользователя в Elasticsearch
-        try:
-            elastic_result = create_elastic_user(
-                username=user.pnet_login,  # pnet_login
-                password=user.pnet_password,  # pnet_password
-                index="suricata-*"  # Можно настроить через конфигурацию
-            )
-            if elastic_result != 'created':
-                # Логируем ошибку, но не прерываем создание пользователя
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.warning(f"Failed to create Elasticsearch user {user.username}: {elastic_result}")
-        except Exception as e:
-            # Логируем ошибку, но не прерываем создание пользователя
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Exception while creating Elasticsearch user {user.username}: {e}")
+        # Пользователь в Elasticsearch создаётся в очереди заданий
+        ProvisioningJob.enqueue(
+            ProvisioningJob.Kind.ELASTIC_USER_CREATE,
+            f"elastic_user:{user.pk}",
+            {"user_id": user.pk, "index": "suricata-*"},
+        )
 
         return user
 
@@ -168,6 +159,14 @@ class CustomUserCreationForm(UserCreationForm):  # pragma: no cover
         return password2
 
 
+class RosterImportForm(forms.Form):
+    roster = forms.FileField(
+        label='Список студентов',
+        help_text='CSV с колонками username, first_name, last_name, password, platoon или JSON-массив '
+                  'объектов с теми же полями. Пароль по умолчанию "test.test".'
+    )
+
+
 class CompetitionForm(forms.ModelForm):
     class Meta:
         # Exclude fields that should be auto-handled or managed elsewhere
@@ -224,26 +223,23 @@ class CompetitionForm(forms.ModelForm):
         new_users = [user for user in all_users if user.id not in existing_user_ids]
 
         if new_users:
-            logger.info(f"Starting lab creation for {len(new_users)} users in competition {instance.slug}")
-            with_pnet_session_if_needed(instance.lab, lambda: self._create_competition_users(instance, new_users))
+            self._create_competition_users(instance, new_users)
 
             total_time = time.time() - start_time
-            logger.info(f"Completed lab creation for {len(new_users)} users in {total_time:.2f} seconds (avg: {total_time/len(new_users):.2f}s per user)")
+            logger.info(f"Queued lab creation for {len(new_users)} users in competition {instance.slug} in {total_time:.2f} seconds")
 
         # Удаляем пользователей, которых больше нет в списке
         all_users_ids = set(all_users.values_list('pk', flat=True))
-        def _delete_users_operation():
-            for user_id in existing_user_ids:
-                if user_id not in all_users_ids:
-                    Competition2User.objects.get(competition=instance, user_id=user_id).delete()
-
-        with_pnet_session_if_needed(instance.lab, _delete_users_operation)
+        for user_id in existing_user_ids:
+            if user_id not in all_users_ids:
+                Competition2User.objects.get(competition=instance, user_id=user_id).delete()
 
         return instance
 
     def _create_competition_users(self, instance, users: List[User]):
         """
-        Последовательное создание Competition2User записей.
+        Создание Competition2User записей. Лабы участников в PNET
+        создаются заданиями очереди (см. interface.jobs).
         """
         def _create_single_competition_user(user):
             """Создание одной записи Competition2User"""
@@ -680,25 +676,24 @@ class SimpleKkzForm(forms.Form):
             kkz.delete()
             raise ValidationError("Во взводе нет пользователей")
 
-        all_available_tasks = []
-        labs_info = []
+        included = [lab_info for lab_info in labs_data if lab_info.get('included', True)]
+        labs = Lab.objects.in_bulk([lab_info['lab_id'] for lab_info in included])
+        included = [lab_info for lab_info in included if lab_info['lab_id'] in labs]
 
-        for lab_info in labs_data:
-            if not lab_info.get('included', True):
-                continue
+        # Задания всех лаб одним запросом: выбранные вручную или все задания лабы
+        selected_ids = {task_id for lab_info in included for task_id in lab_info.get('task_ids', [])}
+        whole_labs = [lab_info['lab_id'] for lab_info in included if not lab_info.get('task_ids')]
+        lab_tasks = list(LabTask.objects.filter(Q(id__in=selected_ids) | Q(lab_id__in=whole_labs)))
 
-            lab_id = lab_info['lab_id']
+        all_available_tasks = []
+        labs_info = []
+        for lab_info in included:
+            lab = labs[lab_info['lab_id']]
             task_ids = lab_info.get('task_ids', [])
-
-            try:
-                lab = Lab.objects.get(id=lab_id)
-            except Lab.DoesNotExist:
-                continue
-
             if task_ids:
-                tasks = list(LabTask.objects.filter(id__in=task_ids))
+                tasks = [task for task in lab_tasks if task.pk in task_ids]
             else:
-                tasks = list(LabTask.objects.filter(lab=lab))
+                tasks = [task for task in lab_tasks if task.lab_id == lab.pk]
 
             all_available_tasks.extend(tasks)
             labs_info.append({
@@ -712,6 +707,7 @@ class SimpleKkzForm(forms.Form):
         else:
             total_tasks_to_assign = len(all_available_tasks)
 
+        competitions = {}
         for lab_data in labs_info:
             lab = lab_data['lab']
             task_ids = lab_data['task_ids']
@@ -723,7 +719,7 @@ class SimpleKkzForm(forms.Form):
             )
 
             if task_ids:
-                kkz_lab.tasks.set(LabTask.objects.filter(id__in=task_ids))
+                kkz_lab.tasks.set(lab_data['tasks'])
 
             competition = Competition.objects.create(
                 lab=lab,
@@ -733,57 +729,9 @@ class SimpleKkzForm(forms.Form):
                 num_tasks=len(lab_data['tasks'])
             )
             competition.platoons.add(platoon)
+            competitions[lab.pk] = competition
 
-        if kkz.unified_tasks:
-            picked = random.sample(all_available_tasks, min(total_tasks_to_assign, len(all_available_tasks)))
-
-            for user in users:
-                tasks_by_lab = {}
-                for task in picked:
-                    if task.lab_id not in tasks_by_lab:
-                        tasks_by_lab[task.lab_id] = []
-                    tasks_by_lab[task.lab_id].append(task)
-
-                for lab_id, tasks in tasks_by_lab.items():
-                    lab = Lab.objects.get(id=lab_id)
-
-                    preview = KkzPreview.objects.create(
-                        kkz=kkz,
-                        lab=lab,
-                        user=user
-                    )
-                    preview.tasks.set(tasks)
-
-                    competition = Competition.objects.get(kkz=kkz, lab=lab)
-                    comp2user, _ = Competition2User.objects.get_or_create(
-                        competition=competition,
-                        user=user
-                    )
-                    comp2user.tasks.set(tasks)
-        else:
-            for user in users:
-                user_tasks = random.sample(all_available_tasks, min(total_tasks_to_assign, len(all_available_tasks)))
-                tasks_by_lab = {}
-                for task in user_tasks:
-                    if task.lab_id not in tasks_by_lab:
-                        tasks_by_lab[task.lab_id] = []
-                    tasks_by_lab[task.lab_id].append(task)
-
-                for lab_id, tasks in tasks_by_lab.items():
-                    lab = Lab.objects.get(id=lab_id)
-
-                    preview = KkzPreview.objects.create(
-                        kkz=kkz,
-                        lab=lab,
-                        user=user
-                    )
-                    preview.tasks.set(tasks)
-
-                    competition = Competition.objects.get(kkz=kkz, lab=lab)
-                    comp2user, _ = Competition2User.objects.get_or_create(
-                        competition=competition,
-                        user=user
-                    )
-                    comp2user.tasks.set(tasks)
+        draws = draw_tasks(users, all_available_tasks, total_tasks_to_assign, unified=kkz.unified_tasks)
+        assign_tasks(kkz, competitions, draws)
 
         return kkz
\ No newline at end of file
@@ -0,0 +1,241 @@
+"""
+Замеры запросов: SQL, внешние вызовы (PNET, Elasticsearch, Kibana) и время view.
+
+``RequestTimingMiddleware`` собирает по каждому запросу число и время SQL-запросов
+(через ``connection.execute_wrapper``) и внешних вызовов, отдаёт их в заголовке
+``Server-Timing`` (если включён ``SERVER_TIMING_HEADER``) и копит гистограммы по маршрутам. Гистограммы отдаются
+view ``metrics`` в текстовом формате Prometheus.
+
+Внешние вызовы отмечаются через ``track(service)``. Замер идёт в контексте
+запроса (contextvars), поэтому вызовы из пулов потоков внутри запроса не учитываются.
+Гистограммы хранятся в памяти процесса: у каждого воркера gunicorn они свои.
+"""
+import contextvars
+import hmac
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+PNET = "pnet"
+ELASTIC = "elastic"
+KIBANA = "kibana"
+SERVICES = (PNET, ELASTIC, KIBANA)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """Счётчики одного запроса: {категория: [число вызовов, суммарное время в секундах]}."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.calls = {"db": [0, 0.0]}
+        self.calls.update({service: [0, 0.0] for service in SERVICES})
+
+    def add(self, category, duration):
+        entry = self.calls.setdefault(category, [0, 0.0])
+        entry[0] += 1
+        entry[1] += duration
+
+
+@contextmanager
+def track(category):
+    """Учитывает время блока как вызов ``category`` в метриках текущего запроса."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(category, time.perf_counter() - started)
+
+
+def tracked(category):
+    """Декоратор: каждый вызов функции учитывается как вызов ``category``."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def track_session(session, category):
+    """Учитывает все запросы ``requests.Session`` как вызовы ``category``."""
+    session.request = tracked(category)(session.request)
+    return session
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    with track("db"):
+        return execute(sql, params, many, context)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.label_names = label_names
+        self._values = {}
+
+    def observe(self, labels, value):
+        counts = self._values.setdefault(labels, [[0] * len(self.buckets), 0, 0.0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[0][i] += 1
+        counts[1] += 1
+        counts[2] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (buckets, count, total) in sorted(self._values.items()):
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            for bound, bucket_count in zip(self.buckets, buckets):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.request_duration = Histogram(
+            "cyberpolygon_request_duration_seconds", "Время обработки запроса",
+            DURATION_BUCKETS, ("endpoint", "method", "status"),
+        )
+        self.view_duration = Histogram(
+            "cyberpolygon_view_duration_seconds", "Время работы view",
+            DURATION_BUCKETS, ("endpoint", "method"),
+        )
+        self.db_queries = Histogram(
+            "cyberpolygon_request_db_queries", "Число SQL-запросов за запрос",
+            QUERY_COUNT_BUCKETS, ("endpoint", "method"),
+        )
+        self.db_duration = Histogram(
+            "cyberpolygon_request_db_duration_seconds", "Время SQL-запросов за запрос",
+            DURATION_BUCKETS, ("endpoint", "method"),
+        )
+        self.external_calls = Histogram(
+            "cyberpolygon_request_external_calls", "Число вызовов внешних сервисов за запрос",
+            QUERY_COUNT_BUCKETS, ("endpoint", "method", "service"),
+        )
+        self.external_duration = Histogram(
+            "cyberpolygon_request_external_duration_seconds", "Время вызовов внешних сервисов за запрос",
+            DURATION_BUCKETS, ("endpoint", "method", "service"),
+        )
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+    def observe(self, endpoint, method, status, metrics, total, view):
+        with self._lock:
+            self.request_duration.observe((endpoint, method, str(status)), total)
+            if view is not None:
+                self.view_duration.observe((endpoint, method), view)
+            count, duration = metrics.calls["db"]
+            self.db_queries.observe((endpoint, method), count)
+            self.db_duration.observe((endpoint, method), duration)
+            for service in SERVICES:
+                count, duration = metrics.calls[service]
+                if count:
+                    self.external_calls.observe((endpoint, method, service), count)
+                    self.external_duration.observe((endpoint, method, service), duration)
+
+    def render(self):
+        with self._lock:
+            histograms = (
+                self.request_duration, self.view_duration, self.db_queries,
+                self.db_duration, self.external_calls, self.external_duration,
+            )
+            return "\n".join(line for histogram in histograms for line in histogram.render()) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def _endpoint(request):
+    # Шаблон маршрута, а не путь: число меток не растёт с числом объектов
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    return match.route or match.view_name or "unresolved"
+
+
+def server_timing(metrics, total, view):
+    parts = []
+    for category, (count, duration) in metrics.calls.items():
+        if count:
+            parts.append(f'{category};dur={duration * 1000:.1f};desc="{count} calls"')
+    if view is not None:
+        parts.append(f"view;dur={view * 1000:.1f}")
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class RequestTimingMiddleware:
+    """Замеры запроса: заголовок Server-Timing и гистограммы для /metrics."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_query_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        finished = time.perf_counter()
+        total = finished - metrics.started
+        view = finished - metrics.view_started if metrics.view_started is not None else None
+        registry.observe(_endpoint(request), request.method, response.status_code, metrics, total, view)
+        # Разбивка времени раскрывает устройство запросов: заголовок включается явно
+        if getattr(settings, "SERVER_TIMING_HEADER", False):
+            response["Server-Timing"] = server_timing(metrics, total, view)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+
+
+def metrics(request):
+    """
+    Гистограммы запросов в текстовом формате Prometheus. Доступны сотрудникам
+    и по заголовку ``Authorization: Bearer <METRICS_TOKEN>``. Адрес клиента не
+    проверяется: за nginx REMOTE_ADDR у всех запросов один и тот же.
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    authorization = request.META.get("HTTP_AUTHORIZATION", "")
+    allowed = bool(token) and hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode())
+    if not allowed and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,201 @@
+"""
+Поиск задания участника (``Competition2User`` или ``TeamCompetition2Team``) по логину и лабе.
+
+Все варианты поиска лабы (по имени, по pnet_slug, по slugify(имени)) для командных
+и индивидуальных заданий выбираются одним UNION-запросом. Кандидаты вместе со временем
+начала и окончания соревнований кэшируются по (пользователь, лаба), а фильтры по времени
+применяются к ним при каждом запросе, поэтому кэш не устаревает с течением времени.
+Любое изменение заданий, команд, лаб или времени соревнований сбрасывает кэш целиком.
+"""
+import hashlib
+import operator
+
+from django.core.cache import cache
+from django.db.models import Case, CharField, F, IntegerField, Q, Value, When
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from slugify import slugify
+
+from .models import User, Lab, Competition, TeamCompetition, Competition2User, TeamCompetition2Team, Team
+
+ISSUE_RESOLVER_VERSION_KEY = "issue_resolver_version"
+# Страховочный TTL на случай изменений, которые не отслеживаются сигналами (например, смена логина)
+ISSUE_RESOLVER_CACHE_TIMEOUT = 60 * 10
+
+TEAM_ISSUE = "team"
+USER_ISSUE = "user"
+
+_COMPARISONS = {
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+}
+
+
+def get_lab_type_priority_order():
+    """
+    Создает сортировку по приоритету lab_type:
+    EXAM < PZ < COMPETITION < HW
+    """
+    return Case(
+        When(competition__lab__lab_type='EXAM', then=0),
+        When(competition__lab__lab_type='PZ', then=1),
+        When(competition__lab__lab_type='COMPETITION', then=2),
+        When(competition__lab__lab_type='HW', then=3),
+        default=4,
+        output_field=IntegerField(),
+    )
+
+
+def _version():
+    version = cache.get(ISSUE_RESOLVER_VERSION_KEY)
+    if version is None:
+        version = 0
+        cache.add(ISSUE_RESOLVER_VERSION_KEY, version, None)
+    return version
+
+
+def invalidate():
+    try:
+        cache.incr(ISSUE_RESOLVER_VERSION_KEY)
+    except ValueError:
+        cache.set(ISSUE_RESOLVER_VERSION_KEY, 1, None)
+
+
+def _cache_key(user_key, lab_key):
+    digest = hashlib.md5(f"{user_key}\0{lab_key}".encode('utf-8')).hexdigest()
+    return f"issue_resolver:{_version()}:{digest}"
+
+
+def find_user(username=None, pnet_login=None):
+    if username:
+        user = User.objects.filter(username=username).only('id').first()
+        if not user:
+            # Fallback: try to find by pnet_login if username not found
+            user = User.objects.filter(pnet_login=username).only('id').first()
+        return user
+    return User.objects.filter(pnet_login=pnet_login).only('id').first()
+
+
+def find_candidates(user_id, lab_name=None, lab_slug=None):
+    """
+    Все задания пользователя по лабе одним запросом. Для каждого возвращаются
+    вид, ключи сортировки и время соревнования.
+    """
+    if lab_name:
+        lab_filter = (
+            Q(competition__lab__name=lab_name)
+            | Q(competition__lab__pnet_slug=lab_name)
+            | Q(competition__lab__pnet_slug=slugify(lab_name))
+        )
+        # Номер варианта поиска: сначала по имени, затем по slug, затем по slugify(имени)
+        attempt = Case(
+            When(competition__lab__name=lab_name, then=0),
+            When(competition__lab__pnet_slug=lab_name, then=1),
+            default=2,
+            output_field=IntegerField(),
+        )
+    else:
+        lab_filter = Q(competition__lab__pnet_slug=lab_slug)
+        attempt = Value(0, output_field=IntegerField())
+
+    fields = ('pk', 'kind', 'attempt', 'priority', 'start', 'finish')
+
+    def columns(kind):
+        return dict(
+            kind=Value(kind, output_field=CharField()),
+            attempt=attempt,
+            priority=get_lab_type_priority_order(),
+            start=F('competition__start'),
+            finish=F('competition__finish'),
+        )
+
+    team_issues = (
+        TeamCompetition2Team.objects.filter(lab_filter, team__users=user_id)
+        .annotate(**columns(TEAM_ISSUE)).values(*fields)
+    )
+    user_issues = (
+        Competition2User.objects.filter(lab_filter, user_id=user_id)
+        .annotate(**columns(USER_ISSUE)).values(*fields)
+    )
+    return list(team_issues.union(user_issues, all=True))
+
+
+def _matches(candidate, competition_filters):
+    """Проверяет фильтры вида ``competition__finish__gt`` по закэшированному времени соревнования."""
+    for lookup, value in competition_filters.items():
+        prefix, field, comparison = lookup.split('__')
+        if prefix != 'competition' or field not in ('start', 'finish') or comparison not in _COMPARISONS:
+            raise ValueError(f"Unsupported competition filter: {lookup}")
+        if not _COMPARISONS[comparison](candidate[field], value):
+            return False
+    return True
+
+
+def _sort_key(candidate):
+    # Вариант поиска, затем командные задания раньше индивидуальных, тип лабы и более позднее начало
+    return (
+        candidate['attempt'],
+        0 if candidate['kind'] == TEAM_ISSUE else 1,
+        candidate['priority'],
+        -candidate['start'].timestamp(),
+    )
+
+
+def resolve_issue(competition_filters, username=None, pnet_login=None, lab_name=None, lab_slug=None, _retry=True):
+    """
+    Возвращает (пользователь найден, задание или None).
+    При попадании в кэш выполняется один запрос — загрузка самого задания.
+    """
+    user_key = f"username:{username}" if username else f"pnet_login:{pnet_login}"
+    lab_key = f"name:{lab_name}" if lab_name else f"slug:{lab_slug}"
+    key = _cache_key(user_key, lab_key)
+
+    cached = cache.get(key)
+    if cached is None:
+        user = find_user(username, pnet_login)
+        if user is None:
+            return False, None
+        cached = find_candidates(user.pk, lab_name, lab_slug)
+        cache.set(key, cached, ISSUE_RESOLVER_CACHE_TIMEOUT)
+
+    candidates = sorted(
+        (candidate for candidate in cached if _matches(candidate, competition_filters)),
+        key=_sort_key,
+    )
+    if not candidates:
+        return True, None
+
+    best = candidates[0]
+    if best['kind'] == TEAM_ISSUE:
+        queryset = TeamCompetition2Team.objects.select_related('competition__lab', 'team')
+    else:
+        queryset = Competition2User.objects.select_related('competition__lab', 'user', 'level')
+    issue = queryset.filter(pk=best['pk']).first()
+    if issue is None and _retry:
+        # Задание удалено без сигнала (например, bulk delete) — ищем заново
+        invalidate()
+        return resolve_issue(competition_filters, username, pnet_login, lab_name, lab_slug, _retry=False)
+    return True, issue
+
+
+def on_issues_changed(sender, **kwargs):
+    invalidate()
+
+
+def on_team_users_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate()
+
+
+post_save.connect(on_issues_changed, sender=Competition2User)
+post_delete.connect(on_issues_changed, sender=Competition2User)
+post_save.connect(on_issues_changed, sender=TeamCompetition2Team)
+post_delete.connect(on_issues_changed, sender=TeamCompetition2Team)
+post_save.connect(on_issues_changed, sender=Competition)
+post_save.connect(on_issues_changed, sender=TeamCompetition)
+post_delete.connect(on_issues_changed, sender=Competition)
+post_save.connect(on_issues_changed, sender=Lab)
+post_delete.connect(on_issues_changed, sender=Lab)
+post_delete.connect(on_issues_changed, sender=User)
+m2m_changed.connect(on_team_users_changed, sender=Team.users.through)
@@ -0,0 +1,301 @@
+"""
+Очередь заданий подготовки лаб.
+
+Веб-запросы только ставят задания (``ProvisioningJob.enqueue``) и сразу отвечают.
+Задания выполняет ``run_pending_jobs()`` — его вызывает runapscheduler
+или команда ``run_provisioning_jobs``. Операции с PNET выполняются параллельно
+через ``ProvisioningBatch``, неудачные повторяются с растущей задержкой.
+"""
+import logging
+import time
+import uuid
+from dataclasses import asdict
+from datetime import timedelta
+
+from django.db.models import Count
+from django.utils import timezone
+
+from .elastic_utils import bulk_create_elastic_users
+from .models import Lab, ProvisioningJob, RosterImport, User
+from .onboarding import onboard_students
+from .provisioning import ProvisioningBatch
+
+logger = logging.getLogger(__name__)
+
+# Базовая задержка перед повтором, удваивается с каждой попыткой
+RETRY_DELAY = timedelta(seconds=30)
+# Задание в статусе RUNNING без отметки дольше этого времени считается брошенным (упал воркер)
+STALE_JOB_TIMEOUT = timedelta(minutes=10)
+# Пока пакет выполняется, отметка времени его заданий обновляется с этим интервалом
+HEARTBEAT_INTERVAL = timedelta(minutes=1)
+DEFAULT_BATCH_SIZE = 100
+
+
+def _lab_create(job):
+    payload = job.payload
+    lab = Lab.objects.get(pk=payload["lab_id"])
+    lab_name, owner = payload["lab_name"], payload["owner"]
+    return lambda session_manager: session_manager.provision_lab(lab, lab_name, owner)
+
+
+def _lab_delete(job):
+    payload = job.payload
+    lab_name, owner = payload["lab_name"], payload["owner"]
+    if payload.get("team"):
+        return lambda session_manager: session_manager.delete_lab_for_team(lab_name, owner)
+    return lambda session_manager: session_manager.delete_lab_for_user(lab_name, owner)
+
+
+def _sync_user(pnet_login, fields):
+    def operation(session_manager):
+        result = session_manager.sync_users({pnet_login: fields})
+        if result is not None and not result.ok:
+            raise RuntimeError(result.errors[pnet_login])
+    return operation
+
+
+def _workspace_change(job):
+    return _sync_user(job.payload["pnet_login"], {"user_workspace": job.payload["workspace"]})
+
+
+def _password_change(job):
+    # Пароль берём из БД в момент выполнения: в очереди он не хранится
+    user = User.objects.get(pk=job.payload["user_id"])
+    return _sync_user(user.pnet_login, {"password": user.pnet_password})
+
+
+def _directory_create(job):
+    path, name = job.payload["path"], job.payload["name"]
+    return lambda session_manager: session_manager.create_directory(path, name)
+
+
+def _elastic_users_create(jobs):
+    """Создаёт пользователей Elasticsearch пакетом и возвращает ошибки по id заданий."""
+    users = User.objects.in_bulk([job.payload["user_id"] for job in jobs])
+    errors = {}
+    by_index = {}
+    for job in jobs:
+        user = users.get(job.payload["user_id"])
+        if user is None:
+            errors[job.pk] = "User does not exist"
+            continue
+        by_index.setdefault(job.payload.get("index", "suricata-*"), []).append((job, user))
+
+    for index, items in by_index.items():
+        results = bulk_create_elastic_users([(user.pnet_login, user.pnet_password) for _, user in items], index=index)
+        for job, user in items:
+            result = results.get(user.pnet_login)
+            if result != 'created':
+                errors[job.pk] = f"Elasticsearch: {result}"
+    return errors
+
+
+def _roster_import(jobs):
+    """
+    Зачисляет студентов из списков, загруженных в админке. Список удаляется после
+    попытки — успешной или нет, — а итог по студентам сохраняется в данных задания.
+    """
+    rosters = {roster.job_id: roster for roster in RosterImport.objects.filter(job__in=jobs)}
+    errors = {}
+    for job in jobs:
+        roster = rosters.get(job.pk)
+        if roster is None:
+            errors[job.pk] = "Список студентов не найден, загрузите его заново"
+            continue
+        try:
+            # Пароли хэшируются в текущем процессе: пул процессов создаёт только команда onboard_students
+            outcomes = onboard_students(roster.rows, hash_workers=1)
+        except Exception as e:
+            logger.exception(f"Roster import {job.idempotency_key} failed")
+            errors[job.pk] = str(e)
+        else:
+            job.payload = dict(job.payload, outcomes=[asdict(outcome) for outcome in outcomes])
+            ProvisioningJob.objects.filter(pk=job.pk).update(payload=job.payload)
+        finally:
+            roster.delete()
+    return errors
+
+
+# Построители операций PNET: читают БД в основном потоке и возвращают
+# операцию, которая в потоке пула обращается только к PNET
+PNET_HANDLERS = {
+    ProvisioningJob.Kind.LAB_CREATE: _lab_create,
+    ProvisioningJob.Kind.LAB_DELETE: _lab_delete,
+    ProvisioningJob.Kind.WORKSPACE_CHANGE: _workspace_change,
+    ProvisioningJob.Kind.PASSWORD_CHANGE: _password_change,
+    ProvisioningJob.Kind.DIRECTORY_CREATE: _directory_create,
+}
+
+# Обработчики остальных заданий: получают все задания своего типа из выборки
+# и возвращают ошибки по id заданий
+BATCH_HANDLERS = {
+    ProvisioningJob.Kind.ELASTIC_USER_CREATE: _elastic_users_create,
+    ProvisioningJob.Kind.ROSTER_IMPORT: _roster_import,
+}
+
+# Задания очистки выполняются с ограничением частоты (PNET_CLEANUP_RATE, PNET_CLEANUP_CONCURRENCY)
+CLEANUP_KINDS = (
+    ProvisioningJob.Kind.LAB_DELETE,
+)
+
+
+def requeue_stale_jobs():
+    """Возвращает в очередь задания, зависшие в RUNNING."""
+    return ProvisioningJob.objects.filter(
+        status=ProvisioningJob.Status.RUNNING,
+        updated_at__lt=timezone.now() - STALE_JOB_TIMEOUT,
+    ).update(status=ProvisioningJob.Status.PENDING, updated_at=timezone.now())
+
+
+def conflict_keys(idempotency_key, payload):
+    """
+    Ключи, по которым задания нельзя выполнять одновременно: задание участника
+    или команды (создание лабы, смена папки, удаление), сама лаба и пользователь PNET.
+    """
+    keys = set()
+    parts = idempotency_key.split(":")
+    if len(parts) >= 3 and parts[1] in ("c2u", "c2t"):
+        keys.add(f"issue:{parts[1]}:{parts[2]}")
+    if payload.get("owner") and payload.get("lab_name"):
+        keys.add(f"lab:{payload['owner']}:{payload['lab_name']}")
+    if payload.get("pnet_login"):
+        keys.add(f"pnet_login:{payload['pnet_login']}")
+    return keys
+
+
+def claim_jobs(limit=DEFAULT_BATCH_SIZE, lease=""):
+    """
+    Забирает готовые к выполнению задания и выдаёт им метку ``lease``. Статус меняется
+    условным UPDATE, поэтому одно задание не достанется двум воркерам. Задание, связанное
+    с уже выполняющимся или взятым раньше в этот пакет (см. ``conflict_keys``), ждёт
+    следующего пакета — так создание, смена папки и удаление лабы идут по порядку.
+    """
+    busy = set()
+    running = ProvisioningJob.objects.filter(status=ProvisioningJob.Status.RUNNING)
+    for idempotency_key, payload in running.values_list('idempotency_key', 'payload'):
+        busy |= conflict_keys(idempotency_key, payload)
+
+    candidates = ProvisioningJob.objects.filter(
+        status=ProvisioningJob.Status.PENDING,
+        run_after__lte=timezone.now(),
+    ).order_by('id').values_list('id', 'idempotency_key', 'payload')[:limit]
+
+    claimed = []
+    for job_id, idempotency_key, payload in candidates:
+        keys = conflict_keys(idempotency_key, payload)
+        if keys & busy:
+            busy |= keys
+            continue
+        updated = ProvisioningJob.objects.filter(id=job_id, status=ProvisioningJob.Status.PENDING).update(
+            status=ProvisioningJob.Status.RUNNING,
+            lease=lease,
+            updated_at=timezone.now(),
+        )
+        if updated:
+            claimed.append(job_id)
+            busy |= keys
+
+    return list(ProvisioningJob.objects.filter(id__in=claimed).order_by('id'))
+
+
+def touch_jobs(jobs, lease):
+    """Обновляет отметку времени выполняемых заданий, чтобы их не сочли брошенными."""
+    return ProvisioningJob.objects.filter(
+        id__in=[job.pk for job in jobs], status=ProvisioningJob.Status.RUNNING, lease=lease,
+    ).update(updated_at=timezone.now())
+
+
+def finish_job(job, error=None):
+    """
+    Фиксирует результат попытки: успех, повтор позже или окончательная ошибка.
+    Результат записывается, только если задание всё ещё принадлежит этому воркеру
+    (метка ``lease`` не сменилась); возвращает, записан ли он.
+    """
+    job.attempts += 1
+    if error is None:
+        job.status = ProvisioningJob.Status.DONE
+        job.last_error = ""
+    elif job.attempts < job.max_attempts:
+        job.status = ProvisioningJob.Status.PENDING
+        job.run_after = timezone.now() + RETRY_DELAY * 2 ** (job.attempts - 1)
+        job.last_error = error
+    else:
+        job.status = ProvisioningJob.Status.FAILED
+        job.last_error = error
+        logger.error(f"Provisioning job {job.idempotency_key} failed after {job.attempts} attempts: {error}")
+    job.updated_at = timezone.now()
+    updated = ProvisioningJob.objects.filter(
+        pk=job.pk, status=ProvisioningJob.Status.RUNNING, lease=job.lease,
+    ).update(
+        status=job.status, attempts=job.attempts, run_after=job.run_after,
+        last_error=job.last_error, updated_at=job.updated_at,
+    )
+    if not updated:
+        logger.warning(f"Provisioning job {job.idempotency_key} was reclaimed by another worker, result discarded")
+    return bool(updated)
+
+
+def run_pending_jobs(limit=DEFAULT_BATCH_SIZE):
+    """Выполняет готовые задания очереди и возвращает их."""
+    requeue_stale_jobs()
+    lease = uuid.uuid4().hex
+    jobs = claim_jobs(limit, lease)
+    if not jobs:
+        return jobs
+
+    start_time = time.time()
+    errors = {}
+
+    batch = ProvisioningBatch()
+    pnet_jobs = {}
+    for job in jobs:
+        if job.kind not in PNET_HANDLERS:
+            continue
+        try:
+            batch.add(job.pk, PNET_HANDLERS[job.kind](job), cleanup=job.kind in CLEANUP_KINDS)
+            pnet_jobs[job.pk] = job
+        except Exception as e:
+            logger.exception(f"Cannot prepare provisioning job {job.idempotency_key}")
+            errors[job.pk] = str(e)
+
+    try:
+        results = batch.run(
+            heartbeat=lambda: touch_jobs(jobs, lease),
+            heartbeat_interval=HEARTBEAT_INTERVAL.total_seconds(),
+        )
+        for result in results:
+            if not result.success:
+                errors[result.key] = result.error
+    except Exception as e:
+        # Не удалось даже открыть сессию PNET — повторим все операции позже
+        logger.exception("PNET session failed, provisioning jobs will be retried")
+        errors.update({pk: str(e) for pk in pnet_jobs})
+
+    for kind, handler in BATCH_HANDLERS.items():
+        batch_jobs = [job for job in jobs if job.kind == kind]
+        if not batch_jobs:
+            continue
+        touch_jobs(jobs, lease)
+        try:
+            errors.update(handler(batch_jobs))
+        except Exception as e:
+            logger.exception(f"Provisioning jobs {kind} failed")
+            errors.update({job.pk: str(e) for job in batch_jobs})
+
+    for job in jobs:
+        finish_job(job, errors.get(job.pk))
+
+    total_time = time.time() - start_time
+    logger.info(f"Processed {len(jobs)} provisioning jobs in {total_time:.2f} seconds "
+                f"(avg: {total_time / len(jobs):.2f}s per job, failed: {len(errors)})")
+    return jobs
+
+
+def jobs_status(group):
+    """Количество заданий группы по статусам."""
+    counts = dict(
+        ProvisioningJob.objects.filter(group=group)
+        .values_list('status')
+        .annotate(count=Count('id'))
+    )
+    return {status: counts.get(status, 0) for status in ProvisioningJob.Status.values}
@@ -0,0 +1,67 @@
+"""
+Распределение заданий ККЗ между участниками.
+
+Задания для всех участников разыгрываются в памяти, затем превью распределения,
+задания участников (``Competition2User``) и их связи с заданиями записываются
+пачками ``bulk_create`` в одной транзакции. ``bulk_create`` не отправляет сигналы,
+поэтому создание лаб участников ставится в очередь одной пачкой, а кэши сбрасываются явно.
+"""
+import random
+
+from django.db import transaction
+
+from . import issue_resolver, progress
+from .models import Competition2User, KkzPreview, ProvisioningJob
+
+
+def group_by_lab(tasks):
+    """Задания по id лабы, в порядке выборки."""
+    tasks_by_lab = {}
+    for task in tasks:
+        tasks_by_lab.setdefault(task.lab_id, []).append(task)
+    return tasks_by_lab
+
+
+def draw_tasks(users, tasks, count, unified=False):
+    """
+    Разыгрывает ``count`` заданий из ``tasks`` для каждого участника.
+    Возвращает пары (участник, {id лабы: [задания]}); при ``unified`` выборка у всех одна.
+    """
+    count = min(count, len(tasks))
+    if unified:
+        picked = group_by_lab(random.sample(tasks, count))
+        return [(user, picked) for user in users]
+    return [(user, group_by_lab(random.sample(tasks, count))) for user in users]
+
+
+def assign_tasks(kkz, competitions, draws):
+    """
+    Записывает распределение ``draws`` (см. ``draw_tasks``) и ставит в очередь
+    создание лаб участников. ``competitions`` — соревнования ККЗ по id лабы.
+    Возвращает созданные задания участников.
+    """
+    previews, issues, assigned = [], [], []
+    for user, tasks_by_lab in draws:
+        for lab_id, tasks in tasks_by_lab.items():
+            previews.append(KkzPreview(kkz=kkz, lab_id=lab_id, user=user))
+            issues.append(Competition2User(competition=competitions[lab_id], user=user))
+            assigned.append(tasks)
+
+    with transaction.atomic():
+        KkzPreview.objects.bulk_create(previews)
+        Competition2User.objects.bulk_create(issues)
+        KkzPreview.tasks.through.objects.bulk_create([
+            KkzPreview.tasks.through(kkzpreview_id=preview.pk, labtask_id=task.pk)
+            for preview, tasks in zip(previews, assigned) for task in tasks
+        ])
+        Competition2User.tasks.through.objects.bulk_create([
+            Competition2User.tasks.through(competition2user_id=issue.pk, labtask_id=task.pk)
+            for issue, tasks in zip(issues, assigned) for task in tasks
+        ])
+        ProvisioningJob.enqueue_many(
+            ProvisioningJob.Kind.LAB_CREATE, [issue.lab_create_job() for issue in issues]
+        )
+
+    issue_resolver.invalidate()
+    progress.invalidate()
+    return issues
@@ -0,0 +1,93 @@
+"""
+Каталог лабораторных работ для списка лаб и выбора лаб в ККЗ.
+
+Каталог строится одним запросом, без тяжёлых полей лабы (описание, топология),
+группируется по образовательным программам и наборам (лабы с одним slug разных типов)
+и кэшируется целиком. Сохранение или удаление лабы сбрасывает кэш.
+"""
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+
+from .models import Lab, LabProgram, LabTask, LabType
+
+LAB_CATALOGUE_CACHE_KEY = "lab_catalogue"
+LAB_CATALOGUE_CACHE_TIMEOUT = 60 * 60
+
+CATALOGUE_FIELDS = ('id', 'name', 'slug', 'lab_type', 'program', 'cover', 'learning_years', 'default_duration')
+
+
+def _cover_url(name):
+    return Lab._meta.get_field('cover').storage.url(name) if name else None
+
+
+def build_catalogue():
+    """
+    Строит каталог::
+
+        {'labs': [лаба, ...],
+         'programs': {программа: {'label': ..., 'bundles': [{'name', 'slug', 'labs': {тип: лаба}, 'cover'}]}}}
+
+    Лаба — словарь с полями ``CATALOGUE_FIELDS``, ``lab_type_label`` и ``cover`` в виде URL.
+    """
+    type_labels = dict(LabType.choices)
+    labs = []
+    for lab in Lab.objects.order_by('slug', 'lab_type').values(*CATALOGUE_FIELDS):
+        lab['cover'] = _cover_url(lab['cover'])
+        lab['lab_type_label'] = type_labels.get(lab['lab_type'], lab['lab_type'])
+        labs.append(lab)
+
+    programs = {}
+    for program_value, program_label in LabProgram.choices:
+        bundle_dict = {}
+        for lab in labs:
+            if lab['program'] != program_value:
+                continue
+            if lab['slug'] not in bundle_dict:
+                bundle_dict[lab['slug']] = {LabType.HW: None, LabType.EXAM: None, LabType.PZ: None}
+            bundle_dict[lab['slug']][lab['lab_type']] = lab
+
+        bundles = []
+        for slug, labs_by_type in bundle_dict.items():
+            available_labs = [lab for lab in labs_by_type.values() if lab is not None]
+            covers = [lab['cover'] for lab in available_labs if lab['cover']]
+            bundles.append({
+                "name": available_labs[0]['name'],
+                "slug": slug,
+                "labs": labs_by_type,
+                "cover": covers[0] if covers else None,
+            })
+        programs[program_value] = {"label": program_label, "bundles": bundles}
+
+    return {'labs': labs, 'programs': programs}
+
+
+def get_catalogue():
+    catalogue = cache.get(LAB_CATALOGUE_CACHE_KEY)
+    if catalogue is None:
+        catalogue = build_catalogue()
+        cache.set(LAB_CATALOGUE_CACHE_KEY, catalogue, LAB_CATALOGUE_CACHE_TIMEOUT)
+    return catalogue
+
+
+def exam_labs_for_year(learning_year):
+    """Экзаменационные лабы для года обучения, с заданиями (один запрос к LabTask)."""
+    labs = [
+        lab for lab in get_catalogue()['labs']
+        if lab['lab_type'] == LabType.EXAM and learning_year in (lab['learning_years'] or [])
+    ]
+    tasks = {}
+    for task in LabTask.objects.filter(lab_id__in=[lab['id'] for lab in labs]).order_by('id').values('id', 'lab_id', 'description'):
+        tasks.setdefault(task['lab_id'], []).append({'id': task['id'], 'description': task['description']})
+    return [(lab, tasks.get(lab['id'], [])) for lab in labs]
+
+
+def invalidate():
+    cache.delete(LAB_CATALOGUE_CACHE_KEY)
+
+
+def on_lab_changed(sender, **kwargs):
+    invalidate()
+
+
+post_save.connect(on_lab_changed, sender=Lab)
+post_delete.connect(on_lab_changed, sender=Lab)
@@ -0,0 +1,171 @@
+"""
+Построение таблицы результатов (leaderboard) для экзамена или соревнования.
+
+Все данные собираются фиксированным набором запросов с агрегатами
+(Count/Max по пользователю и по команде), поэтому количество запросов
+не зависит от числа участников.
+"""
+from django.db.models import Count, Max, Min, Q
+
+from .models import Answers, Team, User
+
+
+def _answers_in_window(competition):
+    return Answers.objects.filter(
+        lab=competition.lab,
+        datetime__lte=competition.finish,
+        datetime__gte=competition.start
+    )
+
+
+def _aggregate(answers_qs, group_field):
+    """
+    Группирует ответы по ``group_field`` и возвращает список
+    (id, количество ответов, время последнего ответа) в порядке первого ответа.
+    """
+    rows = (
+        answers_qs
+        .values(group_field)
+        .annotate(answers_count=Count('id'), raw_datetime=Max('datetime'), first_answer=Min('id'))
+        .order_by('first_answer')
+    )
+    return [(row[group_field], row['answers_count'], row['raw_datetime']) for row in rows]
+
+
+def _progress(answers_count, total_tasks):
+    if not answers_count:
+        return 0
+    # Если в лабе нет заданий, один ответ даёт прогресс 1
+    return answers_count if total_tasks > 0 else 1
+
+
+def solution_timing(raw_datetime, start):
+    """Поля строки таблицы, зависящие от времени последнего ответа."""
+    return {
+        "spent": str(raw_datetime - start).split(".")[0] if raw_datetime else "",
+        "datetime": raw_datetime.strftime("%H:%M:%S") if raw_datetime else "",
+        "raw_datetime": raw_datetime,
+    }
+
+
+def make_solution_row(user, raw_datetime, competition, progress, team_name=""):
+    return {
+        "pos": 0,
+        "user_first_name": user.first_name,
+        "user_last_name": user.last_name,
+        "user_platoon": str(user.platoon),
+        **solution_timing(raw_datetime, competition.start),
+        "team_name": team_name,
+        "user_id": user.id,
+        "progress": progress,
+    }
+
+
+def sort_solutions(solutions, keys=None):
+    """
+    Сортирует решения: прогресс по убыванию, затем время сдачи и имя команды.
+    Параллельный список ``keys`` переставляется вместе с решениями.
+    """
+    keys = keys if keys is not None else [None] * len(solutions)
+    rows = sorted(
+        zip(solutions, keys),
+        key=lambda item: (-item[0]["progress"], item[0]["raw_datetime"], item[0]["team_name"])
+    )
+    solutions[:] = [row for row, _ in rows]
+    keys[:] = [key for _, key in rows]
+    for pos, sol in enumerate(solutions, start=1):
+        sol["pos"] = pos
+    return keys
+
+
+def build_solutions(competition):
+    """
+    Возвращает payload для ``get_solutions``: отсортированный список решений
+    с позициями и суммарный прогресс.
+    """
+    return build_scoreboard(competition)[0]
+
+
+def build_scoreboard(competition):
+    """
+    То же, что ``build_solutions``, но дополнительно возвращает ключи строк:
+    ('user', id) для индивидуальных участников и ('team', id) для участников команд.
+    """
+    total_tasks = competition.num_tasks
+    is_team_competition = hasattr(competition, 'teams')
+    platoons = competition.platoons.all()
+    non_platoon_users = competition.non_platoon_users.all()
+
+    # 1. Индивидуальные ответы: по одной строке на пользователя
+    individual_rows = _aggregate(
+        _answers_in_window(competition).filter(
+            Q(user__isnull=False) & (Q(user__platoon__in=platoons) | Q(user__in=non_platoon_users))
+        ),
+        'user_id'
+    )
+
+    # 2. Участники без ответов (кроме участников команд)
+    individual_users = User.objects.filter(Q(platoon__in=platoons) | Q(id__in=non_platoon_users.values('id')))
+    team_rows = []
+    teams = {}
+    members = []
+    if is_team_competition:
+        team_ids = competition.teams.values('id')
+        individual_users = individual_users.exclude(team__in=team_ids)
+        team_rows = _aggregate(_answers_in_window(competition).filter(team__in=team_ids), 'team_id')
+        teams = dict(Team.objects.filter(id__in=team_ids).order_by('id').values_list('id', 'name'))
+        members = list(
+            Team.users.through.objects
+            .filter(team_id__in=teams.keys())
+            .order_by('team_id', 'user_id')
+            .values_list('team_id', 'user_id')
+        )
+    individual_user_ids = list(individual_users.order_by('id').values_list('id', flat=True).distinct())
+
+    user_ids = {row[0] for row in individual_rows} | set(individual_user_ids) | {uid for _, uid in members}
+    users = User.objects.select_related('platoon').in_bulk(user_ids)
+
+    solutions_data = []
+    keys = []
+    answered = set()
+    for uid, answers_count, raw_datetime in individual_rows:
+        answered.add(uid)
+        solutions_data.append(
+            make_solution_row(users[uid], raw_datetime, competition, _progress(answers_count, total_tasks))
+        )
+        keys.append(('user', uid))
+    for uid in individual_user_ids:
+        if uid not in answered:
+            solutions_data.append(make_solution_row(users[uid], None, competition, 0))
+            keys.append(('user', uid))
+
+    # 3. Командные ответы: строка для каждого участника команды
+    if is_team_competition:
+        team_results = {tid: (answers_count, raw_datetime) for tid, answers_count, raw_datetime in team_rows}
+        team_order = [row[0] for row in team_rows] + [tid for tid in teams if tid not in team_results]
+        members_by_team = {}
+        for tid, uid in members:
+            members_by_team.setdefault(tid, []).append(uid)
+
+        for tid in team_order:
+            answers_count, raw_datetime = team_results.get(tid, (0, None))
+            for uid in members_by_team.get(tid, []):
+                solutions_data.append(make_solution_row(
+                    users[uid], raw_datetime, competition,
+                    _progress(answers_count, total_tasks), team_name=teams[tid]
+                ))
+                keys.append(('team', tid))
+
+    # 4. Сортировка: прогресс по убыванию, затем время сдачи и имя команды
+    sort_solutions(solutions_data, keys)
+
+    response = {
+        "solutions": solutions_data,
+        "max_total_progress": competition.participants,
+        "total_progress": sum(solution["progress"] for solution in solutions_data),
+        "total_tasks": 1
+    }
+    if total_tasks:
+        response["max_total_progress"] = competition.participants * total_tasks
+        response["total_tasks"] = total_tasks
+    return response, keys
@@ -0,0 +1,123 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from interface.issue_resolver import find_candidates
+from interface.models import Answers, Competition, Competition2User, Lab, LabTask, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет БД тестовыми ответами и выводит планы и время частых запросов к Answers, '
+        'Competition2User и Lab. Данные создаются в транзакции и откатываются. '
+        'Для сравнения запустите до и после миграции индексов (migrate interface 0059).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--answers', type=int, default=100_000, help='Количество ответов')
+        parser.add_argument('--users', type=int, default=1000, help='Количество участников')
+        parser.add_argument('--tasks', type=int, default=10, help='Заданий в каждой лабе')
+        parser.add_argument('--repeat', type=int, default=50, help='Повторов каждого запроса')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write('Заполнение данных...')
+            started = time.perf_counter()
+            context = self.seed(options['answers'], options['users'], options['tasks'])
+            self.stdout.write(f'Создано ответов: {Answers.objects.count()} за {time.perf_counter() - started:.1f} с')
+
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            for name, build in self.queries(context):
+                self.benchmark(name, build, options['repeat'])
+
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('Тестовые данные удалены'))
+
+    def seed(self, answers, users_count, tasks_count):
+        now = timezone.now()
+        users = User.objects.bulk_create(
+            User(username=f'bench_user_{i}', pnet_login=f'bench-user-{i}') for i in range(users_count)
+        )
+        per_lab = users_count * tasks_count
+        labs_count = max(1, -(-answers // per_lab))
+
+        competitions = []
+        for lab_number in range(labs_count):
+            lab = Lab.objects.create(
+                name=f'Bench Lab {lab_number}', slug=f'bench-lab-{lab_number}', lab_type='EXAM', description=''
+            )
+            tasks = LabTask.objects.bulk_create(
+                LabTask(lab=lab, task_id=f'{lab_number}.{i}') for i in range(tasks_count)
+            )
+            competition = Competition.objects.create(
+                slug=f'bench-competition-{lab_number}', lab=lab,
+                start=now - timedelta(hours=2), finish=now + timedelta(hours=2),
+            )
+            Competition2User.objects.bulk_create(
+                Competition2User(competition=competition, user=user) for user in users
+            )
+            competitions.append((competition, tasks))
+
+        batch = []
+        created = 0
+        for competition, tasks in competitions:
+            for user_number, user in enumerate(users):
+                for task_number, task in enumerate(tasks):
+                    if created >= answers:
+                        break
+                    batch.append(Answers(
+                        lab_id=competition.lab_id, user=user, lab_task=task,
+                        datetime=now - timedelta(minutes=90) + timedelta(seconds=user_number + task_number),
+                    ))
+                    created += 1
+                if len(batch) >= 5000:
+                    Answers.objects.bulk_create(batch)
+                    batch = []
+        Answers.objects.bulk_create(batch)
+
+        competition, tasks = competitions[-1]
+        return {'competition': competition, 'lab': competition.lab, 'task': tasks[0], 'user': users[users_count // 2]}
+
+    def queries(self, context):
+        competition, lab, task, user = context['competition'], context['lab'], context['task'], context['user']
+        window = {'datetime__gte': competition.start, 'datetime__lte': competition.finish}
+        return [
+            ('Таблица результатов: ответы лабы за время соревнования', lambda: (
+                Answers.objects.filter(lab=lab, **window)
+                .values('user').annotate(count=Count('id'), last=Max('datetime'), first=Min('id'))
+                .order_by('first')
+            )),
+            ('Страница экзамена: отметка о завершении участника', lambda: (
+                Answers.objects.filter(lab=lab, user=user, lab_task=None, **window)
+            )),
+            ('Страница экзамена: выполнено ли задание', lambda: (
+                Answers.objects.filter(lab=lab, user=user, lab_task=task, **window)
+            )),
+            ('Задание участника по соревнованию', lambda: (
+                Competition2User.objects.filter(competition=competition, user=user)
+            )),
+            ('Лаба по имени', lambda: Lab.objects.filter(name=lab.name)),
+            ('Поиск задания чекером (UNION)', lambda: find_candidates(user.pk, lab_name=lab.name)),
+        ]
+
+    def benchmark(self, name, build, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n{name}'))
+        queryset = build()
+        if hasattr(queryset, 'explain'):
+            self.stdout.write(queryset.explain())
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(build())
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(f'среднее {statistics.mean(timings):.2f} мс, p95 {p95:.2f} мс')
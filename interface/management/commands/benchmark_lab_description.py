@@ -0,0 +1,62 @@
+import statistics
+import time
+from types import SimpleNamespace
+
+import jinja2
+from django.core.management.base import BaseCommand
+
+from interface.utils import clear_description_templates, patch_lab_description
+
+PARAGRAPH = (
+    '<p>Подключитесь к узлу <b>{{ pnet_login }}-router</b> и настройте интерфейсы '
+    'по таблице ниже. Учётная запись: <code>{{ username_uppercase }}</code>.</p>'
+    '<table class="table"><tr><td>Gi0/0</td><td>10.0.0.1/24</td></tr>'
+    '<tr><td>Gi0/1</td><td>10.0.1.1/24</td></tr></table>\n'
+)
+
+
+def make_description(size_kb):
+    """HTML-описание в духе Summernote размером около ``size_kb`` КБ."""
+    count = max(1, -(-size_kb * 1024 // len(PARAGRAPH.encode())))
+    return PARAGRAPH * count
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает отрисовку описания лабы с компиляцией jinja2.Template на каждый запрос '
+        'и с кэшем скомпилированных шаблонов patch_lab_description.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[5, 50, 200],
+                            help='Размеры описаний, КБ')
+        parser.add_argument('--repeat', type=int, default=50, help='Повторов отрисовки')
+
+    def handle(self, *args, **options):
+        user = SimpleNamespace(username='student', pnet_login='student-1')
+        for size_kb in options['sizes']:
+            description = make_description(size_kb)
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\nОписание {len(description.encode()) // 1024} КБ'))
+
+            def compile_each_time():
+                jinja2.Template(description).render(
+                    username=user.username, pnet_login=user.pnet_login,
+                    username_uppercase=user.username.upper(), pnet_login_uppercase=user.pnet_login.upper()
+                )
+
+            def cached():
+                competition = SimpleNamespace(lab=SimpleNamespace(pk=size_kb, description=description))
+                patch_lab_description(competition, user)
+
+            clear_description_templates()
+            for title, render in (('jinja2.Template на каждый запрос', compile_each_time),
+                                  ('Кэш шаблонов', cached)):
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    render()
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write(
+                    f'{title}: среднее {statistics.mean(timings) * 1000:.2f} мс, '
+                    f'медиана {statistics.median(timings) * 1000:.2f} мс'
+                )
@@ -0,0 +1,205 @@
+import json
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from dynamic_config.models import ConfigEntry
+from dynamic_config.utils import invalidate as invalidate_config
+from interface import lab_catalogue, progress, scoreboard_cache
+from interface.forms import CompetitionForm, SimpleKkzForm
+from interface.jobs import run_pending_jobs
+from interface.models import Competition, Lab, LabTask, Platoon, ProvisioningJob, User
+from interface.pnet_session_manager import reset_admin_pnet_session
+from interface.pnet_simulator import PNetSimulator
+from interface.teardown import teardown_sweep
+
+
+def summary(timings):
+    """Среднее и p95 в миллисекундах."""
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return f'среднее {statistics.mean(timings) * 1000:.2f} мс, p95 {p95 * 1000:.2f} мс'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сквозной нагрузочный замер на локальном симуляторе PNETLab: создание соревнования '
+        'и лаб участников, создание ККЗ, очистка после окончания, приём ответов /api/answers '
+        'и таблица результатов get_solutions. Данные создаются в транзакции и откатываются, '
+        'PNET_URL на время замера указывает на симулятор. Запускайте на копии БД: '
+        'выполняются все готовые задания очереди.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Количество участников')
+        parser.add_argument('--labs', type=int, default=2, help='Количество лаб (ККЗ собирается из всех)')
+        parser.add_argument('--nodes', type=int, default=6, help='Узлов в топологии каждой лабы')
+        parser.add_argument('--tasks', type=int, default=5, help='Заданий в каждой лабе')
+        parser.add_argument('--answers', type=int, default=500, help='Запросов к /api/answers')
+        parser.add_argument('--repeat', type=int, default=50, help='Повторов запроса get_solutions')
+        parser.add_argument('--latency', type=float, default=0.0, help='Задержка ответа симулятора, с')
+        parser.add_argument('--element-delay', type=float, default=0.0,
+                            help='Задержка создания элемента топологии, с')
+        parser.add_argument('--failure-rate', type=float, default=0.0,
+                            help='Доля запросов к симулятору, отвечающих ошибкой 500')
+        parser.add_argument('--cloning', action='store_true', help='Создавать лабы копированием эталона')
+
+    def handle(self, *args, **options):
+        simulator = PNetSimulator(
+            latency=options['latency'],
+            element_delay=options['element_delay'],
+            failure_rate=options['failure_rate'],
+            seed=0,
+        )
+        slugs = []
+        with simulator:
+            try:
+                with transaction.atomic():
+                    for key, value in (
+                        ('PNET_URL', simulator.url),
+                        ('PNET_LAB_CLONING', 'true' if options['cloning'] else 'false'),
+                    ):
+                        ConfigEntry.objects.update_or_create(key=key, defaults={'value': value})
+                    reset_admin_pnet_session()
+
+                    context = self.seed(options['users'], options['labs'], options['nodes'], options['tasks'])
+                    simulator.add_users([user.pnet_login for user in context['users']])
+
+                    competition = self.bench_competition(context, simulator)
+                    kkz = self.bench_kkz(context, simulator)
+                    slugs = [competition.slug] + list(kkz.competitions.values_list('slug', flat=True))
+                    self.bench_answers(competition, context, options['answers'])
+                    self.bench_solutions(competition, options['repeat'])
+                    self.bench_teardown(simulator, slugs)
+
+                    transaction.set_rollback(True)
+            finally:
+                reset_admin_pnet_session()
+                invalidate_config()
+                scoreboard_cache.invalidate(*slugs)
+                # Кэши, заполненные внутри отменённой транзакции
+                lab_catalogue.invalidate()
+                progress.invalidate()
+        self.stdout.write(self.style.SUCCESS('Тестовые данные удалены'))
+
+    def seed(self, users_count, labs_count, nodes_count, tasks_count):
+        number = (Platoon.objects.aggregate(number=Max('number'))['number'] or 0) + 1
+        platoon = Platoon.objects.create(number=number)
+        User.objects.bulk_create(
+            User(username=f'bench_user_{i}', pnet_login=f'bench-user-{i}', pnet_password='bench', platoon=platoon)
+            for i in range(users_count)
+        )
+        labs = []
+        for lab_number in range(labs_count):
+            lab = Lab.objects.create(
+                name=f'Bench Lab {lab_number}', lab_type='EXAM', description='', platform='PN',
+                NodesData=[{"template": f"node{i}", "id": i + 1} for i in range(nodes_count)],
+                NetworksData=[{"id": 1, "name": "net"}],
+                ConnectorsData=[{"name": f"p2p{i}"} for i in range(max(0, nodes_count - 1))],
+            )
+            LabTask.objects.bulk_create(LabTask(lab=lab, task_id=f'{lab_number}.{i}') for i in range(tasks_count))
+            labs.append(lab)
+        self.stdout.write(f'Создано участников: {users_count}, лаб: {labs_count}')
+        return {'platoon': platoon, 'labs': labs, 'users': list(User.objects.filter(platoon=platoon))}
+
+    def run_jobs(self, simulator, title):
+        """Выполняет очередь до конца и выводит время, число заданий и запросов к PNET."""
+        simulator.reset_counters()
+        started = time.perf_counter()
+        processed = failed = 0
+        # Неудачные задания откладываются на RETRY_DELAY, поэтому цикл завершается
+        while jobs := run_pending_jobs():
+            processed += len(jobs)
+            failed += sum(job.status != ProvisioningJob.Status.DONE for job in jobs)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{title}: {elapsed:.2f} с, заданий {processed}, не выполнено {failed}, '
+            f'запросов к PNET {simulator.requests}, новых соединений {simulator.connections}'
+        )
+
+    def bench_competition(self, context, simulator):
+        self.stdout.write(self.style.MIGRATE_HEADING('\nСоздание соревнования'))
+        now = timezone.now()
+        form = CompetitionForm(data={
+            'lab': context['labs'][0].pk,
+            'start': now - timedelta(minutes=5),
+            'finish': now + timedelta(hours=2),
+            'platoons': [context['platoon'].pk],
+            'num_tasks': 1,
+        })
+        started = time.perf_counter()
+        if not form.is_valid():
+            raise ValueError(f'Некорректные данные соревнования: {form.errors.as_text()}')
+        competition = form.save()
+        self.stdout.write(f'Форма: {time.perf_counter() - started:.2f} с, участников {competition.participants}')
+        self.run_jobs(simulator, 'Лабы участников')
+        return competition
+
+    def bench_kkz(self, context, simulator):
+        self.stdout.write(self.style.MIGRATE_HEADING('\nСоздание ККЗ'))
+        form = SimpleKkzForm(data={
+            'name': 'Bench KKZ',
+            'platoon': context['platoon'].pk,
+            'duration_0': 2,
+            'duration_1': 0,
+            'labs_data': json.dumps([{'lab_id': lab.pk, 'included': True} for lab in context['labs']]),
+        })
+        started = time.perf_counter()
+        if not form.is_valid():
+            raise ValueError(f'Некорректные данные ККЗ: {form.errors.as_text()}')
+        kkz = form.create_kkz()
+        self.stdout.write(f'Форма: {time.perf_counter() - started:.2f} с, соревнований {kkz.competitions.count()}')
+        self.run_jobs(simulator, 'Лабы участников')
+        return kkz
+
+    def bench_answers(self, competition, context, count):
+        self.stdout.write(self.style.MIGRATE_HEADING('\nПриём ответов /api/answers'))
+        client = Client()
+        url = reverse('interface_api:answer-list')
+        users = context['users']
+        tasks = list(competition.lab.options.values_list('task_id', flat=True))
+        timings = []
+        errors = 0
+        for i in range(count):
+            started = time.perf_counter()
+            response = client.post(url, {
+                'pnet_login': users[i % len(users)].pnet_login,
+                'lab_slug': competition.lab.slug,
+                'task': tasks[i % len(tasks)],
+            }, content_type='application/json')
+            timings.append(time.perf_counter() - started)
+            errors += response.status_code >= 400
+        self.stdout.write(f'{summary(timings)}, {count / sum(timings):.0f} запросов/с, ошибок {errors}')
+
+    def bench_solutions(self, competition, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING('\nТаблица результатов get_solutions'))
+        client = Client()
+        url = reverse('interface_api:get_solutions', args=[competition.slug])
+        scoreboard_cache.invalidate(competition.slug)
+
+        started = time.perf_counter()
+        etag = client.get(url)['ETag']
+        self.stdout.write(f'Построение: {(time.perf_counter() - started) * 1000:.2f} мс')
+
+        for title, headers in (('Из кэша', {}), ('ETag совпал (304)', {'HTTP_IF_NONE_MATCH': etag})):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                client.get(url, **headers)
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(f'{title}: {summary(timings)}')
+
+    def bench_teardown(self, simulator, slugs):
+        self.stdout.write(self.style.MIGRATE_HEADING('\nОчистка после окончания'))
+        Competition.objects.filter(slug__in=slugs).update(finish=timezone.now() - timedelta(days=1))
+        started = time.perf_counter()
+        teardown_sweep()
+        self.stdout.write(f'Проверка: {time.perf_counter() - started:.2f} с')
+        self.run_jobs(simulator, 'Удаление лаб')
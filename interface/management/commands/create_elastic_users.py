@@ -2,7 +2,7 @@ from django.core.management.base import BaseCommand
 import random
 import string
 from interface.models import User
-from interface.elastic_utils import create_elastic_user, get_elastic_client
+from interface.elastic_utils import bulk_create_elastic_users, get_elastic_usernames, transliterate_username
 from interface.utils import get_pnet_password
 
 
@@ -38,17 +38,6 @@ class Command(BaseCommand):
         characters = string.ascii_letters + string.digits + "!@#$%^&*"
         return ''.join(random.choice(characters) for _ in range(length))
 
-    def check_user_exists(self, username):
-        """Проверяет существование пользователя в Elasticsearch"""
-        try:
-            client = get_elastic_client()
-            if not client:
-                return False
-            response = client.security.get_user(username=username)
-            return username in response
-        except:
-            return False
-
     def handle(self, *args, **options):
         dry_run = options['dry_run']
         index = options['index']
@@ -77,6 +66,9 @@ class Command(BaseCommand):
         error_count = 0
         skipped_count = 0
 
+        existing_users = set() if force else get_elastic_usernames() or set()
+        to_create = []
+
         # Обрабатываем каждого пользователя
         for user in users:
             # Пропускаем пользователей без pnet_login
@@ -97,7 +89,7 @@ class Command(BaseCommand):
                 self.stdout.write(f"Сгенерирован новый пароль для пользователя {user.username}")
 
             # Проверяем существование пользователя
-            if not force and self.check_user_exists(user.pnet_login):
+            if transliterate_username(user.pnet_login) in existing_users:
                 self.stdout.write(f"Пользователь {user.pnet_login} уже существует - пропускаем")
                 skipped_count += 1
                 continue
@@ -107,15 +99,17 @@ class Command(BaseCommand):
                 success_count += 1
                 continue
 
-            # Создаем пользователя
-            self.stdout.write(f"Создание пользователя {user.pnet_login}...")
-            result = create_elastic_user(user.pnet_login, password, index)
+            to_create.append((user.pnet_login, password))
 
+        # Создаем пользователей пакетом
+        if to_create:
+            self.stdout.write(f"Создание {len(to_create)} пользователей...")
+        for username, result in bulk_create_elastic_users(to_create, index).items():
             if result == 'created':
-                self.stdout.write(self.style.SUCCESS(f"✓ Пользователь {user.pnet_login} создан"))
+                self.stdout.write(self.style.SUCCESS(f"✓ Пользователь {username} создан"))
                 success_count += 1
             else:
-                self.stdout.write(self.style.ERROR(f"✗ Ошибка создания {user.pnet_login}: {result}"))
+                self.stdout.write(self.style.ERROR(f"✗ Ошибка создания {username}: {result}"))
                 error_count += 1
 
         # Статистика
@@ -0,0 +1,67 @@
+import csv
+import os
+import time
+from dataclasses import asdict, fields
+
+from django.core.management.base import BaseCommand, CommandError
+
+from interface.onboarding import CREATED, EXISTS, OnboardingOutcome, onboard_students, read_roster
+
+
+class Command(BaseCommand):
+    help = (
+        'Зачисляет студентов из списка CSV или JSON: создает пользователей Django, '
+        'папки и пользователей PNET и пользователей Elasticsearch. '
+        'Повторный запуск с тем же списком продолжает с места остановки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--input', type=str, required=True,
+                            help='Путь к списку студентов (CSV: username,first_name,last_name,password,platoon или JSON)')
+        parser.add_argument('--hash-workers', type=int, default=None,
+                            help='Число процессов для хэширования паролей (по умолчанию — число ядер)')
+        parser.add_argument('--skip-pnet', action='store_true', help='Не создавать папки и пользователей PNET')
+        parser.add_argument('--skip-elastic', action='store_true', help='Не создавать пользователей Elasticsearch')
+        parser.add_argument('--report', type=str, help='Сохранить итог по каждому студенту в CSV-файл')
+
+    def handle(self, *args, **options):
+        input_file = options['input']
+        if not os.path.exists(input_file):
+            raise CommandError(f'Файл {input_file} не найден')
+
+        with open(input_file, 'r', encoding='utf-8-sig') as f:
+            rows = read_roster(f, input_file)
+        self.stdout.write(f'Студентов в списке: {len(rows)}')
+
+        started = time.perf_counter()
+        outcomes = onboard_students(
+            rows,
+            hash_workers=options['hash_workers'],
+            pnet=not options['skip_pnet'],
+            elastic=not options['skip_elastic'],
+        )
+        elapsed = time.perf_counter() - started
+
+        for outcome in outcomes:
+            line = (f'{outcome.username or "-"}: пользователь {outcome.user or "-"}, '
+                    f'PNET {outcome.pnet or "-"}, Elasticsearch {outcome.elastic or "-"}')
+            if outcome.ok:
+                self.stdout.write(self.style.SUCCESS(f'✓ {line}'))
+            else:
+                self.stdout.write(self.style.ERROR(f'✗ {line}: {outcome.error}'))
+
+        if options['report']:
+            with open(options['report'], 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=[field.name for field in fields(OnboardingOutcome)])
+                writer.writeheader()
+                writer.writerows(asdict(outcome) for outcome in outcomes)
+            self.stdout.write(f'Отчет сохранен в {options["report"]}')
+
+        self.stdout.write("=" * 50)
+        self.stdout.write("СТАТИСТИКА:")
+        self.stdout.write(f"Всего в списке: {len(outcomes)}")
+        self.stdout.write(f"Создано пользователей: {sum(outcome.user == CREATED for outcome in outcomes)}")
+        self.stdout.write(f"Уже существовали: {sum(outcome.user == EXISTS for outcome in outcomes)}")
+        self.stdout.write(f"Ошибок: {sum(not outcome.ok for outcome in outcomes)}")
+        self.stdout.write(f"Время: {elapsed:.1f} с")
+        self.stdout.write("=" * 50)
@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from interface.jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задания очереди подготовки лаб (PNET, Elasticsearch)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задания один раз и завершиться',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            jobs = run_pending_jobs()
+            if jobs:
+                self.stdout.write(f'Выполнено заданий: {len(jobs)}')
+            if options['once']:
+                return
+            if not jobs:
+                time.sleep(settings.PROVISIONING_POLL_INTERVAL)
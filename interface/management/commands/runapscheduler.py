@@ -1,55 +1,40 @@
 # runapscheduler.py
 import logging
-import datetime
-import time
 
 from django.conf import settings
-from django.utils import timezone
 
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from django.core.management.base import BaseCommand
 from django_apscheduler.jobstores import DjangoJobStore
-from django_apscheduler.models import DjangoJobExecution
+from django_apscheduler.models import DjangoJob, DjangoJobExecution
 from django_apscheduler import util
 
-from interface.models import Competition2User, TeamCompetition2Team
-from interface.pnet_session_manager import with_pnet_session_if_needed
+from interface.jobs import run_pending_jobs
+from interface.teardown import teardown_sweep
+
+# Периодические задачи очистки, заменённые разовыми заданиями (interface.teardown) и teardown_sweep_job
+OBSOLETE_JOB_IDS = ("delete_labs_job", "delete_competition2team_job")
 
 logger = logging.getLogger(__name__)
 
 
 @util.close_old_connections
-def delete_labs_job():
+def teardown_sweep_job():
     """
-    Удаляем лабы и соревнования через час после их окончания
+    Страховка для разовых заданий очистки: удаляем лабы соревнований, закончившихся
+    больше задержки назад, если их задание не выполнилось
     """
-    delete_time = timezone.now() - datetime.timedelta(hours=1)
-    competitions2users = Competition2User.objects.filter(competition__finish__lte=delete_time, deleted=False)
-
-    def _delete_competitions2users_operation():
-        for competition2user in competitions2users:
-            competition2user.delete_from_platform()
-            time.sleep(2)
-    if competitions2users.count() > 0:
-        with_pnet_session_if_needed(competitions2users.first().competition.lab, _delete_competitions2users_operation)
+    teardown_sweep()
 
 
 @util.close_old_connections
-def delete_competition2team_job():
+def run_provisioning_jobs():
     """
-    Удаляем лабы и соревнования через 10 минут после их окончания
+    Выполняем задания очереди подготовки лаб
     """
-    delete_time = timezone.now() - datetime.timedelta(minutes=10)
-    competitions2teams = TeamCompetition2Team.objects.filter(competition__finish__lte=delete_time, deleted=False)
-
-    def _delete_competition2team_operation():
-        for competition2team in competitions2teams:
-            competition2team.delete_from_platform()
-            time.sleep(2)
-
-    if competitions2teams.count() > 0:
-        with_pnet_session_if_needed(competitions2teams.first().competition.lab, _delete_competition2team_operation)
+    run_pending_jobs()
 
 
 # The `close_old_connections` decorator ensures that database connections, that have become
@@ -76,22 +61,24 @@ class Command(BaseCommand):
         scheduler.add_jobstore(DjangoJobStore(), "default")
 
         scheduler.add_job(
-            delete_labs_job,
-            trigger=CronTrigger(hour="*/1"),  # Every hour
-            id="delete_labs_job",  # The `id` assigned to each job MUST be unique
+            run_provisioning_jobs,
+            trigger=IntervalTrigger(seconds=settings.PROVISIONING_POLL_INTERVAL),
+            id="run_provisioning_jobs",
             max_instances=1,
+            coalesce=True,
             replace_existing=True,
         )
-        logger.info("Added job 'delete_labs_job'.")
+        logger.info("Added job 'run_provisioning_jobs'.")
 
+        DjangoJob.objects.filter(id__in=OBSOLETE_JOB_IDS).delete()
         scheduler.add_job(
-            delete_competition2team_job,
-            trigger=CronTrigger(minute="*/15"),  # Every 15 minutes
-            id="delete_competition2team_job",
+            teardown_sweep_job,
+            trigger=CronTrigger(hour="*/6", minute="30"),  # Every 6 hours
+            id="teardown_sweep_job",  # The `id` assigned to each job MUST be unique
             max_instances=1,
             replace_existing=True,
         )
-        logger.info("Added job 'delete_competition2team_job'.")
+        logger.info("Added job 'teardown_sweep_job'.")
 
         scheduler.add_job(
             delete_old_job_executions,
@@ -6,7 +6,7 @@ import string
 import logging
 from interface.models import User
 from interface.utils import get_pnet_password
-from interface.eveFunctions import pf_login, change_user_password, create_user, create_directory, logout
+from interface.eveFunctions import pf_login, create_directory, logout, PNetUserDirectory
 from interface.config import get_pnet_url, get_pnet_base_dir
 
 
@@ -36,67 +36,68 @@ class Command(BaseCommand):
         characters = string.ascii_letters + string.digits + "!@#$%^&*"
         return ''.join(random.choice(characters) for _ in range(length))
 
-    def update_user_pnet_password(self, user, url, cookie, xsrf, password_length, dry_run=False):
-        """Обновляет пароль пользователя в PNETLab"""
-        try:
+    def sync_pnet_passwords(self, users, url, cookie, xsrf, password_length, dry_run=False):
+        """
+        Обновляет пароли пользователей в PNETLab одной синхронизацией: таблица пользователей
+        PNET скачивается один раз, отсутствующие пользователи создаются.
+        Возвращает (успешно, ошибок).
+        """
+        new_passwords = {}
+        for user in users:
+            if user.pnet_login == 'admin':
+                continue
             # Генерируем случайный пароль
             random_password = self.generate_random_password(password_length)
-            if user.pnet_login == 'admin':
-                return True
-
             pnet_password = get_pnet_password(random_password)
-            
+            new_passwords[user.pnet_login] = (user, pnet_password)
+
             self.stdout.write(
                 self.style.SUCCESS(
                     f"Обновление пароля для пользователя {user.username} (pnet_login: {user.pnet_login})"
                 )
             )
-            
             if dry_run:
                 self.stdout.write(
                     self.style.WARNING(f"DRY RUN: Пароль будет: {random_password} -> PNET: {pnet_password}")
                 )
-                return True
-            
-            # Пытаемся изменить пароль пользователя
 
-            result = change_user_password(url, cookie, xsrf, user.pnet_login, pnet_password)
-            if result is not None:
-                self.stdout.write(
-                    self.style.SUCCESS(f"Пароль пользователя {user.pnet_login} успешно обновлен в PNETLab")
-                )
-            else:
-                # Пользователь не существует в PNETLab, создаем его
-                self.stdout.write(
-                    self.style.WARNING(f"Пользователь {user.pnet_login} не найден в PNETLab, создаем...")
-                )
-                
-                # Создаем директорию для пользователя
-                create_directory(url, get_pnet_base_dir(), user.username, cookie)
-                
-                # Создаем пользователя
-                create_user(url, user.pnet_login, pnet_password, '1', cookie)
-                
-                self.stdout.write(
-                    self.style.SUCCESS(f"Пользователь {user.pnet_login} успешно создан в PNETLab")
-                )
+        skipped = len(users) - len(new_passwords)
+        if dry_run or not new_passwords:
+            return len(users), 0
 
-            
-            # Обновляем пароль в базе данных Django
-            user.pnet_password = pnet_password
-            user.save()
-            
+        directory = PNetUserDirectory(url, cookie, xsrf)
+        # Для пользователей, которых нет в PNETLab, сначала создаем директории
+        for pnet_login in directory.missing_users(list(new_passwords)):
+            user = new_passwords[pnet_login][0]
             self.stdout.write(
-                self.style.SUCCESS(f"Пароль пользователя {user.username} обновлен в базе данных Django")
+                self.style.WARNING(f"Пользователь {pnet_login} не найден в PNETLab, создаем...")
             )
-            
-            return True
-            
-        except Exception as e:
+            create_directory(url, get_pnet_base_dir(), user.username, cookie)
+
+        result = directory.sync_users({
+            pnet_login: {"password": pnet_password} for pnet_login, (_, pnet_password) in new_passwords.items()
+        })
+        for pnet_login in result.created:
+            self.stdout.write(self.style.SUCCESS(f"Пользователь {pnet_login} успешно создан в PNETLab"))
+        for pnet_login in result.updated + result.unchanged:
+            self.stdout.write(self.style.SUCCESS(f"Пароль пользователя {pnet_login} успешно обновлен в PNETLab"))
+        for pnet_login, error in result.errors.items():
             self.stdout.write(
-                self.style.ERROR(f"Ошибка при обновлении пароля для пользователя {user.username}: {str(e)}")
+                self.style.ERROR(f"Ошибка при обновлении пароля для пользователя {pnet_login}: {error}")
             )
-            return False
+
+        # Обновляем пароли в базе данных Django только для синхронизированных пользователей
+        updated_users = []
+        for pnet_login, (user, pnet_password) in new_passwords.items():
+            if pnet_login not in result.errors:
+                user.pnet_password = pnet_password
+                updated_users.append(user)
+        User.objects.bulk_update(updated_users, ['pnet_password'], batch_size=500)
+        self.stdout.write(
+            self.style.SUCCESS(f"Пароли {len(updated_users)} пользователей обновлены в базе данных Django")
+        )
+
+        return skipped + len(updated_users), len(result.errors)
 
     def handle(self, *args, **options):
         self.stdout.write(
@@ -140,16 +141,10 @@ class Command(BaseCommand):
             else:
                 cookie, xsrf = None, None
             
-            # Счетчики для статистики
-            success_count = 0
-            error_count = 0
-            
-            # Обрабатываем каждого пользователя
-            for user in users:
-                if self.update_user_pnet_password(user, pnet_url, cookie, xsrf, password_length, dry_run):
-                    success_count += 1
-                else:
-                    error_count += 1
+            users = list(users)
+            success_count, error_count = self.sync_pnet_passwords(
+                users, pnet_url, cookie, xsrf, password_length, dry_run
+            )
             
             if not dry_run:
                 # Выходим из PNETLab
@@ -159,7 +154,7 @@ class Command(BaseCommand):
             # Выводим статистику
             self.stdout.write("=" * 50)
             self.stdout.write("СТАТИСТИКА ОБНОВЛЕНИЯ ПАРОЛЕЙ:")
-            self.stdout.write(f"Всего пользователей: {users.count()}")
+            self.stdout.write(f"Всего пользователей: {len(users)}")
             self.stdout.write(f"Успешно обновлено: {success_count}")
             self.stdout.write(f"Ошибок: {error_count}")
             self.stdout.write("=" * 50)
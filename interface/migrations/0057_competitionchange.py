@@ -0,0 +1,28 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interface', '0056_labtask_answer_labtask_question_alter_lab_tasks_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompetitionChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(max_length=32, verbose_name='Действие')),
+                ('datetime', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время')),
+                ('competition', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='interface.competition', verbose_name='Экзамен')),
+            ],
+            options={
+                'verbose_name': 'Изменение экзамена',
+                'verbose_name_plural': 'Изменения экзаменов',
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:28
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interface', '0057_competitionchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProvisioningJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('LAB_CREATE', 'Создание лабы'), ('LAB_DELETE', 'Удаление лабы'), ('WORKSPACE_CHANGE', 'Смена рабочей папки'), ('PASSWORD_CHANGE', 'Смена пароля'), ('DIRECTORY_CREATE', 'Создание папки'), ('ELASTIC_USER_CREATE', 'Создание пользователя Elasticsearch')], max_length=32, verbose_name='Тип')),
+                ('status', models.CharField(choices=[('PENDING', 'В очереди'), ('RUNNING', 'Выполняется'), ('DONE', 'Выполнено'), ('FAILED', 'Ошибка')], default='PENDING', max_length=16, verbose_name='Статус')),
+                ('idempotency_key', models.CharField(max_length=255, unique=True, verbose_name='Ключ идемпотентности')),
+                ('group', models.CharField(blank=True, db_index=True, help_text='Slug экзамена, к которому относится задание', max_length=255, verbose_name='Группа')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Данные')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('max_attempts', models.PositiveIntegerField(default=3, verbose_name='Максимум попыток')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Не раньше')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Создано')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Задание подготовки',
+                'verbose_name_plural': 'Задания подготовки',
+                'indexes': [models.Index(fields=['status', 'run_after'], name='provisioning_job_queue_idx')],
+            },
+        ),
+    ]
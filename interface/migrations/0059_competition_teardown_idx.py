@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interface', '0058_provisioningjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='competition',
+            index=models.Index(fields=['deleted', 'finish'], name='competition_teardown_idx'),
+        ),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:47
+# Перед уникальными ограничениями убираем накопившиеся дубликаты ответов на задания
+# и заданий участников. Удаляемые записи сохраняются в DeletedDuplicate, обратная
+# миграция восстанавливает их. Отметки о завершении лабы (ответы без задания) не трогаем:
+# по одной лабе их может быть несколько — по одной на соревнование.
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+from django.utils import timezone
+
+# Модель, поля группы дубликатов, фильтр и сохраняемые связи many-to-many
+DUPLICATE_GROUPS = [
+    ('Answers', ['user', 'lab', 'lab_task'], {'user__isnull': False, 'lab_task__isnull': False}, []),
+    ('Answers', ['team', 'lab', 'lab_task'], {'team__isnull': False, 'lab_task__isnull': False}, []),
+    ('Competition2User', ['competition', 'user'], {}, ['tasks']),
+]
+
+
+def remove_duplicates(apps, schema_editor):
+    """Оставляет в каждой группе одинаковых записей последнюю (с наибольшим id), остальные копирует и удаляет."""
+    DeletedDuplicate = apps.get_model('interface', 'DeletedDuplicate')
+    for model_name, fields, filters, m2m_fields in DUPLICATE_GROUPS:
+        model = apps.get_model('interface', model_name)
+        duplicates = (
+            model.objects.filter(**filters)
+            .values(*fields)
+            .annotate(count=Count('id'), keep_id=Max('id'))
+            .filter(count__gt=1)
+        )
+        for group in duplicates:
+            keep_id = group.pop('keep_id')
+            group.pop('count')
+            rows = model.objects.filter(**filters, **group).exclude(id=keep_id)
+            backups = []
+            for row in rows:
+                # Значения полей строками без потери точности (даты с микросекундами)
+                data = {
+                    field.attname: None if field.value_from_object(row) is None else field.value_to_string(row)
+                    for field in model._meta.concrete_fields
+                }
+                for name in m2m_fields:
+                    data[name] = list(getattr(row, name).values_list('pk', flat=True))
+                backups.append(DeletedDuplicate(
+                    model=model_name, object_id=row.pk, kept_id=keep_id, data=data, deleted_at=timezone.now(),
+                ))
+            DeletedDuplicate.objects.bulk_create(backups)
+            rows.delete()
+
+
+def restore_duplicates(apps, schema_editor):
+    DeletedDuplicate = apps.get_model('interface', 'DeletedDuplicate')
+    for model_name, _, _, m2m_fields in DUPLICATE_GROUPS:
+        model = apps.get_model('interface', model_name)
+        fields = {field.attname: field for field in model._meta.concrete_fields}
+        backups = DeletedDuplicate.objects.filter(model=model_name)
+        for backup in backups:
+            data = dict(backup.data)
+            relations = {name: data.pop(name, []) for name in m2m_fields}
+            row = model(**{name: fields[name].to_python(value) for name, value in data.items()})
+            row.save(force_insert=True)
+            for name, pks in relations.items():
+                getattr(row, name).set(pks)
+        backups.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interface', '0059_competition_teardown_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedDuplicate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100, verbose_name='Модель')),
+                ('object_id', models.PositiveIntegerField(verbose_name='id записи')),
+                ('kept_id', models.PositiveIntegerField(verbose_name='id оставленной записи')),
+                ('data', models.JSONField(verbose_name='Данные')),
+                ('deleted_at', models.DateTimeField(default=timezone.now, verbose_name='Удалено')),
+            ],
+            options={
+                'verbose_name': 'Удалённый дубликат',
+                'verbose_name_plural': 'Удалённые дубликаты',
+            },
+        ),
+        migrations.RunPython(remove_duplicates, restore_duplicates),
+        migrations.AddIndex(
+            model_name='competition2user',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['competition'], name='competition2user_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lab',
+            index=models.Index(fields=['name'], name='lab_name_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='answers',
+            constraint=models.UniqueConstraint(condition=models.Q(('lab_task__isnull', False), ('user__isnull', False)), fields=('user', 'lab', 'lab_task'), name='answers_unique_user_task'),
+        ),
+        migrations.AddConstraint(
+            model_name='answers',
+            constraint=models.UniqueConstraint(condition=models.Q(('lab_task__isnull', False), ('team__isnull', False)), fields=('team', 'lab', 'lab_task'), name='answers_unique_team_task'),
+        ),
+        migrations.AddConstraint(
+            model_name='competition2user',
+            constraint=models.UniqueConstraint(fields=('competition', 'user'), name='competition2user_unique'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Индексы таблицы ответов. На PostgreSQL создаются CONCURRENTLY, чтобы не блокировать
+# запись ответов во время экзамена, поэтому миграция не атомарная.
+
+from django.db import migrations, models
+
+from interface.migration_utils import DatabaseAwareMigration
+
+ANSWERS_INDEXES = [
+    (
+        models.Index(condition=models.Q(('user__isnull', False)), fields=['lab', 'user', 'datetime'],
+                     name='answers_lab_user_time_idx'),
+        '"lab_id", "user_id", "datetime"',
+        'WHERE "user_id" IS NOT NULL',
+    ),
+    (
+        models.Index(condition=models.Q(('team__isnull', False)), fields=['lab', 'team', 'datetime'],
+                     name='answers_lab_team_time_idx'),
+        '"lab_id", "team_id", "datetime"',
+        'WHERE "team_id" IS NOT NULL',
+    ),
+    (
+        models.Index(fields=['lab', 'datetime'], name='answers_lab_time_idx'),
+        '"lab_id", "datetime"',
+        '',
+    ),
+]
+
+
+class Migration(DatabaseAwareMigration):
+    atomic = False
+
+    dependencies = [
+        ('interface', '0060_answers_competition2user_indexes'),
+    ]
+
+    operations = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for index, columns, condition in ANSWERS_INDEXES:
+            self.operations.append(migrations.SeparateDatabaseAndState(
+                state_operations=[migrations.AddIndex(model_name='answers', index=index)],
+                database_operations=[self.create_database_specific_operation(
+                    sqlite_sql=f'CREATE INDEX IF NOT EXISTS "{index.name}" ON "interface_answers" ({columns}) {condition};',
+                    postgresql_sql=f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index.name}" '
+                                   f'ON "interface_answers" ({columns}) {condition};',
+                    sqlite_reverse_sql=f'DROP INDEX IF EXISTS "{index.name}";',
+                    postgresql_reverse_sql=f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}";',
+                )],
+            ))
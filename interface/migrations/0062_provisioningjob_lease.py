@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interface', '0061_answers_time_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='provisioningjob',
+            name='lease',
+            field=models.CharField(blank=True, help_text='Выдаётся при захвате задания; результат записывает только её владелец', max_length=32, verbose_name='Метка выполнения'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 17:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interface', '0062_provisioningjob_lease'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='provisioningjob',
+            name='kind',
+            field=models.CharField(choices=[('LAB_CREATE', 'Создание лабы'), ('LAB_DELETE', 'Удаление лабы'), ('WORKSPACE_CHANGE', 'Смена рабочей папки'), ('PASSWORD_CHANGE', 'Смена пароля'), ('DIRECTORY_CREATE', 'Создание папки'), ('ELASTIC_USER_CREATE', 'Создание пользователя Elasticsearch'), ('ROSTER_IMPORT', 'Зачисление студентов из списка')], max_length=32, verbose_name='Тип'),
+        ),
+    ]
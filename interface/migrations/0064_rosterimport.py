@@ -0,0 +1,44 @@
+# Generated by Django 5.0.3 on 2026-10-18 18:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def move_rows_out_of_payload(apps, schema_editor):
+    """Переносит списки студентов с паролями из данных заданий; у завершённых заданий — удаляет."""
+    ProvisioningJob = apps.get_model('interface', 'ProvisioningJob')
+    RosterImport = apps.get_model('interface', 'RosterImport')
+    for job in ProvisioningJob.objects.filter(kind='ROSTER_IMPORT'):
+        rows = job.payload.pop('rows', None)
+        if rows is None:
+            continue
+        if job.status in ('PENDING', 'RUNNING'):
+            RosterImport.objects.create(job=job, rows=rows)
+            job.payload['students'] = len(rows)
+            job.max_attempts = 1
+        job.save(update_fields=['payload', 'max_attempts'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interface', '0063_alter_provisioningjob_kind'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RosterImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rows', models.JSONField(verbose_name='Строки списка')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Загружен')),
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='roster', to='interface.provisioningjob', verbose_name='Задание')),
+            ],
+            options={
+                'verbose_name': 'Загруженный список студентов',
+                'verbose_name_plural': 'Загруженные списки студентов',
+            },
+        ),
+        migrations.RunPython(move_rows_out_of_payload, migrations.RunPython.noop),
+    ]
@@ -14,11 +14,11 @@ from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.conf import settings
 from interface.eveFunctions import pf_login, logout, create_directory, get_user_workspace_relative_path
-from interface.config import get_pnet_url, get_pnet_base_dir
+from interface.config import get_pnet_url, get_pnet_base_dir, get_pnet_lab_cloning
+from interface.pnet_session_manager import GOLDEN_LAB_OWNER, PNetSessionManager
 from interface.utils import get_pnet_lab_name
 from .validators import validate_top_level_array, validate_lab_task_json_config
-from .pnet_session_manager import ensure_admin_pnet_session, execute_pnet_operation_if_needed
-from .elastic_utils import delete_elastic_user
+from .elastic_utils import delete_elastic_user, defer_user_deletion
 logger = logging.getLogger(__name__)
 
 
@@ -93,6 +93,10 @@ class Lab(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['slug', 'lab_type'], name='unique_slug_labtype')
         ]
+        indexes = [
+            # Поиск задания чекером по имени лабы (pnet_slug индексируется как SlugField)
+            models.Index(fields=['name'], name='lab_name_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         # Генерируем slug на основе имени
@@ -199,6 +203,9 @@ class User(AbstractUser):
         Удалить пользователя из Elasticsearch при удалении из базы данных
         """
         if hasattr(instance, 'pnet_login') and instance.pnet_login and instance.pnet_login.strip():
+            # Внутри user_deletion_batch() удаление выполнится одним пакетом в конце блока
+            if defer_user_deletion(instance.pnet_login):
+                return
             try:
                 elastic_result = delete_elastic_user(instance.pnet_login)
                 if elastic_result == 'deleted':
@@ -231,9 +238,11 @@ class Team(models.Model):
     def post_create(cls, sender, instance, created, *args, **kwargs):
         if not created:
             return
-        pnet_session = ensure_admin_pnet_session()
-        with pnet_session:
-            pnet_session.create_directory(get_pnet_base_dir(), instance.slug)
+        ProvisioningJob.enqueue(
+            ProvisioningJob.Kind.DIRECTORY_CREATE,
+            f"directory:team:{instance.slug}",
+            {"path": get_pnet_base_dir(), "name": instance.slug},
+        )
 
 class Answers(models.Model):
     lab = models.ForeignKey(Lab, related_name="lab", on_delete=models.CASCADE)
@@ -248,6 +257,18 @@ class Answers(models.Model):
         else:
             return str(self.lab.name + " " + self.team.slug)
 
+    @classmethod
+    def mark_finished(cls, competition, user=None, team=None):
+        """
+        Отметка о завершении лабы в ``competition``. Отметка ставится, только если в окне
+        соревнования её ещё нет; отметки прошлых соревнований по той же лабе не меняются.
+        """
+        window = {'datetime__gte': competition.start, 'datetime__lte': competition.finish}
+        existing = cls.objects.filter(lab=competition.lab, user=user, team=team, lab_task=None, **window).first()
+        if existing is not None:
+            return existing, False
+        return cls.objects.create(lab=competition.lab, user=user, team=team, datetime=timezone.now()), True
+
     class Meta:
         verbose_name = 'Ответ'
         verbose_name_plural = 'Ответы'
@@ -258,7 +279,28 @@ class Answers(models.Model):
                         Q(user__isnull=True, team__isnull=False)
                 ),
                 name="%(app_label)s_%(class)s_exclusive_user_team"
-            )
+            ),
+            # Ответ на задание один на участника — на это рассчитаны update_or_create в API.
+            # Отметки о завершении лабы (lab_task=NULL) не ограничены: их ставят в каждом
+            # соревновании по лабе, см. mark_finished
+            models.UniqueConstraint(
+                fields=['user', 'lab', 'lab_task'],
+                condition=Q(user__isnull=False, lab_task__isnull=False),
+                name='answers_unique_user_task',
+            ),
+            models.UniqueConstraint(
+                fields=['team', 'lab', 'lab_task'],
+                condition=Q(team__isnull=False, lab_task__isnull=False),
+                name='answers_unique_team_task',
+            ),
+        ]
+        indexes = [
+            # Ответы участника или команды за время соревнования (таблица результатов, страница экзамена)
+            models.Index(fields=['lab', 'user', 'datetime'], condition=Q(user__isnull=False),
+                         name='answers_lab_user_time_idx'),
+            models.Index(fields=['lab', 'team', 'datetime'], condition=Q(team__isnull=False),
+                         name='answers_lab_team_time_idx'),
+            models.Index(fields=['lab', 'datetime'], name='answers_lab_time_idx'),
         ]
 
 class Kkz(models.Model):
@@ -347,19 +389,35 @@ class Competition(models.Model):
             raise ValidationError("Экзамен уже закончился!")
 
     def delete(self, *args, **kwargs):
-
-        def _delete_operation(session_manager):
-            with session_manager:
-                for issue in self.competition_users.all():
-                    issue.delete()
-
-        execute_pnet_operation_if_needed(self.lab, _delete_operation)
+        # Удаление лаб в PNET ставится в очередь заданий
+        for issue in self.competition_users.all():
+            issue.delete()
+        self.delete_golden_lab()
 
         super(Competition, self).delete(*args, **kwargs)
 
+    def delete_golden_lab(self):
+        """Ставит в очередь удаление эталонной лабы, из которой копировались лабы участников."""
+        if not get_pnet_lab_cloning():
+            return
+        ProvisioningJob.enqueue(
+            ProvisioningJob.Kind.LAB_DELETE,
+            f"lab_delete:golden:{self.pk}",
+            {
+                "lab_name": PNetSessionManager.golden_lab_name(get_pnet_lab_name(self)),
+                "owner": GOLDEN_LAB_OWNER,
+            },
+            group=self.slug,
+            lab=self.lab,
+        )
+
     class Meta:
         verbose_name = 'Экзамен'
         verbose_name_plural = 'Экзамены'
+        indexes = [
+            # Страховочная очистка ищет завершившиеся соревнования с неудалёнными лабами
+            models.Index(fields=['deleted', 'finish'], name='competition_teardown_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         # Generate slug only once on creation; preserve on updates
@@ -402,9 +460,9 @@ class Competition2User(models.Model):
         if self.deleted:
             return
 
-        execute_pnet_operation_if_needed(
-            self.competition.lab,
-            lambda session_manager: session_manager.delete_lab_for_user(get_pnet_lab_name(self.competition), self.user.username)
+        ProvisioningJob.enqueue_lab_delete(
+            self.competition, f"c2u:{self.pk}",
+            {"lab_name": get_pnet_lab_name(self.competition), "owner": self.user.username},
         )
 
         self.deleted = True
@@ -414,22 +472,37 @@ class Competition2User(models.Model):
     class Meta:
         verbose_name = 'Задание участника'
         verbose_name_plural = 'Задания участников'
+        constraints = [
+            models.UniqueConstraint(fields=['competition', 'user'], name='competition2user_unique'),
+        ]
+        indexes = [
+            # Лабы соревнования, ещё не удалённые из PNET (очистка после окончания)
+            models.Index(fields=['competition'], condition=Q(deleted=False), name='competition2user_active_idx'),
+        ]
 
     def delete(self, *args, **kwargs):
         self.delete_from_platform(final=True)
         super(Competition2User, self).delete(*args, **kwargs)
 
+    def lab_create_job(self):
+        """Ключ, данные, группа и лаба задания на создание лабы участника в PNET."""
+        return (
+            f"lab_create:c2u:{self.pk}",
+            {
+                "lab_id": self.competition.lab_id,
+                "lab_name": get_pnet_lab_name(self.competition),
+                "owner": self.user.username,
+            },
+            self.competition.slug,
+            self.competition.lab,
+        )
+
     @classmethod
     def post_create(cls, sender, instance, created, *args, **kwargs):
         if not created:
             return
-        lab = instance.competition.lab
-
-        def _create_operation(session_manager):
-            session_manager.create_lab_for_user(get_pnet_lab_name(instance.competition), instance.user.username)
-            session_manager.create_lab_nodes_and_connectors(lab, get_pnet_lab_name(instance.competition), instance.user.username)
-
-        execute_pnet_operation_if_needed(lab, _create_operation)
+        key, payload, group, lab = instance.lab_create_job()
+        ProvisioningJob.enqueue(ProvisioningJob.Kind.LAB_CREATE, key, payload, group=group, lab=lab)
 
 
 class TeamCompetition(Competition):
@@ -470,34 +543,50 @@ class TeamCompetition2Team(models.Model):
     def post_create(cls, sender, instance, created, *args, **kwargs):
         if not created:
             return
-        lab = instance.competition.lab
-
-        def _create_operation(session_manager):
-            session_manager.create_lab_for_user(get_pnet_lab_name(instance.competition), instance.team.slug)
-            session_manager.create_lab_nodes_and_connectors(lab, get_pnet_lab_name(instance.competition), instance.team.slug)
-
-            relative_path = f'{get_user_workspace_relative_path()}/{instance.team.slug}'
-            logger.debug(f'competition created for team {instance.team.slug}')
-            for user in instance.team.users.all():
-                logger.debug(f'change workspace for {user.pnet_login} to {relative_path}')
-                session_manager.change_user_workspace(
-                    user.pnet_login, relative_path
-                )
+        competition = instance.competition
+        team_slug = instance.team.slug
+        ProvisioningJob.enqueue(
+            ProvisioningJob.Kind.LAB_CREATE,
+            f"lab_create:c2t:{instance.pk}",
+            {
+                "lab_id": competition.lab_id,
+                "lab_name": get_pnet_lab_name(competition),
+                "owner": team_slug,
+            },
+            group=competition.slug,
+            lab=competition.lab,
+        )
 
-        execute_pnet_operation_if_needed(lab, _create_operation)
+        relative_path = f'{get_user_workspace_relative_path()}/{team_slug}'
+        for pnet_login in instance.team.users.values_list('pnet_login', flat=True):
+            ProvisioningJob.enqueue(
+                ProvisioningJob.Kind.WORKSPACE_CHANGE,
+                f"workspace:c2t:{instance.pk}:{pnet_login}:team",
+                {"pnet_login": pnet_login, "workspace": relative_path},
+                group=competition.slug,
+                lab=competition.lab,
+            )
 
     def delete_from_platform(self, final=False):
         if self.deleted and not final:
             return
 
-        def _delete_operation(session_manager):
-            session_manager.delete_lab_for_team(get_pnet_lab_name(self.competition), self.team.slug)
-            for user in self.team.users.all():
-                session_manager.change_user_workspace(
-                    user.pnet_login, f'{get_user_workspace_relative_path()}/{user.pnet_login}'
-                )
-
-        execute_pnet_operation_if_needed(self.competition.lab, _delete_operation)
+        competition = self.competition
+        ProvisioningJob.enqueue_lab_delete(
+            competition, f"c2t:{self.pk}",
+            {"lab_name": get_pnet_lab_name(competition), "owner": self.team.slug, "team": True},
+        )
+        workspace_path = get_user_workspace_relative_path()
+        for pnet_login in self.team.users.values_list('pnet_login', flat=True):
+            if ProvisioningJob.cancel_pending(f"workspace:c2t:{self.pk}:{pnet_login}:team"):
+                continue
+            ProvisioningJob.enqueue(
+                ProvisioningJob.Kind.WORKSPACE_CHANGE,
+                f"workspace:c2t:{self.pk}:{pnet_login}:personal",
+                {"pnet_login": pnet_login, "workspace": f'{workspace_path}/{pnet_login}'},
+                group=competition.slug,
+                lab=competition.lab,
+            )
 
         self.deleted = True
         if not final:
@@ -509,7 +598,156 @@ class TeamCompetition2Team(models.Model):
         instance.delete_from_platform(final=True)
 
 
+class CompetitionChange(models.Model):
+    """
+    Лента изменений экзаменов. Автоинкрементный id служит монотонной ревизией:
+    клиент передаёт последнюю увиденную ревизию и получает только новые изменения.
+    """
+    competition = models.ForeignKey(
+        Competition,
+        on_delete=models.CASCADE,
+        related_name='changes',
+        verbose_name='Экзамен'
+    )
+    action = models.CharField('Действие', max_length=32)
+    datetime = models.DateTimeField('Время', default=timezone.now)
 
+    class Meta:
+        verbose_name = 'Изменение экзамена'
+        verbose_name_plural = 'Изменения экзаменов'
+
+
+class ProvisioningJob(models.Model):
+    """
+    Задание очереди подготовки лаб: операция в PNET или Elasticsearch,
+    выполняемая вне веб-запроса (см. ``interface.jobs``).
+    Ключ идемпотентности не даёт поставить одну и ту же операцию дважды.
+    """
+
+    class Kind(models.TextChoices):
+        LAB_CREATE = "LAB_CREATE", "Создание лабы"
+        LAB_DELETE = "LAB_DELETE", "Удаление лабы"
+        WORKSPACE_CHANGE = "WORKSPACE_CHANGE", "Смена рабочей папки"
+        PASSWORD_CHANGE = "PASSWORD_CHANGE", "Смена пароля"
+        DIRECTORY_CREATE = "DIRECTORY_CREATE", "Создание папки"
+        ELASTIC_USER_CREATE = "ELASTIC_USER_CREATE", "Создание пользователя Elasticsearch"
+        ROSTER_IMPORT = "ROSTER_IMPORT", "Зачисление студентов из списка"
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "В очереди"
+        RUNNING = "RUNNING", "Выполняется"
+        DONE = "DONE", "Выполнено"
+        FAILED = "FAILED", "Ошибка"
+
+    kind = models.CharField('Тип', max_length=32, choices=Kind.choices)
+    status = models.CharField('Статус', max_length=16, choices=Status.choices, default=Status.PENDING)
+    idempotency_key = models.CharField('Ключ идемпотентности', max_length=255, unique=True)
+    group = models.CharField('Группа', max_length=255, blank=True, db_index=True,
+                             help_text='Slug экзамена, к которому относится задание')
+    payload = models.JSONField('Данные', default=dict, blank=True)
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveIntegerField('Максимум попыток', default=3)
+    run_after = models.DateTimeField('Не раньше', default=timezone.now)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    lease = models.CharField('Метка выполнения', max_length=32, blank=True,
+                             help_text='Выдаётся при захвате задания; результат записывает только её владелец')
+    created_at = models.DateTimeField('Создано', default=timezone.now)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Задание подготовки'
+        verbose_name_plural = 'Задания подготовки'
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='provisioning_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} ({self.idempotency_key})"
+
+    @classmethod
+    def enqueue(cls, kind, key, payload, group="", lab=None):
+        """
+        Ставит задание в очередь. Для лаб без PNET ничего не делает.
+        Повторная постановка с тем же ключом возвращает уже существующее задание.
+        """
+        if lab is not None and lab.get_platform() not in ("PN", "CMD"):
+            return None
+        job, _ = cls.objects.get_or_create(
+            idempotency_key=key,
+            defaults={"kind": kind, "payload": payload, "group": group},
+        )
+        return job
+
+    @classmethod
+    def enqueue_many(cls, kind, items):
+        """
+        Ставит в очередь пачку заданий одного вида одним запросом.
+        ``items`` — кортежи (ключ, данные, группа, лаба); задания для лаб без PNET
+        и с уже занятым ключом пропускаются.
+        """
+        jobs = [
+            cls(kind=kind, idempotency_key=key, payload=payload, group=group)
+            for key, payload, group, lab in items
+            if lab is None or lab.get_platform() in ("PN", "CMD")
+        ]
+        return cls.objects.bulk_create(jobs, ignore_conflicts=True)
+
+    @classmethod
+    def cancel_pending(cls, key):
+        """Снимает ещё не начатое задание. Возвращает True, если оно было снято."""
+        deleted, _ = cls.objects.filter(idempotency_key=key, status=cls.Status.PENDING).delete()
+        return deleted > 0
+
+    @classmethod
+    def enqueue_lab_delete(cls, competition, owner_key, payload):
+        """
+        Ставит удаление лабы. Если создание этой лабы ещё ждёт в очереди,
+        снимает его вместо того, чтобы удалять несозданную лабу.
+        """
+        if cls.cancel_pending(f"lab_create:{owner_key}"):
+            return None
+        return cls.enqueue(
+            cls.Kind.LAB_DELETE, f"lab_delete:{owner_key}", payload,
+            group=competition.slug, lab=competition.lab,
+        )
+
+
+class RosterImport(models.Model):
+    """
+    Список студентов, загруженный в админке, до выполнения задания зачисления.
+    В списке есть пароли, поэтому он хранится отдельно от данных задания
+    и удаляется, как только задание выполнено или завершилось ошибкой.
+    """
+    job = models.OneToOneField(ProvisioningJob, on_delete=models.CASCADE, related_name='roster',
+                               verbose_name='Задание')
+    rows = models.JSONField('Строки списка')
+    created_at = models.DateTimeField('Загружен', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Загруженный список студентов'
+        verbose_name_plural = 'Загруженные списки студентов'
+
+    def __str__(self):
+        return f"Список студентов ({len(self.rows)})"
+
+
+class DeletedDuplicate(models.Model):
+    """
+    Копия записи, удалённой миграцией как дубликат перед добавлением ограничения
+    уникальности. Обратная миграция восстанавливает записи из этих копий.
+    """
+    model = models.CharField('Модель', max_length=100)
+    object_id = models.PositiveIntegerField('id записи')
+    kept_id = models.PositiveIntegerField('id оставленной записи')
+    data = models.JSONField('Данные')
+    deleted_at = models.DateTimeField('Удалено', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Удалённый дубликат'
+        verbose_name_plural = 'Удалённые дубликаты'
+
+    def __str__(self):
+        return f"{self.model} #{self.object_id}"
 
 
 post_save.connect(Competition2User.post_create, sender=Competition2User)
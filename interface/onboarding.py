@@ -0,0 +1,249 @@
+"""
+Массовое зачисление студентов по списку (CSV или JSON).
+
+Пользователи Django создаются одним ``bulk_create``, пароли хэшируются в пуле
+процессов. Папки и пользователи PNET создаются в одной административной сессии:
+папки — параллельно, пользователи — одним ``sync_users``. Пользователи
+Elasticsearch создаются одним ``bulk_create_elastic_users``, а тем, кого создать
+не удалось, ставится задание в очереди.
+
+Повторный запуск с тем же списком продолжает с места остановки: существующие
+пользователи не пересоздаются, а шаги PNET и Elasticsearch выполняются только
+для тех, кому они ещё нужны.
+"""
+import csv
+import io
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from slugify import slugify
+
+from .config import get_pnet_base_dir
+from .elastic_utils import bulk_create_elastic_users, get_elastic_usernames, transliterate_username
+from .models import Platoon, ProvisioningJob, User
+from .pnet_session_manager import ensure_admin_pnet_session
+from .provisioning import host_semaphore
+from .utils import get_pnet_password
+
+logger = logging.getLogger(__name__)
+
+# Пароль по умолчанию, как в форме создания пользователя
+DEFAULT_PASSWORD = "test.test"
+ROSTER_FIELDS = ("username", "first_name", "last_name", "password", "platoon")
+
+CREATED = "created"
+EXISTS = "exists"
+QUEUED = "queued"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+@dataclass
+class OnboardingOutcome:
+    username: str
+    pnet_login: str = ""
+    user: str = ""
+    pnet: str = ""
+    elastic: str = ""
+    error: str = ""
+
+    @property
+    def ok(self):
+        return not self.error
+
+
+def read_roster(stream, filename=""):
+    """
+    Читает список студентов из CSV (заголовок: username, first_name, last_name,
+    password, platoon; разделитель «,» или «;») или JSON (массив объектов с теми же полями).
+    """
+    content = stream.read()
+    if isinstance(content, bytes):
+        content = content.decode("utf-8-sig")
+
+    if filename.lower().endswith(".json") or content.lstrip().startswith("["):
+        rows = json.loads(content)
+        if not isinstance(rows, list):
+            raise ValueError("JSON-список студентов должен быть массивом объектов")
+    else:
+        delimiter = ";" if content.partition("\n")[0].count(";") > content.partition("\n")[0].count(",") else ","
+        rows = list(csv.DictReader(io.StringIO(content), delimiter=delimiter))
+
+    return [
+        {field: str(row.get(field) or "").strip() for field in ROSTER_FIELDS}
+        for row in rows
+    ]
+
+
+def _hash_workers():
+    return getattr(settings, 'ONBOARDING_HASH_WORKERS', None) or os.cpu_count() or 1
+
+
+def hash_passwords(passwords, workers=None):
+    """Хэширует пароли в пуле процессов (``workers`` <= 1 — в текущем процессе)."""
+    workers = min(workers or _hash_workers(), len(passwords))
+    if workers <= 1:
+        return [make_password(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(make_password, passwords, chunksize=chunksize))
+
+
+def _prepare(rows, outcomes):
+    """Проверяет строки списка; возвращает строки без ошибок с вычисленными username и pnet_login."""
+    platoons = Platoon.objects.in_bulk(field_name='number')
+    seen = set()
+    prepared = []
+    for row in rows:
+        username = row["username"] or (
+            f'{row["last_name"]}_{row["first_name"]}' if row["last_name"] and row["first_name"] else ""
+        )
+        outcome = OnboardingOutcome(username=username, pnet_login=slugify(username))
+        outcomes.append(outcome)
+
+        if not username:
+            outcome.error = "Не заданы username или фамилия и имя"
+        elif not outcome.pnet_login:
+            outcome.error = "Из имени пользователя не получается логин PNET"
+        elif username in seen:
+            outcome.error = "Пользователь повторяется в списке"
+        elif row["platoon"] and not row["platoon"].isdigit():
+            outcome.error = f'Некорректный номер взвода: {row["platoon"]}'
+        elif row["platoon"] and int(row["platoon"]) not in platoons:
+            outcome.error = f'Взвод {row["platoon"]} не найден'
+        if outcome.error:
+            continue
+
+        seen.add(username)
+        prepared.append((row, outcome, platoons.get(int(row["platoon"])) if row["platoon"] else None))
+    return prepared
+
+
+def create_users(rows, outcomes, hash_workers=None):
+    """Создаёт отсутствующих пользователей Django. Возвращает пользователей всех корректных строк."""
+    prepared = _prepare(rows, outcomes)
+    existing = User.objects.in_bulk([outcome.username for _, outcome, _ in prepared], field_name='username')
+
+    new = [(row, outcome, platoon) for row, outcome, platoon in prepared if outcome.username not in existing]
+    passwords = [row["password"] or DEFAULT_PASSWORD for row, _, _ in new]
+    hashes = hash_passwords(passwords, hash_workers) if new else []
+
+    default_platoon = None
+    users = []
+    for (row, outcome, platoon), password, password_hash in zip(new, passwords, hashes):
+        if platoon is None:
+            default_platoon = default_platoon or Platoon.objects.get_or_create(number=0)[0]
+            platoon = default_platoon
+        # bulk_create не вызывает User.save, поэтому pnet_login вычисляем здесь
+        users.append(User(
+            username=outcome.username,
+            first_name=row["first_name"],
+            last_name=row["last_name"],
+            platoon=platoon,
+            password=password_hash,
+            pnet_login=outcome.pnet_login,
+            pnet_password=get_pnet_password(password),
+        ))
+
+    with transaction.atomic():
+        User.objects.bulk_create(users, batch_size=500)
+
+    for _, outcome, _ in prepared:
+        outcome.user = EXISTS if outcome.username in existing else CREATED
+    return list(User.objects.filter(username__in=[outcome.username for _, outcome, _ in prepared]))
+
+
+def provision_pnet_users(users, outcomes_by_username):
+    """Создаёт папки и пользователей PNET в одной административной сессии."""
+    session_manager = ensure_admin_pnet_session()
+    if not session_manager._url:
+        for user in users:
+            outcomes_by_username[user.username].pnet = SKIPPED
+        return
+
+    with session_manager:
+        directory = session_manager.session_index.users
+        by_login = {user.pnet_login: user for user in users}
+        missing = directory.missing_users(list(by_login))
+
+        # Папки для новых пользователей PNET — параллельно, с лимитом на хост
+        semaphore = host_semaphore(session_manager._url)
+
+        def create_directory(pnet_login):
+            with semaphore:
+                session_manager.create_directory(get_pnet_base_dir(), by_login[pnet_login].username)
+
+        if missing:
+            workers = min(getattr(settings, 'PNET_USER_SYNC_CONCURRENCY', 8), len(missing))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(create_directory, missing))
+
+        result = session_manager.sync_users({
+            user.pnet_login: {"password": user.pnet_password} for user in users if user.pnet_password
+        })
+
+    errors = result.errors
+    for pnet_login, user in by_login.items():
+        outcome = outcomes_by_username[user.username]
+        if not user.pnet_password:
+            outcome.pnet = SKIPPED
+        elif pnet_login in errors:
+            outcome.pnet = FAILED
+            outcome.error = f"PNET: {errors[pnet_login]}"
+        else:
+            outcome.pnet = CREATED if pnet_login in result.created else EXISTS
+
+
+def provision_elastic_users(users, outcomes_by_username, index="suricata-*"):
+    """Создаёт пользователей Elasticsearch пакетом; неудачные ставятся в очередь заданий."""
+    existing = get_elastic_usernames()
+    if existing is None:
+        to_create, results = users, {}
+    else:
+        to_create = [user for user in users if transliterate_username(user.pnet_login) not in existing]
+        results = bulk_create_elastic_users([(user.pnet_login, user.pnet_password) for user in to_create], index)
+
+    to_create_ids = {user.pk for user in to_create}
+    for user in users:
+        outcome = outcomes_by_username[user.username]
+        if user.pk not in to_create_ids:
+            outcome.elastic = EXISTS
+        elif results.get(user.pnet_login) == 'created':
+            outcome.elastic = CREATED
+        else:
+            ProvisioningJob.enqueue(
+                ProvisioningJob.Kind.ELASTIC_USER_CREATE,
+                f"elastic_user:{user.pk}",
+                {"user_id": user.pk, "index": index},
+            )
+            outcome.elastic = QUEUED
+
+
+def onboard_students(rows, hash_workers=None, pnet=True, elastic=True):
+    """Зачисляет студентов из списка ``read_roster``. Возвращает итог по каждой строке."""
+    outcomes = []
+    users = create_users(rows, outcomes, hash_workers)
+    outcomes_by_username = {outcome.username: outcome for outcome in outcomes if outcome.ok}
+
+    if pnet and users:
+        try:
+            provision_pnet_users(users, outcomes_by_username)
+        except Exception as e:
+            logger.exception("PNET onboarding failed")
+            for user in users:
+                outcome = outcomes_by_username[user.username]
+                outcome.pnet, outcome.error = FAILED, f"PNET: {e}"
+
+    if elastic and users:
+        provision_elastic_users(users, outcomes_by_username)
+
+    logger.info(f"Onboarded {len(outcomes)} students: "
+                f"{sum(outcome.user == CREATED for outcome in outcomes)} created, "
+                f"{sum(not outcome.ok for outcome in outcomes)} failed")
+    return outcomes
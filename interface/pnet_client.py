@@ -0,0 +1,102 @@
+"""
+HTTP-клиент PNETLab с пулом keep-alive соединений.
+
+Все вызовы API из ``eveFunctions`` идут через один ``requests.Session`` на процесс:
+TCP/TLS-соединения переиспользуются, а таймауты и повторы настроены в одном месте.
+Куки сессий PNET по-прежнему передаются в каждом запросе явно, поэтому
+общий клиент не хранит состояние авторизации и безопасен для разных пользователей.
+"""
+import logging
+import threading
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .instrumentation import PNET, track
+
+logger = logging.getLogger(__name__)
+
+# Размер пула соединений к хосту PNET (на процесс)
+PNET_POOL_MAXSIZE = 32
+# Таймаут по умолчанию (подключение, чтение) для вызовов без явного таймаута
+PNET_DEFAULT_TIMEOUT = (5, 30)
+# Повторы при ошибках соединения и 502/503/504. POST повторяется только если запрос не был отправлен
+PNET_RETRIES = 2
+PNET_BACKOFF_FACTOR = 0.2
+
+DEFAULT_HEADERS = {
+    'Accept': 'application/json, text/plain, */*',
+}
+
+
+class PNetClient:
+    """Обёртка над ``requests.Session`` с пулом соединений, повторами и таймаутами по умолчанию."""
+
+    def __init__(self, pool_maxsize=PNET_POOL_MAXSIZE, timeout=PNET_DEFAULT_TIMEOUT,
+                 retries=PNET_RETRIES, backoff_factor=PNET_BACKOFF_FACTOR):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.verify = False
+        self.session.headers.update(DEFAULT_HEADERS)
+        # Не сохраняем куки ответов в общей сессии: авторизация передаётся в каждом запросе
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        with track(PNET):
+            return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_pnet_client():
+    """Возвращает общий для процесса клиент PNET, создавая его при первом обращении."""
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            _client = PNetClient()
+            logger.debug("Создан HTTP-клиент PNET")
+        return _client
+
+
+def reset_pnet_client():
+    """Закрывает соединения общего клиента; следующий вызов создаст новый."""
+    global _client
+
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
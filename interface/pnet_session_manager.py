@@ -2,12 +2,26 @@ import logging
 import threading
 from functools import wraps
 
+from django.core.cache import cache
+from slugify import slugify
+
 from interface.eveFunctions import change_user_password, create_directory, create_user, pf_login, create_lab, logout, create_all_lab_nodes_and_connectors, \
-    delete_lab_with_session_destroy, change_user_workspace
-from interface.config import get_pnet_url, get_pnet_base_dir
+    delete_lab_with_session_destroy, change_user_workspace, PNetSessionIndex, lab_exists, clone_lab, move_lab, delete_lab, \
+    pnet_response_ok, topology_digest
+from interface.config import get_pnet_url, get_pnet_base_dir, get_pnet_lab_cloning
 
 logger = logging.getLogger(__name__)
 
+# Папка в PNET_BASE_DIR, где лежат эталонные лабы экзаменов
+GOLDEN_LAB_OWNER = 'golden-labs'
+# Ответы PNET, означающие, что API копирования лаб не поддерживается
+CLONING_UNSUPPORTED_STATUSES = (404, 405, 501)
+
+
+def golden_topology_cache_key(golden_path):
+    """Ключ кэша с хэшем топологии, из которой собрана эталонная лаба (общий для процессов)."""
+    return f"golden_lab_topology:{golden_path}"
+
 
 def require_pnet_url(func):
     """
@@ -121,6 +135,10 @@ class PNetSessionManager:
         self._cookie = None
         self._xsrf = None
         self._is_authenticated = False
+        self._session_index = None
+        self._golden_labs = {}
+        self._golden_locks = {}
+        self._cloning_unsupported = False
         self._lock = threading.Lock()  # Блокировка для thread-safety
 
     def __enter__(self):
@@ -162,6 +180,8 @@ class PNetSessionManager:
                     self._is_authenticated = False
                     self._cookie = None
                     self._xsrf = None
+                    self._session_index = None
+                    self._golden_labs = {}
 
     @property
     def session_data(self):
@@ -173,6 +193,15 @@ class PNetSessionManager:
                 raise RuntimeError("Сессия не активна. Вызовите login() сначала")
             return self._url, self._cookie, self._xsrf
 
+    @property
+    def session_index(self):
+        """Индекс сессий и пользователей PNET, общий для всех операций до логаута"""
+        url, cookie, xsrf = self.session_data
+        with self._lock:
+            if self._session_index is None:
+                self._session_index = PNetSessionIndex(url, cookie, xsrf)
+            return self._session_index
+
     @require_pnet_url
     def create_lab_for_user(self, lab_name, username):
         """Создание лаборатории для пользователя"""
@@ -181,9 +210,10 @@ class PNetSessionManager:
 
     @require_pnet_url
     def create_lab_nodes_and_connectors(self, lab, lab_name, username):
-        """Создание узлов и коннекторов для пользователя"""
+        """Создание узлов и коннекторов для пользователя. Возвращает ошибки по элементам топологии"""
         url, cookie, xsrf = self.session_data
-        create_all_lab_nodes_and_connectors(url, lab, get_pnet_base_dir(), lab_name, cookie, xsrf, username)
+        return create_all_lab_nodes_and_connectors(url, lab, get_pnet_base_dir(), lab_name, cookie, xsrf, username,
+                                                   self.session_index)
 
     @require_pnet_url
     def delete_lab_for_team(self, lab_name, team_slug):
@@ -191,7 +221,7 @@ class PNetSessionManager:
         url, cookie, xsrf = self.session_data
         delete_lab_with_session_destroy(
             url, lab_name,
-            get_pnet_base_dir(), cookie, xsrf, team_slug
+            get_pnet_base_dir(), cookie, xsrf, team_slug, self.session_index
         )
 
     @require_pnet_url
@@ -200,20 +230,28 @@ class PNetSessionManager:
         url, cookie, xsrf = self.session_data
         delete_lab_with_session_destroy(
             url, lab_name,
-            get_pnet_base_dir(), cookie, xsrf, username
+            get_pnet_base_dir(), cookie, xsrf, username, self.session_index
         )
 
     @require_pnet_url
     def change_user_workspace(self, username, workspace_path):
         """Изменение рабочего пространства пользователя"""
         url, cookie, xsrf = self.session_data
-        change_user_workspace(url, cookie, xsrf, username, workspace_path)
+        change_user_workspace(url, cookie, xsrf, username, workspace_path, self.session_index)
 
     @require_pnet_url
     def change_user_password(self, username, password):
         """Изменение пароля пользователя"""
         url, cookie, xsrf = self.session_data
-        change_user_password(url, cookie, xsrf, username, password)
+        change_user_password(url, cookie, xsrf, username, password, self.session_index)
+
+    @require_pnet_url
+    def sync_users(self, desired_state):
+        """
+        Синхронизация пользователей PNET с желаемым состоянием {логин: {поле: значение}}.
+        Таблица пользователей общая для всех операций до логаута.
+        """
+        return self.session_index.users.sync_users(desired_state)
 
     @require_pnet_url
     def create_directory(self, path, dir_name):
@@ -226,3 +264,92 @@ class PNetSessionManager:
         """Создание пользователя"""
         url, cookie, xsrf = self.session_data
         create_user(url, username, password, '1', cookie, xsrf)
+
+    def _golden_lock(self, lab_name):
+        with self._lock:
+            return self._golden_locks.setdefault(lab_name, threading.Lock())
+
+    @staticmethod
+    def golden_lab_name(lab_name):
+        return f"{lab_name}-golden"
+
+    @require_pnet_url
+    def ensure_golden_lab(self, lab, lab_name):
+        """
+        Эталонная лаба экзамена: собирается один раз и переиспользуется, пока не изменилась
+        топология лабы. Для уже существующего эталона хэш топологии, из которой он собран,
+        берётся из кэша; если хэш другой или неизвестен, эталон пересобирается.
+        Возвращает её путь (без .unl) или None, если собрать её не удалось.
+        """
+        url, cookie, xsrf = self.session_data
+        base_dir = get_pnet_base_dir()
+        golden_name = self.golden_lab_name(lab_name)
+        golden_path = f"{base_dir}/{GOLDEN_LAB_OWNER}/{golden_name}"
+        digest = topology_digest(lab)
+
+        with self._golden_lock(lab_name):
+            if lab_name in self._golden_labs and self._golden_labs[lab_name][0] == digest:
+                return self._golden_labs[lab_name][1]
+
+            exists = lab_exists(url, golden_path, cookie)
+            if exists and cache.get(golden_topology_cache_key(golden_path)) != digest:
+                logger.info(f"Lab topology changed, rebuilding golden lab {golden_path}")
+                delete_lab_with_session_destroy(url, golden_name, base_dir, cookie, xsrf, GOLDEN_LAB_OWNER,
+                                                self.session_index)
+                exists = False
+
+            if not exists:
+                create_directory(url, base_dir, GOLDEN_LAB_OWNER, cookie)
+                create_lab(url, golden_name, "", base_dir, cookie, xsrf, GOLDEN_LAB_OWNER)
+                failures = create_all_lab_nodes_and_connectors(
+                    url, lab, base_dir, golden_name, cookie, xsrf, GOLDEN_LAB_OWNER, self.session_index
+                )
+                if failures or not lab_exists(url, golden_path, cookie):
+                    # Неполную эталонную лабу не копируем
+                    logger.error(f"Golden lab {golden_path} was not built, falling back to per-element provisioning")
+                    delete_lab_with_session_destroy(url, golden_name, base_dir, cookie, xsrf, GOLDEN_LAB_OWNER,
+                                                    self.session_index)
+                    golden_path = None
+                else:
+                    cache.set(golden_topology_cache_key(golden_path), digest, None)
+
+            self._golden_labs[lab_name] = (digest, golden_path)
+            return golden_path
+
+    @require_pnet_url
+    def clone_lab_for_user(self, lab, lab_name, username):
+        """
+        Копирует эталонную лабу в папку пользователя или команды.
+        Возвращает False, если копирование недоступно и лабу нужно собрать поэлементно.
+        """
+        if self._cloning_unsupported:
+            return False
+        golden_path = self.ensure_golden_lab(lab, lab_name)
+        if not golden_path:
+            return False
+
+        url, cookie, xsrf = self.session_data
+        base_dir = get_pnet_base_dir()
+        copy_path = f"{base_dir}/{GOLDEN_LAB_OWNER}/{lab_name}"
+        # Копия появляется рядом с эталоном под именем lab_name, поэтому копируем по одной
+        with self._golden_lock(lab_name):
+            r = clone_lab(url, golden_path, lab_name, cookie)
+            if not pnet_response_ok(r):
+                if r.status_code in CLONING_UNSUPPORTED_STATUSES:
+                    logger.warning("PNET does not support lab cloning, using per-element provisioning")
+                    self._cloning_unsupported = True
+                return False
+            if not pnet_response_ok(move_lab(url, copy_path, f"{base_dir}/{slugify(username)}", cookie)):
+                delete_lab(url, cookie, copy_path)
+                return False
+        return True
+
+    def provision_lab(self, lab, lab_name, username):
+        """
+        Создание лабы пользователя или команды: копией эталонной лабы, если это включено
+        и поддерживается PNET, иначе поэлементно. Возвращает ошибки по элементам топологии.
+        """
+        if get_pnet_lab_cloning() and self.clone_lab_for_user(lab, lab_name, username):
+            return []
+        self.create_lab_for_user(lab_name, username)
+        return self.create_lab_nodes_and_connectors(lab, lab_name, username)
@@ -0,0 +1,386 @@
+"""
+Локальный симулятор API PNETLab для тестов и нагрузочных замеров.
+
+``PNetSimulator`` — HTTP-сервер с keep-alive, реализующий endpoints, которыми
+пользуется ``eveFunctions``: вход и выход, таблицы пользователей и сессий лаб,
+папки, лабы (создание, копирование, перенос, удаление), фабрику сессий,
+элементы топологии и консоль. Состояние хранится в памяти сервера.
+
+Узлы и сети нумеруются, как в PNET: по явному ``id`` или следующим номером в порядке
+поступления запросов, с учётом ``count``. Соединения и подключения к облаку ссылаются
+на эти номера; ссылка на несуществующий объект — ошибка 400. Созданная топология
+сессии доступна в ``topology_for(cookie)``.
+
+Задержка ответа (``latency``, ``element_delay`` и случайная добавка до ``element_jitter``
+для элементов топологии) и отказы
+(``failure_rate`` — доля случайных ответов 500, ``fail_paths`` — окончания путей,
+которые всегда отвечают 500) настраиваются атрибутами и меняются на лету.
+"""
+import json
+import posixpath
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from http.cookies import SimpleCookie
+from urllib.parse import unquote, urlsplit
+
+ADMIN_USERNAME = 'pnet_scripts'
+ADMIN_PASSWORD = 'eve'
+
+
+class PNetSimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят одним пакетом, иначе keep-alive упирается в задержку ACK
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, payload, status=200, cookies=()):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for cookie in cookies:
+            self.send_header('Set-Cookie', cookie)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _ok(self, data=None, code=200):
+        payload = {"code": code, "status": "success", "message": "ok"}
+        if data is not None:
+            payload["data"] = data
+        return self._reply(payload)
+
+    def _error(self, status, message):
+        return self._reply({"code": status, "status": "fail", "message": message}, status=status)
+
+    def _session_cookie(self):
+        cookie = SimpleCookie(self.headers.get('Cookie', ''))
+        return cookie['_session'].value if '_session' in cookie else None
+
+    def _route(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        server = self.server
+        path = urlsplit(self.path).path
+        with server.lock:
+            server.requests += 1
+            server.paths.append(self.path)
+            failed = (
+                any(path.endswith(suffix) for suffix in server.fail_paths)
+                or server.random.random() < server.failure_rate
+            )
+        if server.latency:
+            time.sleep(server.latency)
+        if failed:
+            return self._error(500, "Injected failure")
+
+        try:
+            params = json.loads(body) if body else {}
+        except ValueError:
+            return self._error(400, "Invalid JSON")
+
+        if path.startswith('/api/labs/session/'):
+            return self._lab_session(path[len('/api/labs/session/'):], params)
+        if path == '/api/labs' or path.startswith('/api/labs/'):
+            return self._labs(path, params)
+        if path == '/':
+            return self._reply({}, cookies=[f'_session={server.open_session()}; Path=/'])
+        if path == '/store/public/auth/login/login':
+            return self._login(params)
+        if path == '/api/auth/logout':
+            server.close_session(self._session_cookie())
+            return self._ok()
+        if path == '/api/folders/add':
+            with server.lock:
+                server.folders.add(posixpath.join(params["path"], params["name"]))
+            return self._ok()
+        if path.startswith('/store/public/admin/users/'):
+            return self._users(path.rsplit('/', 1)[1], params)
+        if path == '/store/public/admin/lab_sessions/count':
+            with server.lock:
+                return self._ok(len(server.lab_sessions))
+        if path == '/store/public/admin/lab_sessions/filter':
+            return self._lab_sessions_page(params["data"])
+        return self._error(404, "Not found")
+
+    do_GET = do_POST = do_PUT = do_DELETE = _route
+
+    def _login(self, params):
+        session = self._session_cookie()
+        with self.server.lock:
+            user = next((user for user in self.server.users if user["username"] == params.get("username")), None)
+            if user is None or user.get("password", params.get("password")) != params.get("password") \
+                    or session not in self.server.sessions:
+                return self._error(401, "Wrong username or password")
+            self.server.sessions[session] = user["username"]
+        return self._reply({"code": 200, "status": "success", "message": "User logged in"},
+                           cookies=[f'_session={session}; Path=/'])
+
+    def _users(self, action, params):
+        server = self.server
+        with server.lock:
+            if action == 'filter':
+                data = params["data"]
+                users = server.users
+                if "pod" in (data.get("data_sort") or {}):
+                    users = sorted(users, key=lambda user: user["pod"], reverse=data["data_sort"]["pod"] == "desc")
+                start = (data["page_number"] - 1) * data["page_quantity"]
+                return self._ok({"data_table": users[start:start + data["page_quantity"]]})
+            if action == 'offAdd':
+                known = {user["username"] for user in server.users}
+                for user_params in params["data"]:
+                    if user_params["username"] in known:
+                        continue
+                    pod = max(user["pod"] for user in server.users) + 1
+                    server.users.append(dict(user_params, pod=pod))
+                return self._ok()
+            if action == 'offEdit':
+                user_params = params["data"]["data_editor"]
+                index = next((i for i, user in enumerate(server.users) if user["pod"] == user_params["pod"]), None)
+                if index is None:
+                    return self._error(404, "User not found")
+                server.users[index] = user_params
+                return self._ok()
+        return self._error(404, "Not found")
+
+    def _lab_sessions_page(self, data):
+        with self.server.lock:
+            items = sorted(self.server.lab_sessions.values(), key=lambda item: item["lab_session_id"], reverse=True)
+        start = (data["page_number"] - 1) * data["page_quantity"]
+        return self._ok({"data_table": items[start:start + data["page_quantity"]]})
+
+    def _labs(self, path, params):
+        """Файлы лаб: создание, копирование, перенос, проверка и удаление."""
+        labs = self.server.labs
+        with self.server.lock:
+            if self.command == 'POST' and 'source' in params:
+                if not self.server.clone_supported:
+                    return self._error(404, "Not found")
+                if params["source"] not in labs:
+                    return self._error(400, "Source lab does not exist")
+                labs.add(f'{posixpath.dirname(params["source"])}/{params["name"]}.unl')
+            elif self.command == 'POST':
+                labs.add(f'{params["path"]}/{params["name"]}.unl')
+            elif self.command == 'PUT':
+                lab_path = unquote(path[len('/api/labs'):-len('/move')])
+                if lab_path not in labs:
+                    return self._error(404, "Not found")
+                labs.remove(lab_path)
+                labs.add(f'{params["path"]}/{posixpath.basename(lab_path)}')
+            elif self.command == 'DELETE':
+                labs.discard(params["path"])
+            elif unquote(path[len('/api/labs'):]) not in labs:
+                return self._error(404, "Not found")
+        return self._ok()
+
+    def _lab_session(self, action, params):
+        server = self.server
+        if action == 'factory/create':
+            pod = server.pod_for_session(self._session_cookie())
+            if pod is None:
+                return self._error(401, "Unauthorized")
+            with server.lock:
+                server.last_session_id += 1
+                server.lab_sessions[server.last_session_id] = {
+                    "lab_session_id": server.last_session_id,
+                    "lab_session_pod": pod,
+                    "lab_session_path": params["path"],
+                }
+            return self._ok()
+        if action in ('factory/join', 'factory/destroy'):
+            session_id = int(params.get("lab_session") or 0)
+            with server.lock:
+                if session_id not in server.lab_sessions:
+                    return self._error(404, "Lab session not found")
+                if action == 'factory/destroy':
+                    del server.lab_sessions[session_id]
+                else:
+                    # Вошедший в сессию строит её топологию с нуля
+                    server.topologies[self._session_cookie()] = SimulatedTopology()
+            return self._ok()
+        if action in ('nodes/add', 'networks/add', 'networks/p2p', 'interfaces/edit'):
+            return self._topology_element(action, params)
+        if action == 'topology':
+            topology = server.topology_for(self._session_cookie())
+            with server.lock:
+                data = {"nodes": dict(topology.nodes), "networks": dict(topology.networks)}
+            return self._ok(data)
+        if action == 'console_guac_link':
+            return self._ok(f'/html/guacamole/#/client/{self.server.last_session_id}')
+        if action == 'nodes/start':
+            return self._ok()
+        return self._error(404, "Not found")
+
+    def _topology_element(self, action, params):
+        server = self.server
+        topology = server.topology_for(self._session_cookie())
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            delay = server.element_delay + server.random.random() * server.element_jitter
+        time.sleep(delay)
+        # Номер объекту выдаётся по окончании обработки, как в PNET — в порядке поступления
+        with server.lock:
+            server.in_flight -= 1
+            error = topology.apply(action, params)
+        if error:
+            return self._error(400, error)
+        return self._ok(code=201)
+
+
+class SimulatedTopology:
+    """Узлы, сети и соединения одной сессии лабы."""
+
+    def __init__(self):
+        self.nodes = {}
+        self.networks = {}
+        self.links = []
+        self.cloud = []
+
+    @staticmethod
+    def _add(objects, params, kind):
+        try:
+            count = int(params.get("count") or 1)
+            first = int(params["id"]) if "id" in params else max(objects, default=0) + 1
+        except (TypeError, ValueError):
+            return f"Invalid {kind} id or count"
+        ids = range(first, first + count)
+        if any(object_id in objects for object_id in ids):
+            return f"{kind.capitalize()} {first} already exists"
+        for object_id in ids:
+            objects[object_id] = {key: params[key] for key in ("name", "template") if key in params}
+        return None
+
+    def _missing_node(self, *node_ids):
+        for node_id in node_ids:
+            if node_id is not None and (not str(node_id).isdigit() or int(node_id) not in self.nodes):
+                return f"Node {node_id} not found"
+        return None
+
+    def apply(self, action, params):
+        """Применяет элемент топологии; возвращает текст ошибки или None."""
+        if action == 'nodes/add':
+            if params.get('template') == 'broken':
+                return "Unknown template"
+            return self._add(self.nodes, params, "node")
+        if action == 'networks/add':
+            return self._add(self.networks, params, "network")
+        if action == 'networks/p2p':
+            error = self._missing_node(params.get("src_id"), params.get("dest_id"))
+            if error:
+                return error
+            network_id = max(self.networks, default=0) + 1
+            self.networks[network_id] = {"name": params.get("name", "")}
+            self.links.append({
+                "network": network_id,
+                "src": self.nodes[int(params["src_id"])].get("name") if "src_id" in params else None,
+                "dest": self.nodes[int(params["dest_id"])].get("name") if "dest_id" in params else None,
+            })
+            return None
+        error = self._missing_node(params.get("node_id"))
+        if error:
+            return error
+        for network_id in (params.get("data") or {}).values():
+            if not str(network_id).isdigit() or int(network_id) not in self.networks:
+                return f"Network {network_id} not found"
+        self.cloud.append((self.nodes[int(params["node_id"])].get("name"), params.get("data")))
+        return None
+
+
+class PNetSimulator(ThreadingHTTPServer):
+    """
+    Симулятор PNETLab в отдельном потоке::
+
+        with PNetSimulator(latency=0.01) as simulator:
+            cookie, xsrf = pf_login(simulator.url, 'pnet_scripts', 'eve')
+    """
+    daemon_threads = True
+
+    def __init__(self, latency=0, element_delay=0, failure_rate=0, seed=None, address=('127.0.0.1', 0),
+                 element_jitter=0):
+        super().__init__(address, PNetSimulatorHandler)
+        self.lock = threading.Lock()
+        self.latency = latency
+        self.element_delay = element_delay
+        self.element_jitter = element_jitter
+        self.failure_rate = failure_rate
+        self.fail_paths = set()
+        self.random = random.Random(seed)
+        self.clone_supported = True
+
+        self.users = [{"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD, "pod": 0}]
+        # cookie _session -> имя вошедшего пользователя (None до входа)
+        self.sessions = {}
+        self.lab_sessions = {}
+        self.last_session_id = 0
+        # cookie _session -> топология лабы, в сессию которой вошёл пользователь
+        self.topologies = {}
+        self.labs = set()
+        self.folders = set()
+
+        self.reset_counters()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def reset_counters(self):
+        with self.lock:
+            self.connections = 0
+            self.requests = 0
+            self.paths = []
+            self.in_flight = self.max_in_flight = 0
+
+    def open_session(self):
+        with self.lock:
+            session = f'sim-{len(self.sessions) + 1}'
+            self.sessions[session] = None
+        return session
+
+    def close_session(self, session):
+        with self.lock:
+            if session in self.sessions:
+                self.sessions[session] = None
+
+    def topology_for(self, session):
+        with self.lock:
+            return self.topologies.setdefault(session, SimulatedTopology())
+
+    def pod_for_session(self, session):
+        with self.lock:
+            username = self.sessions.get(session)
+            return next((user["pod"] for user in self.users if user["username"] == username), None)
+
+    def add_users(self, usernames, password=''):
+        """Заводит пользователей PNET напрямую, минуя API."""
+        with self.lock:
+            pod = max(user["pod"] for user in self.users)
+            for pod, username in enumerate(usernames, start=pod + 1):
+                self.users.append({"username": username, "password": password, "pod": pod,
+                                   "user_workspace": f'/{username}'})
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,111 @@
+"""
+Отчёт об успеваемости взводов и пользователей.
+
+Для всех пользователей двумя сгруппированными запросами считается, сколько
+лабораторных им назначено (``Competition2User``) и по скольким есть ответы
+(``Answers``, по одной на лабу). Итоги взводов складываются из итогов пользователей.
+Отчёт целиком кэшируется и сбрасывается при изменении ответов и заданий.
+"""
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.signals import post_save, post_delete
+
+from .models import Answers, Competition2User, Platoon, User
+
+PROGRESS_CACHE_KEY = "progress_report"
+# Страховочный TTL на случай изменений, которые не отслеживаются сигналами (например, перевод во взвод)
+PROGRESS_CACHE_TIMEOUT = 60 * 10
+
+# Служебная учётная запись не входит в итоги взводов
+EXCLUDED_USERNAMES = ("admin",)
+
+
+def percent(submitted, total, empty=0):
+    """Процент выполнения; ``empty`` — значение при отсутствии назначенных работ."""
+    if total == 0:
+        return empty
+    return int(submitted / total * 100)
+
+
+def build_report():
+    """
+    Строит отчёт::
+
+        {'users': {user_id: {'total': ..., 'submitted': ...}},
+         'platoons': {platoon_id: {'total': ..., 'submitted': ..., 'progress': ...}}}
+    """
+    users = {}
+    assigned = Competition2User.objects.values('user', 'user__platoon', 'user__username').annotate(total=Count('id'))
+    for row in assigned.order_by():
+        users[row['user']] = {
+            'platoon': row['user__platoon'], 'username': row['user__username'],
+            'total': row['total'], 'submitted': 0,
+        }
+    answered = (
+        Answers.objects.filter(user__isnull=False)
+        .values('user', 'user__platoon', 'user__username')
+        .annotate(submitted=Count('lab', distinct=True))
+    )
+    for row in answered.order_by():
+        entry = users.setdefault(row['user'], {
+            'platoon': row['user__platoon'], 'username': row['user__username'], 'total': 0,
+        })
+        entry['submitted'] = row['submitted']
+
+    platoons = {
+        platoon_id: {'total': 0, 'submitted': 0}
+        for platoon_id in Platoon.objects.values_list('id', flat=True)
+    }
+    for entry in users.values():
+        if entry['platoon'] in platoons and entry['username'] not in EXCLUDED_USERNAMES:
+            platoons[entry['platoon']]['total'] += entry['total']
+            platoons[entry['platoon']]['submitted'] += entry['submitted']
+    for totals in platoons.values():
+        totals['progress'] = percent(totals['submitted'], totals['total'])
+
+    return {
+        'users': {user_id: {'total': entry['total'], 'submitted': entry['submitted']} for user_id, entry in users.items()},
+        'platoons': platoons,
+    }
+
+
+def get_report():
+    report = cache.get(PROGRESS_CACHE_KEY)
+    if report is None:
+        report = build_report()
+        cache.set(PROGRESS_CACHE_KEY, report, PROGRESS_CACHE_TIMEOUT)
+    return report
+
+
+def platoon_progress(platoon_id, report=None):
+    report = report or get_report()
+    return report['platoons'].get(platoon_id, {'total': 0, 'submitted': 0, 'progress': 0})
+
+
+def user_progress(user_id, report=None):
+    """Итоги пользователя; без назначенных работ прогресс считается полным."""
+    report = report or get_report()
+    totals = dict(report['users'].get(user_id, {'total': 0, 'submitted': 0}))
+    totals['progress'] = percent(totals['submitted'], totals['total'], empty=100)
+    return totals
+
+
+def platoon_users_progress(platoon):
+    """Итоги всех пользователей взвода, по фамилии и имени."""
+    report = get_report()
+    users = User.objects.filter(platoon=platoon).exclude(username__in=EXCLUDED_USERNAMES).order_by('last_name', 'first_name')
+    return [(user, user_progress(user.pk, report)) for user in users]
+
+
+def invalidate():
+    cache.delete(PROGRESS_CACHE_KEY)
+
+
+def on_progress_changed(sender, **kwargs):
+    invalidate()
+
+
+post_save.connect(on_progress_changed, sender=Answers)
+post_delete.connect(on_progress_changed, sender=Answers)
+post_save.connect(on_progress_changed, sender=Competition2User)
+post_delete.connect(on_progress_changed, sender=Competition2User)
@@ -0,0 +1,166 @@
+"""
+Параллельное выполнение операций с PNETLab.
+
+Операции копятся в ``ProvisioningBatch`` и запускаются в пуле потоков
+(под gevent — гринлетов) в одной административной сессии. Число одновременных
+запросов к одному хосту PNET ограничено семафором, общим для всех пакетов процесса.
+Операции очистки (удаление лаб) дополнительно ограничены по частоте и числу
+одновременных удалений, чтобы массовая очистка после экзамена не перегружала PNET.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.db import connections
+
+from .pnet_session_manager import ensure_admin_pnet_session
+
+logger = logging.getLogger(__name__)
+
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+_cleanup_throttles = {}
+
+
+@dataclass
+class ProvisioningResult:
+    key: str
+    success: bool
+    elapsed: float
+    error: str = ""
+
+
+def _workers():
+    return getattr(settings, 'PROVISIONING_WORKERS', 8)
+
+
+def _host_concurrency():
+    return getattr(settings, 'PNET_HOST_CONCURRENCY', 4)
+
+
+def _host(url):
+    return urlparse(url).netloc or url
+
+
+def host_semaphore(url):
+    """Семафор, ограничивающий число одновременных операций с одним хостом PNET."""
+    host = _host(url)
+    with _host_semaphores_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(_host_concurrency())
+        return _host_semaphores[host]
+
+
+class RateLimiter:
+    """Ограничение частоты операций (token bucket). ``rate`` <= 0 — без ограничения."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class Throttle:
+    """Частота и число одновременных операций одного вида с одним хостом."""
+
+    def __init__(self, rate, max_in_flight):
+        self.limiter = RateLimiter(rate)
+        self.semaphore = threading.BoundedSemaphore(max_in_flight)
+
+    def __enter__(self):
+        self.limiter.acquire()
+        self.semaphore.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.semaphore.release()
+
+
+def cleanup_throttle(url):
+    """Ограничитель операций очистки для хоста PNET, общий для всех пакетов процесса."""
+    host = _host(url)
+    with _host_semaphores_lock:
+        if host not in _cleanup_throttles:
+            _cleanup_throttles[host] = Throttle(
+                getattr(settings, 'PNET_CLEANUP_RATE', 5),
+                getattr(settings, 'PNET_CLEANUP_CONCURRENCY', 4),
+            )
+        return _cleanup_throttles[host]
+
+
+class ProvisioningBatch:
+    def __init__(self):
+        self.jobs = []
+        self.results = []
+
+    def add(self, key, operation, cleanup=False):
+        """Добавляет операцию; ``cleanup`` — операция очистки, идущая под ``cleanup_throttle``."""
+        self.jobs.append((key, operation, cleanup))
+
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.success]
+
+    def _run_job(self, session_manager, semaphore, throttle, key, operation):
+        started = time.monotonic()
+        try:
+            with throttle or nullcontext(), semaphore:
+                operation(session_manager)
+        except Exception as e:
+            logger.exception(f"Lab provisioning failed for {key}")
+            return ProvisioningResult(key, False, time.monotonic() - started, str(e))
+        finally:
+            # Соединения с БД, открытые в потоке пула, закрываем сразу
+            connections.close_all()
+        return ProvisioningResult(key, True, time.monotonic() - started)
+
+    def run(self, heartbeat=None, heartbeat_interval=60):
+        """
+        Выполняет накопленные операции параллельно и возвращает результаты по каждой.
+        Пока операции идут, ``heartbeat`` вызывается в основном потоке каждые ``heartbeat_interval`` секунд.
+        """
+        if not self.jobs:
+            return self.results
+
+        session_manager = ensure_admin_pnet_session()
+        semaphore = host_semaphore(session_manager._url or "")
+        throttle = cleanup_throttle(session_manager._url or "")
+        with session_manager, ThreadPoolExecutor(max_workers=min(_workers(), len(self.jobs))) as executor:
+            futures = [
+                executor.submit(self._run_job, session_manager, semaphore, throttle if cleanup else None, key, operation)
+                for key, operation, cleanup in self.jobs
+            ]
+            pending = futures
+            while pending:
+                _, pending = wait(pending, timeout=heartbeat_interval)
+                if pending and heartbeat is not None:
+                    heartbeat()
+            self.results = [future.result() for future in futures]
+        self.jobs = []
+
+        if self.failed:
+            logger.error(f"Lab provisioning failed for {len(self.failed)} of {len(self.results)}: "
+                         f"{', '.join(str(result.key) for result in self.failed)}")
+        return self.results
+
@@ -0,0 +1,213 @@
+"""
+Материализованная таблица результатов соревнования в кэше Django.
+
+Таблица строится один раз через ``leaderboard.build_scoreboard`` и дальше
+обновляется инкрементально при сохранении ``Answers``. Запрос
+``get_solutions`` без изменений стоит одно чтение из кэша.
+"""
+import hashlib
+import json
+import threading
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from .leaderboard import build_scoreboard, solution_timing, sort_solutions, _progress
+from .models import Answers, Competition, TeamCompetition, TeamCompetition2Team, Team
+
+# Страховочный TTL на случай изменений, которые не отслеживаются сигналами (например, ФИО пользователя)
+SCOREBOARD_CACHE_TIMEOUT = 60 * 10
+SCOREBOARD_LOCK_TIMEOUT = 5
+
+_batch = threading.local()
+
+
+def scoreboard_cache_key(slug):
+    return f"scoreboard:{slug}"
+
+
+def _lock_key(slug):
+    return f"scoreboard:{slug}:lock"
+
+
+def _render(entry):
+    """Пересортировывает строки и обновляет сериализованный payload и ETag."""
+    payload = entry['payload']
+    sort_solutions(payload['solutions'], entry['keys'])
+    payload['total_progress'] = sum(sol["progress"] for sol in payload['solutions'])
+
+    entry['content'] = json.dumps(payload, cls=DjangoJSONEncoder).encode('utf-8')
+    entry['etag'] = '"%s"' % hashlib.md5(entry['content']).hexdigest()
+    return entry
+
+
+def build_entry(competition):
+    """Строит и сохраняет в кэш таблицу результатов соревнования."""
+    payload, keys = build_scoreboard(competition)
+    entry = {
+        'start': competition.start,
+        'num_tasks': competition.num_tasks,
+        'payload': payload,
+        'keys': keys,
+        # Для лаб с заданиями прогресс равен числу ответов участника
+        'answers': {key: row["progress"] for row, key in zip(payload['solutions'], keys)},
+    }
+    _render(entry)
+    cache.set(scoreboard_cache_key(competition.slug), entry, SCOREBOARD_CACHE_TIMEOUT)
+    return entry
+
+
+def get_entry(slug):
+    """
+    Возвращает закэшированную таблицу результатов, строя её при промахе.
+    Возвращает None, если соревнования нет.
+    """
+    entry = cache.get(scoreboard_cache_key(slug))
+    if entry is not None:
+        return entry
+
+    competition = TeamCompetition.objects.filter(slug=slug).first() or Competition.objects.filter(slug=slug).first()
+    if competition is None:
+        return None
+    return build_entry(competition)
+
+
+def invalidate(*slugs):
+    if slugs:
+        cache.delete_many([scoreboard_cache_key(slug) for slug in slugs])
+
+
+def _apply(entry, key, answer_datetime):
+    """Добавляет новый ответ к строкам участника. Возвращает False, если участника нет в таблице."""
+    indexes = [i for i, row_key in enumerate(entry['keys']) if row_key == key]
+    if not indexes:
+        return False
+
+    answers_count = entry['answers'][key] + 1
+    entry['answers'][key] = answers_count
+    progress = _progress(answers_count, entry['num_tasks'])
+
+    for i in indexes:
+        row = entry['payload']['solutions'][i]
+        raw_datetime = row["raw_datetime"]
+        if raw_datetime is None or answer_datetime > raw_datetime:
+            raw_datetime = answer_datetime
+        row.update(solution_timing(raw_datetime, entry['start']))
+        row["progress"] = progress
+    return True
+
+
+def _affected_slugs(answer):
+    return list(
+        Competition.objects.filter(
+            lab_id=answer.lab_id,
+            start__lte=answer.datetime,
+            finish__gte=answer.datetime
+        ).values_list('slug', flat=True)
+    )
+
+
+def record_answers(answers):
+    """
+    Применяет сохранённые ответы к закэшированным таблицам.
+    ``answers`` — список пар (answer, created).
+    """
+    by_slug = {}
+    for answer, created in answers:
+        if answer.datetime is None:
+            continue
+        for slug in _affected_slugs(answer):
+            by_slug.setdefault(slug, []).append((answer, created))
+
+    for slug, slug_answers in by_slug.items():
+        key = scoreboard_cache_key(slug)
+        if not cache.add(_lock_key(slug), True, SCOREBOARD_LOCK_TIMEOUT):
+            # Таблицу сейчас обновляет другой процесс — перестроим её при следующем чтении
+            cache.delete(key)
+            continue
+        try:
+            entry = cache.get(key)
+            if entry is None:
+                continue
+            applied = True
+            for answer, created in slug_answers:
+                row_key = ('user', answer.user_id) if answer.user_id else ('team', answer.team_id)
+                # Обновлённый ответ мог раньше лежать вне окна соревнования — такие случаи пересчитываем целиком
+                if not created or not _apply(entry, row_key, answer.datetime):
+                    applied = False
+                    break
+            if applied:
+                cache.set(key, _render(entry), SCOREBOARD_CACHE_TIMEOUT)
+            else:
+                cache.delete(key)
+        finally:
+            cache.delete(_lock_key(slug))
+
+
+@contextmanager
+def answers_batch():
+    """
+    Откладывает обновление таблиц до конца блока, чтобы все ответы
+    одного запроса применялись одной записью в кэш.
+    """
+    if getattr(_batch, 'pending', None) is not None:
+        yield
+        return
+    _batch.pending = []
+    try:
+        yield
+    finally:
+        pending, _batch.pending = _batch.pending, None
+        if pending:
+            record_answers(pending)
+
+
+def on_answer_saved(sender, instance, created, **kwargs):
+    pending = getattr(_batch, 'pending', None)
+    if pending is not None:
+        pending.append((instance, created))
+    else:
+        record_answers([(instance, created)])
+
+
+def on_answer_deleted(sender, instance, **kwargs):
+    if instance.datetime is not None:
+        invalidate(*_affected_slugs(instance))
+
+
+def on_competition_changed(sender, instance, **kwargs):
+    invalidate(instance.slug)
+
+
+def on_competition_users_changed(sender, instance, action, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if isinstance(instance, Competition):
+        invalidate(instance.slug)
+    elif pk_set:
+        invalidate(*Competition.objects.filter(pk__in=pk_set).values_list('slug', flat=True))
+
+
+def on_team_competition_changed(sender, instance, **kwargs):
+    invalidate(instance.competition.slug)
+
+
+def on_team_users_changed(sender, instance, action, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    team_ids = [instance.pk] if isinstance(instance, Team) else (pk_set or [])
+    invalidate(*TeamCompetition2Team.objects.filter(team_id__in=team_ids).values_list('competition__slug', flat=True))
+
+
+post_save.connect(on_answer_saved, sender=Answers)
+post_delete.connect(on_answer_deleted, sender=Answers)
+post_save.connect(on_competition_changed, sender=Competition)
+post_save.connect(on_competition_changed, sender=TeamCompetition)
+post_delete.connect(on_competition_changed, sender=Competition)
+m2m_changed.connect(on_competition_users_changed, sender=Competition.platoons.through)
+m2m_changed.connect(on_competition_users_changed, sender=Competition.non_platoon_users.through)
+post_save.connect(on_team_competition_changed, sender=TeamCompetition2Team)
+post_delete.connect(on_team_competition_changed, sender=TeamCompetition2Team)
+m2m_changed.connect(on_team_users_changed, sender=Team.users.through)
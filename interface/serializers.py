@@ -2,6 +2,7 @@ from django.utils import timezone
 from rest_framework import serializers
 from interface.models import Answers, LabLevel, LabTask, User, Lab, TeamCompetition2Team
 from .api_utils import get_issue
+from .scoreboard_cache import answers_batch
 
 
 class AnswerSerializer(serializers.ModelSerializer):
@@ -60,20 +61,21 @@ class AnswerSerializer(serializers.ModelSerializer):
             task = None
 
         # Create or update the Answers instance
-        if isinstance(issue, TeamCompetition2Team):
-            answers_instance, created = Answers.objects.update_or_create(
-                team=issue.team,
-                lab=lab_instance,
-                lab_task=task,
-                defaults={'datetime': datetime}
-            )
-        else:
-            answers_instance, created = Answers.objects.update_or_create(
-                user=issue.user,
-                lab=lab_instance,
-                lab_task=task,
-                defaults={'datetime': datetime}
-            )
+        with answers_batch():
+            if isinstance(issue, TeamCompetition2Team):
+                answers_instance, created = Answers.objects.update_or_create(
+                    team=issue.team,
+                    lab=lab_instance,
+                    lab_task=task,
+                    defaults={'datetime': datetime}
+                )
+            else:
+                answers_instance, created = Answers.objects.update_or_create(
+                    user=issue.user,
+                    lab=lab_instance,
+                    lab_task=task,
+                    defaults={'datetime': datetime}
+                )
         return answers_instance
 
 
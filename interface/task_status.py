@@ -0,0 +1,89 @@
+"""
+Состояние заданий участника на странице соревнования.
+
+Назначенные задания, выполненные задания и отметка о завершении лабы
+считаются двумя запросами и кэшируются по (соревнование, пользователь) на короткое
+время. Ответы, изменения заданий участника и времени соревнования сбрасывают кэш.
+"""
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from .models import Answers, Competition, Competition2User
+
+TASK_STATUS_CACHE_TIMEOUT = 30
+
+
+def task_status_cache_key(competition_id, user_id):
+    return f"task_status:{competition_id}:{user_id}"
+
+
+def build_task_status(competition, user):
+    """
+    Состояние заданий ``user`` в ``competition``::
+
+        {'issue': участвует ли пользователь, 'task_ids': [...],
+         'done_task_ids': [...], 'finished': есть ли отметка о завершении лабы}
+    """
+    rows = list(
+        Competition2User.objects.filter(competition=competition, user=user).values_list('pk', 'tasks')
+    )
+    answered = set(
+        Answers.objects.filter(
+            lab_id=competition.lab_id,
+            user=user,
+            datetime__lte=competition.finish,
+            datetime__gte=competition.start,
+        ).values_list('lab_task_id', flat=True).distinct()
+    )
+    task_ids = sorted({task_id for _, task_id in rows if task_id is not None})
+    return {
+        'issue': bool(rows),
+        'task_ids': task_ids,
+        'done_task_ids': [task_id for task_id in task_ids if task_id in answered],
+        'finished': None in answered,
+    }
+
+
+def get_task_status(competition, user):
+    key = task_status_cache_key(competition.pk, user.pk)
+    status = cache.get(key)
+    if status is None:
+        status = build_task_status(competition, user)
+        cache.set(key, status, TASK_STATUS_CACHE_TIMEOUT)
+    return status
+
+
+def invalidate(competition_id, *user_ids):
+    cache.delete_many([task_status_cache_key(competition_id, user_id) for user_id in user_ids])
+
+
+def on_answer_changed(sender, instance, **kwargs):
+    if instance.user_id is None:
+        return
+    competition_ids = Competition2User.objects.filter(
+        user_id=instance.user_id, competition__lab_id=instance.lab_id
+    ).values_list('competition_id', flat=True)
+    cache.delete_many([task_status_cache_key(competition_id, instance.user_id) for competition_id in competition_ids])
+
+
+def on_issue_changed(sender, instance, **kwargs):
+    invalidate(instance.competition_id, instance.user_id)
+
+
+def on_issue_tasks_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, Competition2User):
+        invalidate(instance.competition_id, instance.user_id)
+
+
+def on_competition_changed(sender, instance, created=False, **kwargs):
+    # Время соревнования определяет, какие ответы засчитываются
+    if not created:
+        invalidate(instance.pk, *instance.competition_users.values_list('user_id', flat=True))
+
+
+post_save.connect(on_answer_changed, sender=Answers)
+post_delete.connect(on_answer_changed, sender=Answers)
+post_save.connect(on_issue_changed, sender=Competition2User)
+post_delete.connect(on_issue_changed, sender=Competition2User)
+m2m_changed.connect(on_issue_tasks_changed, sender=Competition2User.tasks.through)
+post_save.connect(on_competition_changed, sender=Competition)
@@ -0,0 +1,142 @@
+"""
+Удаление лаб после окончания соревнования.
+
+На каждое соревнование в DjangoJobStore регистрируется разовое задание APScheduler
+(DateTrigger) на момент окончания плюс задержка. Задание перерегистрируется при каждом
+сохранении соревнования: создании, press_button (end/resume), правке в админке.
+Периодическая проверка в runapscheduler остаётся страховкой для пропущенных заданий.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.schedulers.background import BackgroundScheduler
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+from django_apscheduler import util
+from django_apscheduler.jobstores import DjangoJobStore
+
+from .models import Competition, TeamCompetition
+
+logger = logging.getLogger(__name__)
+
+_job_scheduler = None
+_job_scheduler_lock = threading.Lock()
+
+
+def teardown_grace(competition):
+    """Через сколько после окончания удалять лабы: у командных соревнований задержка меньше."""
+    if isinstance(competition, TeamCompetition) or TeamCompetition.objects.filter(pk=competition.pk).exists():
+        return timedelta(minutes=getattr(settings, 'TEAM_LAB_TEARDOWN_GRACE', 10))
+    return timedelta(minutes=getattr(settings, 'LAB_TEARDOWN_GRACE', 60))
+
+
+def teardown_time(competition):
+    return competition.finish + teardown_grace(competition)
+
+
+def teardown_job_id(competition_id):
+    return f"teardown_competition_{competition_id}"
+
+
+def get_job_scheduler():
+    """
+    Планировщик для записи заданий в DjangoJobStore из любого процесса.
+    Запущен на паузе: сам задания не выполняет, их выполняет runapscheduler.
+    """
+    global _job_scheduler
+
+    with _job_scheduler_lock:
+        if _job_scheduler is None:
+            scheduler = BackgroundScheduler(timezone=settings.TIME_ZONE, daemon=True)
+            scheduler.add_jobstore(DjangoJobStore(), "default")
+            scheduler.start(paused=True)
+            _job_scheduler = scheduler
+        return _job_scheduler
+
+
+def delete_competition_labs(competition):
+    """Ставит в очередь удаление всех лаб соревнования и отмечает его очищенным."""
+    for issue in competition.competition_users.filter(deleted=False).select_related('competition__lab', 'user'):
+        issue.delete_from_platform()
+
+    team_competition = TeamCompetition.objects.filter(pk=competition.pk).first()
+    if team_competition is not None:
+        for issue in team_competition.competition_teams.filter(deleted=False).select_related('competition__lab', 'team'):
+            issue.delete_from_platform()
+
+    competition.delete_golden_lab()
+    # update() не вызывает post_save, иначе задание очистки было бы зарегистрировано снова
+    Competition.objects.filter(pk=competition.pk).update(deleted=True)
+
+
+@util.close_old_connections
+def teardown_competition(competition_id):
+    """Разовое задание runapscheduler: удаляет лабы соревнования после его окончания."""
+    competition = Competition.objects.filter(pk=competition_id).select_related('lab').first()
+    if competition is None:
+        return
+    if teardown_time(competition) > timezone.now():
+        # Соревнование продлили — задание на новое время зарегистрировано при сохранении
+        return
+    logger.info(f"Tearing down labs of competition {competition.slug}")
+    delete_competition_labs(competition)
+
+
+def schedule_teardown(competition):
+    """Регистрирует (или переносит) задание очистки соревнования."""
+    run_date = teardown_time(competition)
+    get_job_scheduler().add_job(
+        teardown_competition,
+        trigger='date',
+        run_date=run_date,
+        args=[competition.pk],
+        id=teardown_job_id(competition.pk),
+        name=f"Teardown {competition.slug}",
+        # Задание выполняется, даже если планировщик был остановлен в назначенное время
+        misfire_grace_time=None,
+        coalesce=True,
+        replace_existing=True,
+    )
+    logger.debug(f"Teardown of competition {competition.slug} scheduled at {run_date}")
+
+
+def unschedule_teardown(competition_id):
+    try:
+        get_job_scheduler().remove_job(teardown_job_id(competition_id))
+    except JobLookupError:
+        pass
+
+
+def teardown_sweep():
+    """Страховка: очищает завершившиеся соревнования, задание которых не выполнилось."""
+    now = timezone.now()
+    min_grace = min(
+        timedelta(minutes=getattr(settings, 'TEAM_LAB_TEARDOWN_GRACE', 10)),
+        timedelta(minutes=getattr(settings, 'LAB_TEARDOWN_GRACE', 60)),
+    )
+    competitions = Competition.objects.filter(deleted=False, finish__lte=now - min_grace).select_related('lab')
+    for competition in competitions:
+        if teardown_time(competition) <= now:
+            logger.warning(f"Teardown of competition {competition.slug} was missed, cleaning up")
+            delete_competition_labs(competition)
+
+
+def on_competition_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Регистрируем после коммита, чтобы задание не ссылалось на откатившиеся изменения
+    transaction.on_commit(lambda: schedule_teardown(instance))
+
+
+def on_competition_deleted(sender, instance, **kwargs):
+    competition_id = instance.pk
+    transaction.on_commit(lambda: unschedule_teardown(competition_id))
+
+
+post_save.connect(on_competition_saved, sender=Competition)
+post_save.connect(on_competition_saved, sender=TeamCompetition)
+post_delete.connect(on_competition_deleted, sender=Competition)
@@ -0,0 +1,65 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from interface.models import Competition, CompetitionChange, Lab
+
+
+class CheckUpdatesAPITestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("interface_api:check_updates")
+        lab = Lab.objects.create(
+            name="Updates Lab",
+            platform="NO",
+            slug="lab-updates",
+            description="desc",
+            NodesData=[], ConnectorsData=[], Connectors2CloudData=[], NetworksData=[]
+        )
+        self.competitions = [
+            Competition.objects.create(
+                slug=f"updates-comp-{i}",
+                start=timezone.now() + timedelta(hours=1),
+                finish=timezone.now() + timedelta(hours=2),
+                lab=lab
+            )
+            for i in range(2)
+        ]
+
+    def _press(self, action, competition):
+        url = reverse("interface_api:press_button", kwargs={"action": action})
+        response = self.client.post(url, {"slug": competition.slug}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_initial_revision(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual(data, {"revision": 0, "changes": [], "update_required": False})
+
+    def test_changes_since_revision(self):
+        revision = self.client.get(self.url).json()["revision"]
+
+        self._press("start", self.competitions[0])
+        self._press("end", self.competitions[1])
+        self._press("resume", self.competitions[0])
+
+        data = self.client.get(self.url, {"since": revision}).json()
+        self.assertTrue(data["update_required"])
+        self.assertEqual(data["revision"], CompetitionChange.objects.latest("id").id)
+        # По каждому экзамену — только последнее изменение
+        self.assertEqual(
+            [(change["slug"], change["action"]) for change in data["changes"]],
+            [("updates-comp-1", "end"), ("updates-comp-0", "resume")]
+        )
+
+        # Все клиенты видят одно и то же изменение: чтение ничего не сбрасывает
+        self.assertEqual(self.client.get(self.url, {"since": revision}).json(), data)
+        self.assertEqual(
+            self.client.get(self.url, {"since": data["revision"]}).json(),
+            {"revision": data["revision"], "changes": [], "update_required": False}
+        )
+
+    def test_invalid_since(self):
+        self.assertEqual(self.client.get(self.url, {"since": "abc"}).status_code, 400)
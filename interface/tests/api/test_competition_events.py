@@ -0,0 +1,112 @@
+import json
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from interface.competition_events import record_competition_change
+from interface.models import Answers, Competition, Lab, Platoon, User
+
+
+def parse_events(chunks):
+    """Разбирает куски text/event-stream в список (event, data)."""
+    events = []
+    for block in b"".join(chunks).decode("utf-8").split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if line and not line.startswith(":"))
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def read_tick(stream):
+    """Читает события одного такта потока (до комментария-пинга)."""
+    chunks = []
+    for chunk in stream:
+        if chunk == b": ping\n\n":
+            break
+        chunks.append(chunk)
+    return parse_events(chunks)
+
+
+@override_settings(SSE_POLL_INTERVAL=0, SSE_STREAM_LIFETIME=60)
+class CompetitionEventsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.lab = Lab.objects.create(
+            name="Events Lab",
+            platform="NO",
+            slug="lab-events",
+            description="desc",
+            NodesData=[], ConnectorsData=[], Connectors2CloudData=[], NetworksData=[]
+        )
+        self.platoon = Platoon.objects.create(number=21)
+        self.user = User.objects.create(username="events_user", platoon=self.platoon)
+        self.competition = Competition.objects.create(
+            slug="events-comp",
+            start=timezone.now() - timedelta(hours=1),
+            finish=timezone.now() + timedelta(hours=1),
+            lab=self.lab,
+            participants=1
+        )
+        self.competition.platoons.add(self.platoon)
+        self.url = reverse("interface_api:competition_events", kwargs={"slug": self.competition.slug})
+
+    def test_initial_events(self):
+        response = self.client.get(self.url + "?scoreboard=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertTrue(response.streaming)
+
+        events = dict(read_tick(response.streaming_content))
+        response.close()
+        self.assertGreater(events["state"]["remaining"], 0)
+        self.assertEqual(events["availability"], {"available": True})
+        self.assertEqual(events["scoreboard"]["solutions"][0]["user_id"], self.user.id)
+
+    def test_scoreboard_only_on_request(self):
+        response = self.client.get(self.url)
+        events = dict(read_tick(response.streaming_content))
+        response.close()
+        self.assertNotIn("scoreboard", events)
+
+    def test_pushes_changes(self):
+        response = self.client.get(self.url + "?scoreboard=1")
+        stream = iter(response.streaming_content)
+        read_tick(stream)
+
+        # Без изменений такт не содержит событий
+        self.assertEqual(read_tick(stream), [])
+
+        Answers.objects.create(user=self.user, lab=self.lab, datetime=timezone.now())
+        events = dict(read_tick(stream))
+        self.assertEqual(list(events), ["scoreboard"])
+        self.assertEqual(events["scoreboard"]["total_progress"], 1)
+
+        self.competition.finish = timezone.now() - timedelta(minutes=1)
+        self.competition.save()
+        events = dict(read_tick(stream))
+        self.assertEqual(events["state"]["remaining"], 0)
+        self.assertEqual(events["availability"], {"available": False})
+        response.close()
+
+    @override_settings(SSE_STREAM_LIFETIME=0)
+    def test_stream_lifetime_is_bounded(self):
+        response = self.client.get(self.url)
+        chunks = list(response.streaming_content)
+        self.assertTrue(chunks[0].startswith(b"retry: "))
+        self.assertEqual(chunks[-1], b": ping\n\n")
+
+    def test_unknown_competition(self):
+        url = reverse("interface_api:competition_events", kwargs={"slug": "missing"})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_competitions_update(self):
+        response = self.client.get(reverse("interface_api:competitions_events"))
+        stream = iter(response.streaming_content)
+        self.assertEqual(read_tick(stream), [])
+
+        revision = record_competition_change(self.competition, "start")
+        self.assertEqual(read_tick(stream), [("update", {"revision": revision})])
+        response.close()
@@ -1,4 +1,7 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
@@ -179,13 +182,13 @@ class GetSolutionsAPITestCase(TestCase):
         now = timezone.now()
         # Create Answers:
         # platoon_users[0] gets 2 answers (progress 2)
-        Answers.objects.create(user=platoon_users[0], lab=lab, datetime=now - timedelta(minutes=30))
-        Answers.objects.create(user=platoon_users[0], lab=lab, datetime=now - timedelta(minutes=29))
+        Answers.objects.create(user=platoon_users[0], lab=lab, lab_task=task1, datetime=now - timedelta(minutes=30))
+        Answers.objects.create(user=platoon_users[0], lab=lab, lab_task=task2, datetime=now - timedelta(minutes=29))
         # platoon_users[1] gets 1 answer (progress 1)
-        Answers.objects.create(user=platoon_users[1], lab=lab, datetime=now - timedelta(minutes=20))
+        Answers.objects.create(user=platoon_users[1], lab=lab, lab_task=task1, datetime=now - timedelta(minutes=20))
         # non_platoon_users[0] gets 2 answers (progress 2)
-        Answers.objects.create(user=non_platoon_users[0], lab=lab, datetime=now - timedelta(minutes=10))
-        Answers.objects.create(user=non_platoon_users[0], lab=lab, datetime=now - timedelta(minutes=9))
+        Answers.objects.create(user=non_platoon_users[0], lab=lab, lab_task=task1, datetime=now - timedelta(minutes=10))
+        Answers.objects.create(user=non_platoon_users[0], lab=lab, lab_task=task2, datetime=now - timedelta(minutes=9))
 
         url = reverse("interface_api:get_solutions", kwargs={"slug": comp.slug})
         response = self.client.get(url)
@@ -376,3 +379,150 @@ class GetSolutionsAPITestCase(TestCase):
         self.assertEqual(solutions[0]["team_name"], "")     # user was first
         self.assertEqual(solutions[1]["team_name"], "Beta Team")
         self.assertEqual(data["total_progress"], 2)
+
+
+class GetSolutionsQueryCountTestCase(TestCase):
+    """Количество запросов не должно зависеть от числа участников."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.lab = Lab.objects.create(
+            name="Query Count Lab",
+            platform="NO",
+            slug="lab-query-count",
+            description="desc",
+            NodesData=[], ConnectorsData=[], Connectors2CloudData=[], NetworksData=[]
+        )
+        self.platoon = Platoon.objects.create(number=7)
+        self.counter = 0
+
+    def _add_participants(self, competition, count):
+        now = timezone.now()
+        for _ in range(count):
+            self.counter += 1
+            user = User.objects.create(
+                username=f"qc_user_{self.counter}",
+                platoon=self.platoon,
+                first_name=f"First{self.counter}",
+                last_name="User"
+            )
+            Answers.objects.create(user=user, lab=self.lab, datetime=now - timedelta(minutes=self.counter))
+        for _ in range(count):
+            self.counter += 1
+            team = Team.objects.create(name=f"Team {self.counter}", slug=f"qc-team-{self.counter}")
+            for _ in range(2):
+                self.counter += 1
+                team.users.add(User.objects.create(username=f"qc_member_{self.counter}"))
+            TeamCompetition2Team.objects.create(competition=competition, team=team)
+            Answers.objects.create(team=team, lab=self.lab, datetime=now - timedelta(minutes=self.counter))
+
+    def _count_queries(self, competition):
+        url = reverse("interface_api:get_solutions", kwargs={"slug": competition.slug})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+
+    def test_query_count_is_constant(self):
+        competition = TeamCompetition.objects.create(
+            slug="query-count-comp",
+            start=timezone.now() - timedelta(hours=1),
+            finish=timezone.now() + timedelta(hours=1),
+            lab=self.lab,
+            participants=10
+        )
+        competition.platoons.add(self.platoon)
+
+        self._add_participants(competition, 2)
+        small_count, small_data = self._count_queries(competition)
+        self.assertEqual(len(small_data["solutions"]), 2 + 2 * 2)
+
+        self._add_participants(competition, 10)
+        large_count, large_data = self._count_queries(competition)
+        self.assertEqual(len(large_data["solutions"]), 12 + 12 * 2)
+
+        self.assertEqual(small_count, large_count)
+        self.assertLessEqual(large_count, 10)
+
+
+
+class GetSolutionsCacheTestCase(TestCase):
+    """Таблица результатов кэшируется, отдаёт ETag и обновляется при новых ответах."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.lab = Lab.objects.create(
+            name="Cache Lab",
+            platform="NO",
+            slug="lab-cache",
+            description="desc",
+            NodesData=[], ConnectorsData=[], Connectors2CloudData=[], NetworksData=[]
+        )
+        self.tasks = [LabTask.objects.create(lab=self.lab, task_id=str(i), description=f"Task {i}") for i in range(2)]
+        self.platoon = Platoon.objects.create(number=11)
+        self.users = [
+            User.objects.create(username=f"cache_user_{i}", platoon=self.platoon, first_name=f"User{i}")
+            for i in range(2)
+        ]
+        self.competition = Competition.objects.create(
+            slug="cache-comp",
+            start=timezone.now() - timedelta(hours=1),
+            finish=timezone.now() + timedelta(hours=1),
+            lab=self.lab,
+            participants=2,
+            num_tasks=2
+        )
+        self.competition.platoons.add(self.platoon)
+        self.competition.tasks.add(*self.tasks)
+        self.url = reverse("interface_api:get_solutions", kwargs={"slug": self.competition.slug})
+
+    def _progress_by_user(self, response):
+        return {sol["user_id"]: sol["progress"] for sol in response.json()["solutions"]}
+
+    def test_etag_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_new_answer_updates_cached_scoreboard(self):
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+        self.assertEqual(self._progress_by_user(response), {self.users[0].id: 0, self.users[1].id: 0})
+
+        Answers.objects.create(
+            user=self.users[1], lab=self.lab, lab_task=self.tasks[0],
+            datetime=timezone.now() - timedelta(minutes=5)
+        )
+        self.assertIsNotNone(cache.get("scoreboard:cache-comp"))
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        data = response.json()
+        self.assertEqual(data["solutions"][0]["user_id"], self.users[1].id)
+        self.assertEqual(data["solutions"][0]["pos"], 1)
+        self.assertEqual(data["total_progress"], 1)
+
+        # Инкрементальное обновление совпадает с полным пересчётом
+        cache.clear()
+        self.assertEqual(self.client.get(self.url).json(), data)
+
+    def test_competition_change_invalidates_cache(self):
+        self.client.get(self.url)
+        self.assertIsNotNone(cache.get("scoreboard:cache-comp"))
+
+        self.competition.participants = 5
+        self.competition.save()
+        self.assertIsNone(cache.get("scoreboard:cache-comp"))
+        self.assertEqual(self.client.get(self.url).json()["max_total_progress"], 10)
+
+    def test_unknown_slug(self):
+        url = reverse("interface_api:get_solutions", kwargs={"slug": "missing"})
+        self.assertEqual(self.client.get(url).status_code, 404)
@@ -109,6 +109,32 @@ class GetIssueTests(TestCase):
         self.assertIsNone(error_response)
         self.assertEqual(issue.id, self.issue.id)
 
+    def test_get_issue_is_cached(self):
+        """
+        Повторный поиск стоит один запрос, а изменение соревнования сбрасывает кэш.
+        """
+        data = {'username': 'testuser', 'lab': 'Chemistry Lab'}
+        with self.assertNumQueries(3):
+            get_issue(data, self.competition_filters)
+        with self.assertNumQueries(1):
+            issue, error_response = get_issue(data, self.competition_filters)
+        self.assertEqual(issue.id, self.issue.id)
+
+        # Фильтры по времени применяются и к закэшированным заданиям
+        with self.assertNumQueries(0):
+            issue, error_response = get_issue(data, {'competition__finish__gt': timezone.now() + timedelta(hours=3)})
+        self.assertIsNone(issue)
+
+        self.competition.finish = timezone.now() - timedelta(minutes=1)
+        self.competition.save()
+        issue, error_response = get_issue(data, {'competition__finish__gt': timezone.now()})
+        self.assertIsNone(issue)
+        self.assertEqual(error_response.status_code, 404)
+
+    def test_get_issue_by_slugified_name_fallback(self):
+        issue, error_response = get_issue({'pnet_login': 'testuser', 'lab': 'Chemistry-Lab'}, self.competition_filters)
+        self.assertEqual(issue.id, self.issue.id)
+
     def test_get_issue_sorts_by_competition_start_time(self):
         """
         Should return the issue with the most recent competition start time
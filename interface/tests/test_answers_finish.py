@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from interface.models import Answers, Competition, Lab, User
+
+
+class MarkFinishedTest(TestCase):
+    def setUp(self):
+        self.lab = Lab.objects.create(name="Finish Lab", platform="NO")
+        self.user = User.objects.create_user(username="finisher", password="pass")
+        now = timezone.now()
+        self.past = Competition.objects.create(lab=self.lab, start=now - timedelta(days=8), finish=now - timedelta(days=7))
+        self.current = Competition.objects.create(lab=self.lab, start=now - timedelta(hours=1), finish=now + timedelta(hours=1))
+
+    def test_one_mark_per_competition(self):
+        past_mark = Answers.objects.create(lab=self.lab, user=self.user, datetime=self.past.start + timedelta(minutes=5))
+
+        mark, created = Answers.mark_finished(self.current, user=self.user)
+        self.assertTrue(created)
+        self.assertEqual(Answers.mark_finished(self.current, user=self.user), (mark, False))
+
+        # Отметка прошлого соревнования остаётся в его окне
+        past_mark.refresh_from_db()
+        self.assertEqual(past_mark.datetime, self.past.start + timedelta(minutes=5))
+        self.assertEqual(Answers.objects.filter(lab=self.lab, user=self.user, lab_task=None).count(), 2)
+
+
+class DuplicateMigrationTest(TransactionTestCase):
+    migrate_from = [('interface', '0059_competition_teardown_idx')]
+    migrate_to = [('interface', '0060_answers_competition2user_indexes')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_duplicates_are_backed_up_and_restored(self):
+        apps = self.migrate(self.migrate_from)
+        Lab_ = apps.get_model('interface', 'Lab')
+        User_ = apps.get_model('interface', 'User')
+        Answers_ = apps.get_model('interface', 'Answers')
+        LabTask_ = apps.get_model('interface', 'LabTask')
+        lab = Lab_.objects.create(name="Migration Lab", slug="migration-lab", platform="NO")
+        task = LabTask_.objects.create(lab=lab, task_id="1")
+        user = User_.objects.create(username="migrated")
+        now = timezone.now()
+        old_task_answer = Answers_.objects.create(lab=lab, user=user, lab_task=task, datetime=now - timedelta(days=1))
+        Answers_.objects.create(lab=lab, user=user, lab_task=task, datetime=now)
+        finish_marks = [Answers_.objects.create(lab=lab, user=user, datetime=now - timedelta(days=days)) for days in (7, 0)]
+
+        apps = self.migrate(self.migrate_to)
+        Answers_ = apps.get_model('interface', 'Answers')
+        backup = apps.get_model('interface', 'DeletedDuplicate').objects.get()
+        self.assertEqual((backup.model, backup.object_id), ('Answers', old_task_answer.pk))
+        # Отметки о завершении разных соревнований не считаются дубликатами
+        self.assertEqual(
+            list(Answers_.objects.filter(lab_task=None).order_by('pk').values_list('pk', flat=True)),
+            [mark.pk for mark in finish_marks]
+        )
+        self.assertEqual(Answers_.objects.count(), 3)
+
+        apps = self.migrate(self.migrate_from)
+        restored = apps.get_model('interface', 'Answers').objects.get(pk=old_task_answer.pk)
+        self.assertEqual(restored.datetime, old_task_answer.datetime)
+        self.assertEqual(restored.lab_task_id, task.pk)
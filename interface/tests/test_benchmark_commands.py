@@ -0,0 +1,42 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from dynamic_config.models import ConfigEntry
+from interface.models import Answers, Lab
+
+
+class BenchmarkAnswersQueriesTest(TestCase):
+    def test_seeded_data_is_rolled_back(self):
+        out = StringIO()
+        call_command('benchmark_answers_queries', answers=50, users=5, tasks=2, repeat=2, stdout=out)
+
+        self.assertIn('Создано ответов: 50', out.getvalue())
+        self.assertIn('answers_lab_time_idx', out.getvalue())
+        self.assertFalse(Answers.objects.exists())
+        self.assertFalse(Lab.objects.exists())
+
+
+class BenchmarkPlatformTest(TestCase):
+    def test_scenarios_run_against_simulator(self):
+        out = StringIO()
+        call_command('benchmark_platform', users=2, labs=2, nodes=2, tasks=2, answers=4, repeat=2, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('Лабы участников: ', output)
+        self.assertIn('заданий 4, не выполнено 0', output)
+        self.assertIn('ошибок 0', output)
+        self.assertIn('ETag совпал (304)', output)
+        self.assertIn('Удаление лаб: ', output)
+        self.assertFalse(Lab.objects.exists())
+        self.assertFalse(ConfigEntry.objects.exists())
+
+
+class BenchmarkLabDescriptionTest(TestCase):
+    def test_compares_rendering(self):
+        out = StringIO()
+        call_command('benchmark_lab_description', sizes=[1], repeat=2, stdout=out)
+
+        self.assertIn('jinja2.Template на каждый запрос', out.getvalue())
+        self.assertIn('Кэш шаблонов', out.getvalue())
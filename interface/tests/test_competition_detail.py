@@ -1,10 +1,13 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
 
+from dynamic_config.utils import get_snapshot
 from interface.models import (
-    Competition, Lab, Answers, User, Competition2User
+    Competition, Lab, LabTask, Answers, User, Competition2User
 )
 
 
@@ -100,3 +103,51 @@ class CompetitionDetailViewTest(TestCase):
 
         # And again, 'available' should not appear (the code only sets 'available' = True if answers is None)
         self.assertFalse(response3.context["available"], "Expected 'available= False' if user already submitted.")
+
+
+class CompetitionDetailQueryBudgetTest(TestCase):
+    # Сессия, пользователь, соревнование, задание участника с заданиями, ответы, сами задания
+    QUERY_BUDGET = 6
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="budget_user", password="pass")
+        self.lab = Lab.objects.create(name="Budget Lab", platform="NO")
+        self.client.force_login(self.user)
+        # Снимок dynamic_config читается один раз на процесс
+        get_snapshot()
+
+    def _competition_with_tasks(self, tasks_count):
+        competition = Competition.objects.create(
+            lab=self.lab,
+            start=timezone.now() - timedelta(hours=1),
+            finish=timezone.now() + timedelta(hours=1),
+        )
+        tasks = [LabTask.objects.create(lab=self.lab, task_id=f"{competition.pk}.{i}") for i in range(tasks_count)]
+        issue = Competition2User.objects.create(competition=competition, user=self.user)
+        issue.tasks.set(tasks)
+        for task in tasks[::2]:
+            Answers.objects.create(lab=self.lab, user=self.user, lab_task=task, datetime=timezone.now())
+        return competition, tasks
+
+    def _get(self, competition):
+        url = reverse("interface:competition-detail", kwargs={"slug": competition.slug})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_does_not_depend_on_tasks(self):
+        _, one_task = self._get(self._competition_with_tasks(1)[0])
+        competition, tasks = self._competition_with_tasks(20)
+        response, many_tasks = self._get(competition)
+
+        self.assertEqual(one_task, many_tasks)
+        self.assertLessEqual(many_tasks, self.QUERY_BUDGET)
+        self.assertEqual([task.done for task in response.context["assigned_tasks"]], [i % 2 == 0 for i in range(20)])
+
+        # Состояние заданий берётся из кэша, новый ответ его сбрасывает
+        _, cached = self._get(competition)
+        self.assertEqual(cached, many_tasks - 2)
+        Answers.objects.create(lab=self.lab, user=self.user, lab_task=tasks[1], datetime=timezone.now())
+        response, _ = self._get(competition)
+        self.assertTrue(response.context["assigned_tasks"][1].done)
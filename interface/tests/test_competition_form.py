@@ -4,8 +4,9 @@ from unittest.mock import patch
 from datetime import timedelta
 
 from interface.forms import CompetitionForm
+from interface.jobs import run_pending_jobs
 from interface.models import (
-    Competition, Platoon, User, Lab, LabLevel, LabTask, Competition2User
+    Competition, Platoon, User, Lab, LabLevel, LabTask, Competition2User, ProvisioningJob
 )
 
 
@@ -108,6 +109,14 @@ class CompetitionFormTest(TransactionTestCase):
         # Save the form
         competition = form.save()
 
+        # Форма только ставит задания в очередь, лабы создаёт воркер
+        mock_create_lab_models.assert_not_called()
+        self.assertEqual(
+            ProvisioningJob.objects.filter(kind=ProvisioningJob.Kind.LAB_CREATE, group=competition.slug).count(),
+            len(self.users_in_platoon) + len(self.non_platoon_users)
+        )
+        run_pending_jobs()
+
         # Make sure external calls were triggered (optional check)
         mock_pf_login_models.assert_called()
         mock_create_lab_models.assert_called()
@@ -144,6 +153,8 @@ class CompetitionFormTest(TransactionTestCase):
 
         # Now delete the competition
         competition.delete()
+        mock_delete_lab.assert_not_called()
+        run_pending_jobs()
 
         self.assertEqual(
             mock_delete_lab.call_count,
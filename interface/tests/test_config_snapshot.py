@@ -0,0 +1,41 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+
+from dynamic_config import utils
+from dynamic_config.models import ConfigEntry
+from interface.context_processors import global_flags
+
+
+class ConfigSnapshotTest(TestCase):
+    def setUp(self):
+        utils.invalidate()
+
+    def test_reads_are_served_from_snapshot(self):
+        ConfigEntry.objects.create(key="ALLOW_COPY", value="да")
+        with self.assertNumQueries(1):
+            self.assertTrue(utils.get_bool_config("ALLOW_COPY"))
+        with self.assertNumQueries(0):
+            self.assertEqual(utils.get_config("MISSING", "default"), "default")
+            global_flags(RequestFactory().get("/"))
+
+    def test_local_change_is_visible_immediately(self):
+        entry = ConfigEntry.objects.create(key="WEB_URL", value="http://old")
+        self.assertEqual(utils.get_config("WEB_URL"), "http://old")
+        entry.value = "http://new"
+        entry.save()
+        self.assertEqual(utils.get_config("WEB_URL"), "http://new")
+        entry.delete()
+        self.assertIsNone(utils.get_config("WEB_URL"))
+
+    def test_other_process_change_is_picked_up_after_version_check(self):
+        self.assertIsNone(utils.get_config("PNET_URL"))
+        # Другой процесс изменил запись: в этом процессе сигнал не сработал, но версия в кэше сменилась
+        with patch.object(utils, "on_config_changed"):
+            ConfigEntry.objects.bulk_create([ConfigEntry(key="PNET_URL", value="http://pnet")])
+        cache.set(utils.CONFIG_VERSION_KEY, "changed-elsewhere", None)
+
+        self.assertIsNone(utils.get_config("PNET_URL"))
+        with patch("dynamic_config.utils.time.monotonic", return_value=utils._checked_at + utils.SNAPSHOT_CHECK_INTERVAL):
+            self.assertEqual(utils.get_config("PNET_URL"), "http://pnet")
@@ -1,8 +1,10 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from unittest.mock import patch, MagicMock
 from interface.models import User, Platoon
-from interface.elastic_utils import delete_elastic_user
+from interface import elastic_utils
+from interface.elastic_utils import delete_elastic_user, user_deletion_batch
 
 User = get_user_model()
 
@@ -78,3 +80,85 @@ class ElasticUserSignalsTest(TestCase):
         # Проверяем, что функция delete_elastic_user не была вызвана
         mock_delete_elastic.assert_not_called()
 
+    @patch('interface.elastic_utils.bulk_delete_elastic_users')
+    @patch('interface.models.delete_elastic_user')
+    def test_batch_deletion_uses_one_bulk_call(self, mock_delete_elastic, mock_bulk_delete):
+        """Тест: внутри user_deletion_batch пользователи удаляются из Elasticsearch одним пакетом"""
+        other = User.objects.create_user(username='other_user', platoon=self.platoon)
+        mock_bulk_delete.return_value = {self.user.pnet_login: 'deleted', other.pnet_login: 'deleted'}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with user_deletion_batch():
+                User.objects.filter(pk__in=[self.user.pk, other.pk]).delete()
+
+        mock_delete_elastic.assert_not_called()
+        mock_bulk_delete.assert_called_once()
+        self.assertCountEqual(mock_bulk_delete.call_args.args[0], [self.user.pnet_login, other.pnet_login])
+
+    @patch('interface.elastic_utils.bulk_delete_elastic_users')
+    @patch('interface.models.delete_elastic_user')
+    def test_failed_batch_deletion_keeps_elastic_users(self, mock_delete_elastic, mock_bulk_delete):
+        """Тест: если удаление откатилось, пользователи Elasticsearch не удаляются"""
+        user_pk = self.user.pk
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic(), user_deletion_batch():
+                    self.user.delete()
+                    raise RuntimeError
+
+        self.assertEqual(callbacks, [])
+        mock_delete_elastic.assert_not_called()
+        mock_bulk_delete.assert_not_called()
+        self.assertTrue(User.objects.filter(pk=user_pk).exists())
+
+
+class ElasticClientTest(TestCase):
+    """Тесты для общего клиента Elasticsearch"""
+
+    def setUp(self):
+        elastic_utils.reset_elastic_client()
+        self.addCleanup(elastic_utils.reset_elastic_client)
+
+    @patch('interface.elastic_utils.Elasticsearch')
+    def test_client_is_shared_and_ping_cached(self, mock_elasticsearch):
+        mock_elasticsearch.return_value.ping.return_value = True
+
+        first = elastic_utils.get_elastic_client()
+        second = elastic_utils.get_elastic_client()
+
+        self.assertIs(first, second)
+        mock_elasticsearch.assert_called_once()
+        first.ping.assert_called_once()
+
+    @patch('interface.elastic_utils.Elasticsearch')
+    def test_ping_runs_outside_client_lock(self, mock_elasticsearch):
+        lock_held = []
+        mock_elasticsearch.return_value.ping.side_effect = (
+            lambda: lock_held.append(elastic_utils._client_lock.locked()) or True
+        )
+
+        self.assertIsNotNone(elastic_utils.get_elastic_client())
+        self.assertEqual(lock_held, [False])
+
+    @patch('interface.elastic_utils.Elasticsearch')
+    def test_bulk_create_uses_one_client(self, mock_elasticsearch):
+        client = mock_elasticsearch.return_value
+        client.ping.return_value = True
+        client.security.put_role.return_value = {'role': {'created': True}}
+        client.security.put_user.return_value = {'created': True}
+
+        results = elastic_utils.bulk_create_elastic_users([('user-1', 'p1'), ('user-2', 'p2')])
+
+        self.assertEqual(results, {'user-1': 'created', 'user-2': 'created'})
+        mock_elasticsearch.assert_called_once()
+        client.ping.assert_called_once()
+        self.assertEqual(client.security.put_user.call_count, 2)
+
+    @patch('interface.elastic_utils.Elasticsearch')
+    def test_unavailable_cluster(self, mock_elasticsearch):
+        mock_elasticsearch.return_value.ping.return_value = False
+
+        self.assertEqual(
+            elastic_utils.bulk_create_elastic_users([('user-1', 'p1')]),
+            {'user-1': 'connection failed'}
+        )
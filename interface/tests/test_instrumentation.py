@@ -0,0 +1,67 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.urls import reverse
+
+from interface import instrumentation
+from interface.models import User
+from interface.pnet_client import PNetClient
+
+
+class RequestTimingTest(TestCase):
+    def setUp(self):
+        instrumentation.registry.reset()
+        self.user = User.objects.create_user(username="timing_user", password="pass", is_staff=True)
+        self.client.force_login(self.user)
+
+    def test_server_timing_header(self):
+        with self.settings(SERVER_TIMING_HEADER=True):
+            response = self.client.get(reverse("interface:competition-list"))
+
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ calls"')
+        self.assertIn("view;dur=", timing)
+        self.assertIn("total;dur=", timing)
+
+    def test_server_timing_header_is_opt_in(self):
+        self.assertNotIn("Server-Timing", self.client.get(reverse("interface:competition-list")))
+
+    def test_metrics_are_aggregated_by_route(self):
+        for _ in range(2):
+            self.client.get(reverse("interface:competition-detail", args=["missing"]))
+
+        text = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn(
+            'cyberpolygon_request_duration_seconds_count{endpoint="cyberpolygon/competitions/<slug:slug>/",'
+            'method="GET",status="404"} 2',
+            text
+        )
+        self.assertIn('cyberpolygon_request_db_queries_bucket{endpoint="cyberpolygon/competitions/<slug:slug>/"', text)
+
+    def test_external_calls_are_tracked(self):
+        client = PNetClient()
+        with patch.object(client.session, "request") as request:
+            metrics = instrumentation.RequestMetrics()
+            token = instrumentation._current.set(metrics)
+            try:
+                client.get("http://pnet.test/api/labs")
+                client.post("http://pnet.test/api/labs")
+            finally:
+                instrumentation._current.reset(token)
+        client.close()
+
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(metrics.calls["pnet"][0], 2)
+        self.assertIn('pnet;dur=', instrumentation.server_timing(metrics, 0.1, None))
+
+    def test_metrics_access(self):
+        self.client.logout()
+        # Локальный адрес доступа не даёт: за прокси он у всех запросов
+        self.assertEqual(self.client.get(reverse("metrics"), REMOTE_ADDR="127.0.0.1").status_code, 403)
+
+        with self.settings(METRICS_TOKEN="secret"):
+            self.assertEqual(self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+            self.assertEqual(self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret").status_code, 200)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
@@ -0,0 +1,191 @@
+import time
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from interface import jobs, provisioning
+from interface.models import Competition, Competition2User, Lab, ProvisioningJob, User
+
+
+class ProvisioningJobQueueTest(TestCase):
+    def setUp(self):
+        provisioning._host_semaphores.clear()
+        self.session_manager = MagicMock(_url="http://pnet.test")
+        patcher = patch("interface.provisioning.ensure_admin_pnet_session", return_value=self.session_manager)
+        self.ensure_session = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.lab = Lab.objects.create(name="Queue Lab", platform="PN", slug="queue-lab")
+        self.competition = Competition.objects.create(
+            slug="queue-comp",
+            start=timezone.now(),
+            finish=timezone.now() + timedelta(hours=1),
+            lab=self.lab,
+        )
+        self.user = User.objects.create_user(username="queue_user", password="pass")
+
+    def _issue(self):
+        return Competition2User.objects.create(competition=self.competition, user=self.user)
+
+    def test_post_create_only_enqueues(self):
+        issue = self._issue()
+
+        job = ProvisioningJob.objects.get()
+        self.assertEqual(job.kind, ProvisioningJob.Kind.LAB_CREATE)
+        self.assertEqual(job.idempotency_key, f"lab_create:c2u:{issue.pk}")
+        self.assertEqual(job.group, "queue-comp")
+        self.assertEqual(job.status, ProvisioningJob.Status.PENDING)
+        self.session_manager.provision_lab.assert_not_called()
+
+    def test_enqueue_is_idempotent(self):
+        first = ProvisioningJob.enqueue(ProvisioningJob.Kind.DIRECTORY_CREATE, "directory:x", {"path": "/", "name": "x"})
+        second = ProvisioningJob.enqueue(ProvisioningJob.Kind.DIRECTORY_CREATE, "directory:x", {"path": "/", "name": "y"})
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(second.payload["name"], "x")
+
+    def test_non_pnet_lab_is_not_queued(self):
+        self.lab.platform = "NO"
+        self.lab.save()
+        self._issue()
+        self.assertFalse(ProvisioningJob.objects.exists())
+
+    def test_run_pending_jobs(self):
+        issue = self._issue()
+        jobs.run_pending_jobs()
+
+        job = ProvisioningJob.objects.get()
+        self.assertEqual(job.status, ProvisioningJob.Status.DONE)
+        self.assertEqual(job.attempts, 1)
+        self.session_manager.provision_lab.assert_called_once_with(self.lab, job.payload["lab_name"], "queue_user")
+
+        issue.delete()
+        jobs.run_pending_jobs()
+        self.session_manager.delete_lab_for_user.assert_called_once_with(job.payload["lab_name"], "queue_user")
+        self.assertEqual(
+            ProvisioningJob.objects.get(kind=ProvisioningJob.Kind.LAB_DELETE).status,
+            ProvisioningJob.Status.DONE
+        )
+
+    def test_delete_before_create_cancels_job(self):
+        self._issue().delete()
+        self.assertFalse(ProvisioningJob.objects.exists())
+
+    def test_failed_job_is_retried_then_marked_failed(self):
+        self.session_manager.provision_lab.side_effect = RuntimeError("PNET is down")
+        self._issue()
+
+        jobs.run_pending_jobs()
+        job = ProvisioningJob.objects.get()
+        self.assertEqual(job.status, ProvisioningJob.Status.PENDING)
+        self.assertEqual(job.last_error, "PNET is down")
+        self.assertGreater(job.run_after, timezone.now())
+
+        # Пока не подошло время повтора, задание не выполняется
+        self.assertEqual(jobs.run_pending_jobs(), [])
+
+        for _ in range(job.max_attempts - 1):
+            ProvisioningJob.objects.update(run_after=timezone.now())
+            jobs.run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProvisioningJob.Status.FAILED)
+        self.assertEqual(job.attempts, job.max_attempts)
+
+    def test_session_failure_retries_all_pnet_jobs(self):
+        self.ensure_session.side_effect = ConnectionError("no route to host")
+        self._issue()
+        jobs.run_pending_jobs()
+
+        job = ProvisioningJob.objects.get()
+        self.assertEqual(job.status, ProvisioningJob.Status.PENDING)
+        self.assertEqual(job.last_error, "no route to host")
+
+    def test_stale_running_job_is_requeued(self):
+        self._issue()
+        ProvisioningJob.objects.update(
+            status=ProvisioningJob.Status.RUNNING,
+            updated_at=timezone.now() - jobs.STALE_JOB_TIMEOUT - timedelta(minutes=1),
+        )
+        jobs.run_pending_jobs()
+        self.assertEqual(ProvisioningJob.objects.get().status, ProvisioningJob.Status.DONE)
+
+    def test_reclaimed_job_result_is_discarded(self):
+        self._issue()
+        job, = jobs.claim_jobs(lease="first")
+        # Задание сочли брошенным и забрал другой воркер
+        ProvisioningJob.objects.update(lease="second")
+
+        self.assertFalse(jobs.finish_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProvisioningJob.Status.RUNNING)
+        self.assertEqual(job.attempts, 0)
+
+    @patch.object(jobs, "HEARTBEAT_INTERVAL", timedelta(milliseconds=50))
+    def test_running_jobs_are_touched(self):
+        self._issue()
+        self.session_manager.provision_lab.side_effect = lambda *args: time.sleep(0.3)
+
+        touched = []
+        touch_jobs = jobs.touch_jobs
+        with patch("interface.jobs.touch_jobs", side_effect=lambda *args: touched.append(touch_jobs(*args))):
+            jobs.run_pending_jobs()
+        # Отметка обновлялась, пока лаба создавалась
+        self.assertGreaterEqual(len(touched), 3)
+        self.assertEqual(set(touched), {1})
+        self.assertEqual(ProvisioningJob.objects.get().status, ProvisioningJob.Status.DONE)
+
+    def test_jobs_of_one_issue_run_in_order(self):
+        issue = self._issue()
+        payload = {"lab_name": ProvisioningJob.objects.get().payload["lab_name"], "owner": "queue_user"}
+        ProvisioningJob.enqueue(ProvisioningJob.Kind.LAB_DELETE, f"lab_delete:c2u:{issue.pk}", payload)
+        ProvisioningJob.enqueue(ProvisioningJob.Kind.DIRECTORY_CREATE, "directory:x", {"path": "/", "name": "x"})
+
+        first = jobs.run_pending_jobs()
+        self.assertEqual([job.kind for job in first], [ProvisioningJob.Kind.LAB_CREATE, ProvisioningJob.Kind.DIRECTORY_CREATE])
+        self.session_manager.delete_lab_for_user.assert_not_called()
+
+        second = jobs.run_pending_jobs()
+        self.assertEqual([job.kind for job in second], [ProvisioningJob.Kind.LAB_DELETE])
+
+    @patch("interface.jobs.bulk_create_elastic_users")
+    def test_elastic_jobs_are_created_in_one_batch(self, mock_create):
+        other = User.objects.create_user(username="other_user", password="pass")
+        mock_create.return_value = {"queue-user": "created", "other-user": "connection failed"}
+        for user in (self.user, other):
+            ProvisioningJob.enqueue(ProvisioningJob.Kind.ELASTIC_USER_CREATE, f"elastic_user:{user.pk}", {"user_id": user.pk})
+        jobs.run_pending_jobs()
+
+        mock_create.assert_called_once_with([("queue-user", None), ("other-user", None)], index="suricata-*")
+        self.assertEqual(
+            ProvisioningJob.objects.get(idempotency_key=f"elastic_user:{self.user.pk}").status,
+            ProvisioningJob.Status.DONE
+        )
+        failed = ProvisioningJob.objects.get(idempotency_key=f"elastic_user:{other.pk}")
+        self.assertEqual(failed.status, ProvisioningJob.Status.PENDING)
+        self.assertEqual(failed.last_error, "Elasticsearch: connection failed")
+        self.ensure_session.assert_not_called()
+
+
+class ProvisioningStatusAPITest(TestCase):
+    def setUp(self):
+        self.url = reverse("interface_api:provisioning_status", kwargs={"slug": "status-comp"})
+        for i, status in enumerate([ProvisioningJob.Status.DONE, ProvisioningJob.Status.DONE, ProvisioningJob.Status.FAILED]):
+            ProvisioningJob.objects.create(
+                kind=ProvisioningJob.Kind.LAB_CREATE, idempotency_key=f"key{i}", group="status-comp",
+                status=status, last_error="boom" if status == ProvisioningJob.Status.FAILED else "",
+            )
+
+    def test_requires_staff(self):
+        User.objects.create_user(username="student", password="pass")
+        self.client.login(username="student", password="pass")
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_status(self):
+        User.objects.create_user(username="admin", password="pass", is_staff=True)
+        self.client.login(username="admin", password="pass")
+        data = self.client.get(self.url).json()
+        self.assertEqual(data["counts"], {"PENDING": 0, "RUNNING": 0, "DONE": 2, "FAILED": 1})
+        self.assertTrue(data["done"])
+        self.assertEqual(data["errors"], [{"kind": "LAB_CREATE", "idempotency_key": "key2", "last_error": "boom"}])
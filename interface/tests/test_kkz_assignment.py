@@ -0,0 +1,69 @@
+import json
+
+from django.test import TestCase
+
+from interface.forms import SimpleKkzForm
+from interface.models import Competition2User, KkzPreview, Lab, LabTask, Platoon, ProvisioningJob, User
+
+
+class SimpleKkzAssignmentTest(TestCase):
+    def setUp(self):
+        self.platoon = Platoon.objects.create(number=31)
+        User.objects.bulk_create(
+            User(username=f"kkz_student_{i}", pnet_login=f"kkz-student-{i}", platoon=self.platoon) for i in range(40)
+        )
+        self.labs = [
+            Lab.objects.create(name=f"KKZ Lab {i}", slug=f"kkz-lab-{i}", lab_type="EXAM", platform="PN" if i else "NO")
+            for i in range(3)
+        ]
+        for lab in self.labs:
+            LabTask.objects.bulk_create(LabTask(lab=lab, task_id=f"{lab.pk}.{j}") for j in range(4))
+
+    def create_kkz(self, unified=False, max_tasks=None, labs_data=None):
+        labs_data = labs_data or [{"lab_id": lab.pk, "included": True} for lab in self.labs]
+        labs_data[0]["max_tasks_limit"] = max_tasks
+        form = SimpleKkzForm(data={
+            "name": "KKZ", "platoon": self.platoon.pk, "duration_0": 2, "duration_1": 0,
+            "unified_tasks": unified, "labs_data": json.dumps(labs_data),
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.create_kkz()
+
+    def test_bulk_assignment(self):
+        # ККЗ, взвод, участники, лабы и задания; по 4 запроса на лабу; пачка записей в транзакции
+        with self.assertNumQueries(25):
+            kkz = self.create_kkz(max_tasks=6)
+
+        issues = Competition2User.objects.filter(competition__kkz=kkz)
+        tasks_per_user = {}
+        for issue in issues.prefetch_related("tasks"):
+            self.assertTrue(all(task.lab_id == issue.competition.lab_id for task in issue.tasks.all()))
+            tasks_per_user[issue.user_id] = tasks_per_user.get(issue.user_id, 0) + issue.tasks.count()
+        self.assertEqual(set(tasks_per_user.values()), {6})
+        self.assertEqual(KkzPreview.objects.filter(kkz=kkz).count(), issues.count())
+
+        # Лабы в PNET создаются только для лаб с платформой
+        jobs = ProvisioningJob.objects.filter(kind=ProvisioningJob.Kind.LAB_CREATE)
+        self.assertEqual(jobs.count(), issues.exclude(competition__lab=self.labs[0]).count())
+        issue = issues.exclude(competition__lab=self.labs[0]).select_related("user", "competition").first()
+        job = jobs.get(idempotency_key=f"lab_create:c2u:{issue.pk}")
+        self.assertEqual(job.payload["owner"], issue.user.username)
+        self.assertEqual(job.group, issue.competition.slug)
+
+    def test_unified_tasks(self):
+        kkz = self.create_kkz(unified=True, max_tasks=5)
+        tasks_by_user = {}
+        for user_id, task_id in Competition2User.objects.filter(competition__kkz=kkz).values_list("user", "tasks"):
+            tasks_by_user.setdefault(user_id, set()).add(task_id)
+        self.assertEqual(len(tasks_by_user), 40)
+        self.assertEqual(len({frozenset(tasks) for tasks in tasks_by_user.values()}), 1)
+        self.assertEqual(len(next(iter(tasks_by_user.values()))), 5)
+
+    def test_selected_tasks_only(self):
+        selected = list(LabTask.objects.filter(lab=self.labs[2]).values_list("pk", flat=True)[:2])
+        kkz = self.create_kkz(labs_data=[{"lab_id": self.labs[2].pk, "included": True, "task_ids": selected}])
+
+        issues = Competition2User.objects.filter(competition__kkz=kkz)
+        self.assertEqual(issues.count(), 40)
+        self.assertEqual(set(issues.values_list("tasks", flat=True)), set(selected))
+        self.assertEqual(list(kkz.kkz_labs.get().tasks.order_by("pk").values_list("pk", flat=True)), selected)
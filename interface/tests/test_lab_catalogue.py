@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+
+from interface import lab_catalogue
+from interface.models import Lab, LabTask, Platoon, User
+
+
+class LabCatalogueTest(TestCase):
+    def setUp(self):
+        self.labs = []
+        for i in range(3):
+            for lab_type in ("HW", "EXAM"):
+                self.labs.append(Lab.objects.create(
+                    name=f"Catalogue Lab {i}", slug=f"catalogue-lab-{i}", lab_type=lab_type, platform="NO",
+                    program="COMPETITION", learning_years=[1, 2] if i else [3],
+                    cover="interface/labs/covers/cover.png" if lab_type == "EXAM" else None,
+                    default_duration=timedelta(hours=2),
+                ))
+        for lab in self.labs:
+            LabTask.objects.bulk_create(LabTask(lab=lab, task_id=str(j), description=f"Task {j}") for j in range(2))
+        self.staff = User.objects.create_user(username="teacher", password="pass", is_staff=True)
+        self.client.force_login(self.staff)
+        lab_catalogue.invalidate()
+
+    def test_lab_list_uses_cached_catalogue(self):
+        url = reverse("interface:lab-list")
+        self.client.get(url)
+        with self.assertNumQueries(2):  # сессия и пользователь
+            response = self.client.get(url)
+
+        bundles = response.context["programs_data"]["COMPETITION"]["bundles"]
+        self.assertEqual([bundle["slug"] for bundle in bundles], ["catalogue-lab-0", "catalogue-lab-1", "catalogue-lab-2"])
+        self.assertEqual(bundles[0]["cover"], "/media/interface/labs/covers/cover.png")
+        self.assertEqual(bundles[0]["labs"]["HW"]["lab_type_label"], "Домашнее задание")
+        self.assertIsNone(bundles[0]["labs"]["PZ"])
+        self.assertContains(response, reverse("interface:lab-detail", args=["catalogue-lab-0", "EXAM"]))
+
+    def test_lab_save_invalidates_catalogue(self):
+        lab_catalogue.get_catalogue()
+        self.labs[0].name = "Renamed Lab"
+        self.labs[0].save()
+        names = {lab["id"]: lab["name"] for lab in lab_catalogue.get_catalogue()["labs"]}
+        self.assertEqual(names[self.labs[0].pk], "Renamed Lab")
+
+        self.labs[0].delete()
+        self.assertEqual(len(lab_catalogue.get_catalogue()["labs"]), 5)
+
+    def test_labs_for_platoon(self):
+        platoon = Platoon.objects.create(number=21, learning_year=2)
+        url = reverse("interface_api:get-labs-for-platoon")
+        lab_catalogue.get_catalogue()
+        # взвод и задания всех лаб одним запросом
+        with self.assertNumQueries(2):
+            data = self.client.get(url, {"platoon_id": platoon.pk}).json()
+
+        self.assertEqual([lab["slug"] for lab in data["labs"]], ["catalogue-lab-1", "catalogue-lab-2"])
+        self.assertEqual([task["description"] for task in data["labs"][0]["tasks"]], ["Task 0", "Task 1"])
+        self.assertEqual(data["labs"][0]["default_duration"], "2:00:00")
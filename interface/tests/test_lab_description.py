@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from interface import utils
+from interface.utils import clear_description_templates, patch_lab_description
+
+
+def make_competition(description, lab_id=1):
+    return SimpleNamespace(lab=SimpleNamespace(pk=lab_id, description=description))
+
+
+class PatchLabDescriptionTest(SimpleTestCase):
+    def setUp(self):
+        clear_description_templates()
+        self.user = SimpleNamespace(username="student", pnet_login="student-1")
+
+    def test_render_substitutes_user(self):
+        competition = make_competition("<p>{{ pnet_login }} / {{ username_uppercase }}</p>")
+        patch_lab_description(competition, self.user)
+        self.assertEqual(competition.lab.description, "<p>student-1 / STUDENT</p>")
+
+    def test_template_compiled_once_per_description(self):
+        with mock.patch.object(utils._description_env, "from_string", wraps=utils._description_env.from_string) as compile_:
+            for _ in range(3):
+                patch_lab_description(make_competition("{{ username }}"), self.user)
+            self.assertEqual(compile_.call_count, 1)
+
+            competition = make_competition("{{ username }}!")
+            patch_lab_description(competition, self.user)
+            self.assertEqual(compile_.call_count, 2)
+            self.assertEqual(competition.lab.description, "student!")
+
+    def test_cache_is_bounded(self):
+        with mock.patch.object(utils, "DESCRIPTION_TEMPLATE_CACHE_SIZE", 2):
+            for lab_id in range(5):
+                patch_lab_description(make_competition("{{ username }}", lab_id), self.user)
+        self.assertEqual(list(utils._description_templates), [(3, mock.ANY), (4, mock.ANY)])
+
+    def test_sandbox_blocks_unsafe_access(self):
+        description = "{{ ''.__class__.__mro__[1].__subclasses__() }}"
+        competition = make_competition(description)
+        with self.assertLogs("interface.utils", "WARNING"):
+            patch_lab_description(competition, self.user)
+        self.assertEqual(competition.lab.description, description)
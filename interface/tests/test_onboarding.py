@@ -0,0 +1,160 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from unittest.mock import MagicMock, patch
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from interface import onboarding
+from interface.eveFunctions import UserSyncResult
+from interface.jobs import run_pending_jobs
+from interface.models import Platoon, ProvisioningJob, RosterImport, User
+
+ROSTER_CSV = (
+    "username;first_name;last_name;password;platoon\n"
+    ";Иван;Петров;secret;5\n"
+    "sidorov;Пётр;Сидоров;;\n"
+    "broken;;;;42\n"
+)
+
+
+class OnboardingTest(TestCase):
+    def setUp(self):
+        self.platoon = Platoon.objects.create(number=5)
+
+        self.session_manager = MagicMock(_url="http://pnet.test")
+        self.session_manager.session_index.users.missing_users.side_effect = lambda logins: logins
+        self.session_manager.sync_users.side_effect = lambda desired: UserSyncResult(created=list(desired))
+        patcher = patch("interface.onboarding.ensure_admin_pnet_session", return_value=self.session_manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.elastic_users = set()
+        patcher = patch("interface.onboarding.get_elastic_usernames", side_effect=lambda: set(self.elastic_users))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("interface.onboarding.bulk_create_elastic_users",
+                        side_effect=lambda users, index: {username: 'created' for username, _ in users})
+        self.bulk_create_elastic = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _onboard(self, roster=ROSTER_CSV):
+        return onboarding.onboard_students(onboarding.read_roster(io.StringIO(roster)), hash_workers=1)
+
+    def test_read_roster_json(self):
+        rows = onboarding.read_roster(io.BytesIO(json.dumps([{"username": "a", "platoon": 5}]).encode()), "list.json")
+        self.assertEqual(rows, [{"username": "a", "first_name": "", "last_name": "", "password": "", "platoon": "5"}])
+
+    def test_onboard_students(self):
+        outcomes = self._onboard()
+
+        self.assertEqual(
+            [(outcome.username, outcome.user, outcome.pnet, outcome.elastic) for outcome in outcomes[:2]],
+            [("Петров_Иван", "created", "created", "created"), ("sidorov", "created", "created", "created")]
+        )
+        self.assertEqual(outcomes[2].error, "Взвод 42 не найден")
+
+        petrov = User.objects.get(username="Петров_Иван")
+        self.assertTrue(petrov.check_password("secret"))
+        self.assertEqual(petrov.platoon, self.platoon)
+        self.assertEqual(petrov.pnet_login, "petrov-ivan")
+        sidorov = User.objects.get(username="sidorov")
+        self.assertTrue(sidorov.check_password(onboarding.DEFAULT_PASSWORD))
+        self.assertEqual(sidorov.platoon.number, 0)
+
+        # Все пользователи PNET и Elasticsearch создаются одним вызовом
+        self.session_manager.sync_users.assert_called_once_with({
+            "petrov-ivan": {"password": petrov.pnet_password},
+            "sidorov": {"password": sidorov.pnet_password},
+        })
+        self.assertEqual(self.session_manager.create_directory.call_count, 2)
+        self.bulk_create_elastic.assert_called_once()
+
+    def test_rerun_resumes(self):
+        self._onboard()
+        self.session_manager.reset_mock()
+        self.session_manager.session_index.users.missing_users.side_effect = lambda logins: []
+        self.session_manager.sync_users.side_effect = lambda desired: UserSyncResult(unchanged=list(desired))
+        self.elastic_users = {"petrov-ivan"}
+        self.bulk_create_elastic.side_effect = lambda users, index: {username: 'connection failed' for username, _ in users}
+
+        outcomes = self._onboard()
+
+        self.assertEqual(User.objects.filter(username__in=["Петров_Иван", "sidorov"]).count(), 2)
+        self.assertEqual(
+            [(outcome.user, outcome.pnet, outcome.elastic) for outcome in outcomes[:2]],
+            [("exists", "exists", "exists"), ("exists", "exists", "queued")]
+        )
+        self.session_manager.create_directory.assert_not_called()
+        sidorov = User.objects.get(username="sidorov")
+        self.assertTrue(ProvisioningJob.objects.filter(idempotency_key=f"elastic_user:{sidorov.pk}").exists())
+
+    def test_pnet_errors_are_reported(self):
+        self.session_manager.sync_users.side_effect = lambda desired: UserSyncResult(
+            created=["sidorov"], failed={"petrov-ivan": "PNET responded with 500"}
+        )
+        outcomes = self._onboard()
+        self.assertEqual(outcomes[0].pnet, "failed")
+        self.assertEqual(outcomes[0].error, "PNET: PNET responded with 500")
+        self.assertTrue(outcomes[1].ok)
+
+    def test_admin_import(self):
+        admin = User.objects.create_superuser(username="admin_user", password="pass")
+        self.client.force_login(admin)
+        roster = io.BytesIO(ROSTER_CSV.encode())
+        roster.name = "roster.csv"
+
+        response = self.client.post(reverse("admin:interface_user_import_roster"), {"roster": roster})
+
+        # Веб-запрос только ставит список в очередь
+        job = ProvisioningJob.objects.get(kind=ProvisioningJob.Kind.ROSTER_IMPORT)
+        # Пароли хранятся в отдельной записи, а не в данных задания
+        self.assertNotIn("secret", json.dumps(job.payload))
+        self.assertEqual(job.roster.rows[0]["password"], "secret")
+        self.assertRedirects(response, f'{reverse("admin:interface_user_import_roster")}?job={job.pk}')
+        self.assertFalse(User.objects.filter(username="sidorov").exists())
+        self.assertContains(self.client.get(response.url), "В очереди")
+
+        with patch("interface.onboarding.hash_passwords", wraps=onboarding.hash_passwords) as hash_passwords:
+            run_pending_jobs()
+
+        self.assertEqual(hash_passwords.call_args.args[1], 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProvisioningJob.Status.DONE)
+        self.assertFalse(RosterImport.objects.exists())
+        self.assertTrue(User.objects.filter(username="sidorov").exists())
+        response = self.client.get(response.url)
+        self.assertContains(response, "Взвод 42 не найден")
+        self.assertContains(response, "Обработано студентов: 3, ошибок: 1")
+
+    def test_failed_admin_import_removes_roster(self):
+        admin = User.objects.create_superuser(username="admin_user", password="pass")
+        self.client.force_login(admin)
+        roster = io.BytesIO(ROSTER_CSV.encode())
+        roster.name = "roster.csv"
+        self.client.post(reverse("admin:interface_user_import_roster"), {"roster": roster})
+
+        with patch("interface.jobs.onboard_students", side_effect=RuntimeError("database is down")):
+            run_pending_jobs()
+
+        job = ProvisioningJob.objects.get(kind=ProvisioningJob.Kind.ROSTER_IMPORT)
+        self.assertEqual(job.status, ProvisioningJob.Status.FAILED)
+        self.assertEqual(job.last_error, "database is down")
+        self.assertFalse(RosterImport.objects.exists())
+
+    def test_command_writes_report(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            roster_path, report_path = os.path.join(tmp, "roster.csv"), os.path.join(tmp, "report.csv")
+            with open(roster_path, "w", encoding="utf-8") as f:
+                f.write(ROSTER_CSV)
+            call_command("onboard_students", input=roster_path, hash_workers=1, skip_pnet=True,
+                         skip_elastic=True, report=report_path, stdout=io.StringIO())
+            with open(report_path, encoding="utf-8") as f:
+                report = list(csv.DictReader(f))
+
+        self.assertEqual([row["user"] for row in report], ["created", "created", ""])
+        self.session_manager.sync_users.assert_not_called()
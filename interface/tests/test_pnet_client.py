@@ -0,0 +1,314 @@
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from interface import eveFunctions, eveNodesData
+from interface.pnet_client import PNetClient
+from interface.pnet_session_manager import PNetSessionManager
+from interface.pnet_simulator import PNetSimulator
+
+
+class PNetClientTestCase(SimpleTestCase):
+    def setUp(self):
+        self.server = PNetSimulator().start()
+        self.url = self.server.url
+
+    def tearDown(self):
+        self.server.stop()
+
+    def _provision_lab(self):
+        """Полный цикл создания лабы: логин, лаба, узлы, сети, соединения."""
+        lab = SimpleNamespace(
+            NodesData=[{"template": f"node{i}"} for i in range(6)],
+            NetworksData=[{"name": f"net{i}"} for i in range(3)],
+            ConnectorsData=[{"name": f"p2p{i}"} for i in range(4)],
+            Connectors2CloudData=[{"node_id": "1", "data": {"0": "1"}}],
+        )
+        cookie, xsrf = eveFunctions.pf_login(self.url, 'pnet_scripts', 'eve')
+        eveFunctions.create_lab(self.url, 'lab', '', '/opt/labs', cookie, xsrf, 'student')
+        eveFunctions.create_all_lab_nodes_and_connectors(self.url, lab, '/opt/labs', 'lab', cookie, xsrf, 'student')
+        return xsrf
+
+    def _run(self, client):
+        self.server.reset_counters()
+        with patch('interface.eveFunctions.get_pnet_client', return_value=client):
+            xsrf = self._provision_lab()
+        self.assertEqual(self.server.sessions[xsrf], 'pnet_scripts')
+        return self.server.requests, self.server.connections
+
+    def test_provisioning_reuses_connections(self):
+        pooled = PNetClient()
+        requests_count, pooled_connections = self._run(pooled)
+        pooled.close()
+        self.assertGreaterEqual(requests_count, 20)
+        # Соединений не больше, чем запросов топологии в полёте одновременно
+        self.assertLessEqual(pooled_connections, eveFunctions._topology_window())
+
+        # Для сравнения: новый клиент на каждый вызов, как при прямых requests.post/get
+        fresh = SimpleNamespace(**{
+            method: (lambda method: lambda *args, **kwargs: getattr(PNetClient(), method)(*args, **kwargs))(method)
+            for method in ('get', 'post', 'delete')
+        })
+        _, fresh_connections = self._run(fresh)
+        self.assertEqual(fresh_connections, requests_count)
+
+    def test_session_index_is_shared_across_labs(self):
+        lab = SimpleNamespace(NodesData=[], NetworksData=[], ConnectorsData=[], Connectors2CloudData=[])
+        client = PNetClient()
+        with patch('interface.eveFunctions.get_pnet_client', return_value=client):
+            cookie, xsrf = eveFunctions.pf_login(self.url, 'pnet_scripts', 'eve')
+            index = eveFunctions.PNetSessionIndex(self.url, cookie, xsrf)
+            self.server.paths = []
+            for _ in range(5):
+                eveFunctions.create_all_lab_nodes_and_connectors(self.url, lab, '/opt/labs', 'lab', cookie, xsrf, 'student', index)
+                eveFunctions.delete_lab_with_session_destroy(self.url, 'lab', '/opt/labs', cookie, xsrf, 'student', index)
+        client.close()
+
+        paths = self.server.paths
+        # Таблицы пользователей и сессий скачиваются один раз, дальше — только новые сессии
+        self.assertEqual(sum(path.endswith('/users/filter') for path in paths), 1)
+        self.assertEqual(sum(path.endswith('/lab_sessions/count') for path in paths), 1)
+        self.assertEqual(sum(path.endswith('/lab_sessions/filter') for path in paths), 10)
+        # Каждая созданная сессия найдена и закрыта
+        self.assertEqual(sum(path.endswith('/session/factory/join') for path in paths), 5)
+        self.assertEqual(sum(path.endswith('/session/factory/destroy') for path in paths), 5)
+
+    def _user_directory(self, client, users=0):
+        self.server.users += [
+            {"username": f"student{i}", "pod": i + 1, "password": "old", "user_workspace": f"/student{i}"}
+            for i in range(users)
+        ]
+        cookie, xsrf = eveFunctions.pf_login(self.url, 'pnet_scripts', 'eve')
+        self.server.paths = []
+        return eveFunctions.PNetUserDirectory(self.url, cookie, xsrf)
+
+    def test_user_directory_pages_and_refreshes_incrementally(self):
+        client = PNetClient()
+        with patch('interface.eveFunctions.get_pnet_client', return_value=client), \
+                patch.object(eveFunctions.PNetUserDirectory, 'PAGE_SIZE', 10):
+            directory = self._user_directory(client, users=25)
+            # 26 пользователей — три страницы по 10
+            self.assertEqual(directory.user('student0')["pod"], 1)
+            self.assertEqual(sum(path.endswith('/users/filter') for path in self.server.paths), 3)
+
+            for i in range(25):
+                directory.user(f'student{i}')
+            self.assertEqual(sum(path.endswith('/users/filter') for path in self.server.paths), 3)
+
+            # Неизвестный логин — догружается только первая страница с новыми пользователями
+            self.server.users.append({"username": "newcomer", "pod": 100})
+            self.assertEqual(directory.user('newcomer')["pod"], 100)
+            self.assertEqual(sum(path.endswith('/users/filter') for path in self.server.paths), 4)
+        client.close()
+
+    def test_sync_users(self):
+        client = PNetClient()
+        with patch('interface.eveFunctions.get_pnet_client', return_value=client), \
+                patch('interface.eveFunctions.get_user_workspace_relative_path', return_value=''):
+            directory = self._user_directory(client, users=5)
+            desired = {f'student{i}': {"password": "old"} for i in range(5)}
+            desired['student1'] = {"password": "new"}
+            desired['student2'] = {"user_workspace": "/team"}
+            desired['student7'] = {"password": "fresh"}
+            desired['ghost'] = {"user_workspace": "/team"}
+
+            result = directory.sync_users(desired)
+        client.close()
+
+        self.assertEqual(result.created, ['student7'])
+        self.assertCountEqual(result.updated, ['student1', 'student2'])
+        self.assertCountEqual(result.unchanged, ['student0', 'student3', 'student4'])
+        self.assertEqual(result.missing, ['ghost'])
+        self.assertFalse(result.ok)
+
+        paths = self.server.paths
+        self.assertEqual(sum(path.endswith('/users/offAdd') for path in paths), 1)
+        self.assertEqual(sum(path.endswith('/users/offEdit') for path in paths), 2)
+        users = {user["username"]: user for user in self.server.users}
+        self.assertEqual(users['student1']["password"], "new")
+        self.assertEqual(users['student2']["user_workspace"], "/team")
+        self.assertEqual(users['student7']["user_workspace"], "/student7")
+
+    def _topology_lab(self, nodes=24, with_ids=True):
+        return SimpleNamespace(
+            NodesData=[dict({"template": f"node{i}"}, **({"id": i + 1} if with_ids else {})) for i in range(nodes)],
+            NetworksData=[{"id": 1, "name": "net"}],
+            ConnectorsData=[{"name": f"p2p{i}"} for i in range(2)],
+            Connectors2CloudData=[],
+        )
+
+    def test_topology_push_is_concurrent(self):
+        self.server.element_delay = 0.05
+        client = PNetClient()
+        with patch('interface.eveFunctions.get_pnet_client', return_value=client):
+            started = time.monotonic()
+            failures = eveFunctions.push_lab_topology(self.url, self._topology_lab(), {}, window=8)
+            elapsed = time.monotonic() - started
+        client.close()
+
+        self.assertEqual(failures, [])
+        self.assertEqual(self.server.max_in_flight, 8)
+        # 24 узла по 50 мс последовательно заняли бы больше 1.2 с
+        self.assertLess(elapsed, 0.8)
+
+    def test_topology_concurrency_requires_explicit_ids(self):
+        lab = self._topology_lab(nodes=3)
+        lab.NetworksData = [{"id": "1", "name": "net1"}, {"id": 2, "name": "net2", "count": "2"}]
+        lab.Connectors2CloudData = [{"node_id": "1", "data": {"0": "1"}}]
+        phases, failures = eveFunctions.plan_lab_topology(lab)
+
+        self.assertEqual(failures, [])
+        concurrent = {phase: concurrent for phase, _, concurrent, _ in phases}
+        # count > 1 и элементы без id (p2p) нумерует сам PNET — только по одному
+        self.assertEqual(concurrent, {"nodes": True, "networks": False, "p2p": False, "cloud": True})
+
+        lab.NodesData[0]["id"] = "first"
+        phases, _ = eveFunctions.plan_lab_topology(lab)
+        self.assertFalse(phases[0][2])
+
+    def test_topology_without_ids_keeps_order(self):
+        client = PNetClient()
+        with patch('interface.eveFunctions.get_pnet_client', return_value=client):
+            eveFunctions.push_lab_topology(self.url, self._topology_lab(nodes=5, with_ids=False), {}, window=8)
+        client.close()
+
+        self.assertEqual(self.server.max_in_flight, 1)
+        node_paths = [path for path in self.server.paths if path.endswith('/nodes/add')]
+        self.assertEqual(len(node_paths), 5)
+
+    def test_topology_connectors_reach_intended_nodes(self):
+        # Случайная задержка перемешала бы номера узлов, отправленных параллельно без id
+        self.server.element_jitter = 0.02
+        for with_ids in (False, True):
+            with self.subTest(with_ids=with_ids):
+                nodes = [dict(params) for params in (
+                    eveNodesData.router_params, eveNodesData.server_params, eveNodesData.kali_params
+                )]
+                if with_ids:
+                    for node_id, params in enumerate(nodes, start=1):
+                        params["id"] = node_id
+                lab = SimpleNamespace(
+                    NodesData=nodes,
+                    NetworksData=[dict(eveNodesData.net_params)],
+                    ConnectorsData=[dict(eveNodesData.p2p_server), dict(eveNodesData.p2p_kali)],
+                    Connectors2CloudData=[dict(eveNodesData.p2Cloud_params)],
+                )
+                self.server.topologies.clear()
+                client = PNetClient()
+                with patch('interface.eveFunctions.get_pnet_client', return_value=client):
+                    failures = eveFunctions.push_lab_topology(self.url, lab, {}, window=8)
+                client.close()
+
+                self.assertEqual(failures, [])
+                topology = self.server.topology_for(None)
+                self.assertEqual(
+                    {node_id: node["name"] for node_id, node in topology.nodes.items()},
+                    {1: "Mikrotik", 2: "Ubuntu-server", 3: "Kali-Linux"}
+                )
+                self.assertEqual(topology.links, [
+                    {"network": 2, "src": "Mikrotik", "dest": "Ubuntu-server"},
+                    {"network": 3, "src": "Mikrotik", "dest": "Kali-Linux"},
+                ])
+                self.assertEqual(topology.cloud, [("Mikrotik", {"0": "1"})])
+
+    def test_topology_failures_are_reported(self):
+        lab = self._topology_lab(nodes=3)
+        lab.NodesData[1]["template"] = "broken"
+        lab.ConnectorsData = [{"name": "p2p"}, "not an object"]
+        client = PNetClient()
+        with patch('interface.eveFunctions.get_pnet_client', return_value=client):
+            failures = eveFunctions.push_lab_topology(self.url, lab, {})
+        client.close()
+
+        self.assertEqual(
+            [(failure.phase, failure.index) for failure in failures],
+            [("p2p", 1), ("nodes", 1)]
+        )
+        self.assertIn("Unknown template", failures[1].error)
+
+    def test_failure_injection(self):
+        self.server.fail_paths = {'/nodes/add'}
+        client = PNetClient()
+        with patch('interface.eveFunctions.get_pnet_client', return_value=client):
+            failures = eveFunctions.push_lab_topology(self.url, self._topology_lab(nodes=3), {})
+        client.close()
+
+        self.assertEqual([(failure.phase, failure.index) for failure in failures], [("nodes", i) for i in range(3)])
+        self.assertIn("Injected failure", failures[0].error)
+
+    def _provision_competition(self, cloning, users=10):
+        """Лабы для ``users`` участников через PNetSessionManager; возвращает (запросы, время)."""
+        lab = self._topology_lab(nodes=12, with_ids=False)
+        client = PNetClient()
+        with patch('interface.eveFunctions.get_pnet_client', return_value=client), \
+                patch('interface.pnet_session_manager.get_pnet_url', return_value=self.url), \
+                patch('interface.pnet_session_manager.get_pnet_base_dir', return_value='/opt/labs'), \
+                patch('interface.pnet_session_manager.get_pnet_lab_cloning', return_value=cloning):
+            manager = PNetSessionManager()
+            with manager:
+                self.server.requests = 0
+                started = time.monotonic()
+                for i in range(users):
+                    self.assertEqual(manager.provision_lab(lab, 'lab', f'user{i}'), [])
+                elapsed = time.monotonic() - started
+                requests_count = self.server.requests
+        client.close()
+
+        for i in range(users):
+            self.assertIn(f'/opt/labs/user{i}/lab.unl', self.server.labs)
+        return requests_count, elapsed
+
+    def test_golden_lab_cloning(self):
+        self.server.element_delay = 0.005
+        per_element_requests, per_element_time = self._provision_competition(cloning=False)
+        self.server.labs.clear()
+        cloned_requests, cloned_time = self._provision_competition(cloning=True)
+
+        # Одна сборка эталона и по два запроса (копия + перенос) на участника
+        self.assertIn('/opt/labs/golden-labs/lab-golden.unl', self.server.labs)
+        self.assertLess(cloned_requests * 3, per_element_requests)
+        self.assertLess(cloned_time, per_element_time)
+
+    def test_golden_lab_is_rebuilt_when_topology_changes(self):
+        lab = self._topology_lab(nodes=3, with_ids=False)
+        client = PNetClient()
+        with patch('interface.eveFunctions.get_pnet_client', return_value=client), \
+                patch('interface.pnet_session_manager.get_pnet_url', return_value=self.url), \
+                patch('interface.pnet_session_manager.get_pnet_base_dir', return_value='/opt/labs'):
+            def golden_builds(username):
+                self.server.paths = []
+                with PNetSessionManager() as manager:
+                    self.assertTrue(manager.clone_lab_for_user(lab, 'lab', username))
+                return sum(path.endswith('/nodes/add') for path in self.server.paths)
+
+            self.assertEqual(golden_builds('user0'), 3)
+            # Эталон переиспользуется и в новой сессии
+            self.assertEqual(golden_builds('user1'), 0)
+
+            lab.NodesData = lab.NodesData + [{"template": "node3"}]
+            self.assertEqual(golden_builds('user2'), 4)
+            self.assertEqual(golden_builds('user3'), 0)
+        client.close()
+
+    def test_cloning_falls_back_when_unsupported(self):
+        self.server.clone_supported = False
+        self._provision_competition(cloning=True, users=3)
+        clone_attempts = [path for path in self.server.paths if path == '/api/labs']
+        # После первого отказа копирование больше не пробуется: 1 эталон + 1 попытка + 3 лабы
+        self.assertEqual(len(clone_attempts), 5)
+
+    def test_session_cookies_are_not_shared(self):
+        client = PNetClient()
+        client.get(self.url + '/')
+        self.assertEqual(len(client.session.cookies), 0)
+        client.close()
+
+    def test_default_timeout(self):
+        client = PNetClient(timeout=(1, 2))
+        with patch.object(client.session, 'request') as request:
+            client.post(self.url + '/api/labs', json={})
+            client.get(self.url + '/', timeout=7)
+        self.assertEqual(request.call_args_list[0].kwargs['timeout'], (1, 2))
+        self.assertEqual(request.call_args_list[1].kwargs['timeout'], 7)
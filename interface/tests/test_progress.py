@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from interface import progress
+from interface.models import Answers, Competition, Competition2User, Lab, LabTask, Platoon, User
+
+
+class ProgressReportTest(TestCase):
+    def setUp(self):
+        self.labs = [Lab.objects.create(name=f"Progress Lab {i}", platform="NO") for i in range(2)]
+        self.competitions = [
+            Competition.objects.create(
+                lab=lab, start=timezone.now() - timedelta(hours=1), finish=timezone.now() + timedelta(hours=1)
+            )
+            for lab in self.labs
+        ]
+        self.platoons = [Platoon.objects.create(number=number) for number in (11, 12)]
+        self.users = []
+        for platoon in self.platoons:
+            for i in range(3):
+                user = User.objects.create_user(username=f"student_{platoon.number}_{i}", password="pass", platoon=platoon)
+                for competition in self.competitions:
+                    Competition2User.objects.create(competition=competition, user=user)
+                self.users.append(user)
+        # В первом взводе каждый сдал первую лабу, первый студент — обе (второй ответ по лабе не учитывается)
+        for user in self.users[:3]:
+            Answers.objects.create(lab=self.labs[0], user=user, datetime=timezone.now())
+        task = LabTask.objects.create(lab=self.labs[0], task_id="1")
+        Answers.objects.create(lab=self.labs[0], user=self.users[0], lab_task=task, datetime=timezone.now())
+        Answers.objects.create(lab=self.labs[1], user=self.users[0], datetime=timezone.now())
+
+    def test_report(self):
+        with self.assertNumQueries(3):
+            report = progress.get_report()
+        with self.assertNumQueries(0):
+            progress.get_report()
+
+        self.assertEqual(report['platoons'][self.platoons[0].pk], {'total': 6, 'submitted': 4, 'progress': 66})
+        self.assertEqual(report['platoons'][self.platoons[1].pk], {'total': 6, 'submitted': 0, 'progress': 0})
+        self.assertEqual(progress.user_progress(self.users[0].pk), {'total': 2, 'submitted': 2, 'progress': 100})
+        self.assertEqual(progress.user_progress(self.users[1].pk), {'total': 2, 'submitted': 1, 'progress': 50})
+
+    def test_answers_invalidate_report(self):
+        progress.get_report()
+        Answers.objects.create(lab=self.labs[0], user=self.users[3], datetime=timezone.now())
+        self.assertEqual(progress.platoon_progress(self.platoons[1].pk)['submitted'], 1)
+
+        Competition2User.objects.filter(user=self.users[3]).first().delete()
+        self.assertEqual(progress.platoon_progress(self.platoons[1].pk)['total'], 5)
+
+    def test_api(self):
+        url = reverse("interface_api:progress_report")
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(User.objects.create_user(username="teacher", password="pass", is_staff=True))
+        data = self.client.get(url, {"platoon": 11}).json()
+
+        self.assertEqual(
+            [(row["number"], row["submitted"], row["progress"]) for row in data["platoons"]],
+            [(11, 4, 66), (12, 0, 0)]
+        )
+        self.assertEqual([row["submitted"] for row in data["users"]], [2, 1, 1])
+        self.assertEqual(self.client.get(url, {"platoon": 99}).status_code, 404)
@@ -0,0 +1,113 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase, override_settings
+
+from interface import provisioning
+from interface.provisioning import ProvisioningBatch, RateLimiter
+
+
+@override_settings(PROVISIONING_WORKERS=8, PNET_HOST_CONCURRENCY=3, PNET_CLEANUP_RATE=0, PNET_CLEANUP_CONCURRENCY=2)
+class ProvisioningBatchTest(SimpleTestCase):
+    def setUp(self):
+        provisioning._host_semaphores.clear()
+        provisioning._cleanup_throttles.clear()
+        self.session_manager = MagicMock(_url="http://pnet.test")
+        patcher = patch("interface.provisioning.ensure_admin_pnet_session", return_value=self.session_manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.done = []
+
+    def _operation(self, key, fail=False):
+        def operation(session_manager):
+            self.assertIs(session_manager, self.session_manager)
+            with self.lock:
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+            time.sleep(0.05)
+            with self.lock:
+                self.active -= 1
+                self.done.append(key)
+            if fail:
+                raise RuntimeError("PNET error")
+        return operation
+
+    def test_batch_runs_in_parallel_with_host_limit(self):
+        batch = ProvisioningBatch()
+        for i in range(9):
+            batch.add(f"user{i}", self._operation(f"user{i}"))
+        # До запуска операции только копятся
+        self.assertEqual(self.done, [])
+
+        batch.run()
+        self.assertEqual(sorted(self.done), sorted(f"user{i}" for i in range(9)))
+        self.assertEqual(self.max_active, 3)
+        self.assertEqual([result.key for result in batch.results], [f"user{i}" for i in range(9)])
+        self.assertTrue(all(result.success for result in batch.results))
+        # Одна сессия PNET на весь пакет
+        self.session_manager.__enter__.assert_called_once()
+        self.session_manager.__exit__.assert_called_once()
+
+    def test_failures_are_collected(self):
+        batch = ProvisioningBatch()
+        batch.add("ok", self._operation("ok"))
+        batch.add("broken", self._operation("broken", fail=True))
+        batch.run()
+
+        self.assertEqual([result.key for result in batch.failed], ["broken"])
+        self.assertEqual(batch.failed[0].error, "PNET error")
+        self.assertTrue(batch.results[0].success)
+
+    def test_heartbeat_while_running(self):
+        batch = ProvisioningBatch()
+        batch.add("slow", lambda session_manager: time.sleep(0.3))
+        heartbeat = MagicMock()
+        batch.run(heartbeat=heartbeat, heartbeat_interval=0.05)
+        self.assertGreaterEqual(heartbeat.call_count, 3)
+
+    def test_empty_batch_does_not_open_session(self):
+        self.assertEqual(ProvisioningBatch().run(), [])
+        self.session_manager.__enter__.assert_not_called()
+
+    def test_cleanup_operations_are_throttled(self):
+        batch = ProvisioningBatch()
+        for i in range(6):
+            batch.add(f"delete{i}", self._operation(f"delete{i}"), cleanup=True)
+        batch.run()
+
+        self.assertEqual(len(self.done), 6)
+        self.assertEqual(self.max_active, 2)
+
+    @override_settings(PNET_CLEANUP_RATE=20, PNET_CLEANUP_CONCURRENCY=10)
+    def test_cleanup_rate_limit(self):
+        batch = ProvisioningBatch()
+        for i in range(30):
+            batch.add(f"delete{i}", lambda session_manager: None, cleanup=True)
+        started = time.monotonic()
+        batch.run()
+        # 20 операций сразу, остальные 10 — со скоростью 20 в секунду
+        self.assertGreaterEqual(time.monotonic() - started, 0.45)
+
+
+class RateLimiterTest(SimpleTestCase):
+    def test_burst_then_rate(self):
+        limiter = RateLimiter(rate=50, burst=5)
+        started = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        self.assertLess(time.monotonic() - started, 0.05)
+        for _ in range(10):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+    def test_unlimited(self):
+        limiter = RateLimiter(rate=0)
+        started = time.monotonic()
+        for _ in range(1000):
+            limiter.acquire()
+        self.assertLess(time.monotonic() - started, 0.1)
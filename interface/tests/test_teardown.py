@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from interface import teardown
+from interface.models import Competition, Competition2User, Lab, ProvisioningJob, TeamCompetition, User
+
+
+class TeardownSchedulingTest(TestCase):
+    def setUp(self):
+        self.lab = Lab.objects.create(name="Teardown Lab", platform="PN", slug="teardown-lab")
+        self.user = User.objects.create_user(username="teardown_user", password="pass")
+
+    def _create(self, model=Competition, finish=None, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return model.objects.create(
+                start=timezone.now() - timedelta(hours=1),
+                finish=finish or timezone.now() + timedelta(hours=1),
+                lab=self.lab,
+                **kwargs
+            )
+
+    def _run_date(self, competition):
+        job = teardown.get_job_scheduler().get_job(teardown.teardown_job_id(competition.pk))
+        return job and job.next_run_time.replace(tzinfo=None)
+
+    def test_job_registered_on_create(self):
+        competition = self._create(slug="individual")
+        self.assertEqual(self._run_date(competition), competition.finish + timedelta(minutes=60))
+
+        team_competition = self._create(TeamCompetition, slug="team")
+        self.assertEqual(self._run_date(team_competition), team_competition.finish + timedelta(minutes=10))
+
+    def test_job_moved_when_finish_changes(self):
+        competition = self._create(slug="moved")
+        competition.finish = timezone.now() + timedelta(minutes=15)
+        with self.captureOnCommitCallbacks(execute=True):
+            competition.save()
+        self.assertEqual(self._run_date(competition), competition.finish + timedelta(minutes=60))
+
+    def test_job_removed_on_delete(self):
+        competition = self._create(slug="removed")
+        with self.captureOnCommitCallbacks(execute=True):
+            competition.delete()
+        self.assertIsNone(self._run_date(competition))
+
+    def test_teardown_competition(self):
+        competition = self._create(slug="teardown")
+        issue = Competition2User.objects.create(competition=competition, user=self.user)
+        ProvisioningJob.objects.update(status=ProvisioningJob.Status.DONE)
+
+        # Время ещё не пришло — ничего не удаляем
+        teardown.teardown_competition(competition.pk)
+        issue.refresh_from_db()
+        self.assertFalse(issue.deleted)
+
+        Competition.objects.filter(pk=competition.pk).update(finish=timezone.now() - timedelta(hours=2))
+        teardown.teardown_competition(competition.pk)
+        issue.refresh_from_db()
+        self.assertTrue(issue.deleted)
+        self.assertTrue(Competition.objects.get(pk=competition.pk).deleted)
+        self.assertTrue(ProvisioningJob.objects.filter(idempotency_key=f"lab_delete:c2u:{issue.pk}").exists())
+
+    def test_sweep_cleans_only_overdue_competitions(self):
+        overdue = self._create(slug="overdue")
+        recent = self._create(slug="recent")
+        Competition.objects.filter(pk=overdue.pk).update(finish=timezone.now() - timedelta(hours=2))
+        Competition.objects.filter(pk=recent.pk).update(finish=timezone.now() - timedelta(minutes=30))
+
+        teardown.teardown_sweep()
+        self.assertEqual(list(Competition.objects.filter(deleted=True).values_list('slug', flat=True)), ["overdue"])
@@ -1,7 +1,13 @@
 import hashlib
+import logging
+import threading
+from collections import OrderedDict
 
 from interface.config import get_web_url
 import jinja2
+from jinja2.sandbox import SandboxedEnvironment
+
+logger = logging.getLogger(__name__)
 
 def get_pnet_password(user_password):
     return hashlib.md5((user_password + '42').encode()).hexdigest()[:8]
@@ -41,14 +47,54 @@ def get_kibana_url():
     return 'http:' + get_web_url().split(':')[1] + ':5601'
 
 
+# Описания лаб вводят преподаватели, поэтому шаблоны исполняются в песочнице
+_description_env = SandboxedEnvironment()
+
+DESCRIPTION_TEMPLATE_CACHE_SIZE = 128
+_description_templates = OrderedDict()
+_description_templates_lock = threading.Lock()
+
+
+def get_description_template(lab_id, description):
+    """
+    Скомпилированный шаблон описания лабы.
+
+    Шаблоны хранятся в LRU-кэше процесса по (id лабы, хэш описания),
+    так что изменённое описание компилируется заново.
+    """
+    key = (lab_id, hashlib.blake2b(description.encode(), digest_size=16).digest())
+    with _description_templates_lock:
+        template = _description_templates.get(key)
+        if template is not None:
+            _description_templates.move_to_end(key)
+            return template
+
+    template = _description_env.from_string(description)
+    with _description_templates_lock:
+        _description_templates[key] = template
+        while len(_description_templates) > DESCRIPTION_TEMPLATE_CACHE_SIZE:
+            _description_templates.popitem(last=False)
+    return template
+
+
+def clear_description_templates():
+    with _description_templates_lock:
+        _description_templates.clear()
+
+
 def patch_lab_description(competition, user):
-    if competition.lab.description:
-        template = jinja2.Template(competition.lab.description)
-        competition.lab.description = template.render(
-            username=user.username, 
-            pnet_login=user.pnet_login, 
-            username_uppercase=user.username.upper(), 
-            pnet_login_uppercase=user.pnet_login.upper()
-        )
+    lab = competition.lab
+    if lab.description:
+        try:
+            template = get_description_template(lab.pk, lab.description)
+            lab.description = template.render(
+                username=user.username,
+                pnet_login=user.pnet_login,
+                username_uppercase=user.username.upper(),
+                pnet_login_uppercase=user.pnet_login.upper()
+            )
+        except jinja2.TemplateError as e:
+            # Описание показывается как есть, без подстановок
+            logger.warning("Не удалось отрисовать описание лабы %s: %s", lab.pk, e)
     else:
         return ''
@@ -1,6 +1,5 @@
 from collections import defaultdict
 import datetime
-from time import sleep
 
 from django.views.generic.detail import DetailView
 from django.views.generic.list import ListView
@@ -14,13 +13,14 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
 from django.views.generic import FormView
 
-from interface.pnet_session_manager import ensure_admin_pnet_session
 from interface.serializers import *
 from rest_framework import viewsets
 
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 
 from interface.utils import get_kibana_url, get_pnet_password, patch_lab_description
+from interface.task_status import get_task_status
+from interface import lab_catalogue, progress
 
 
 class LabDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
@@ -46,7 +46,6 @@ class LabDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
         form = SimpleCompetitionForm(request.POST, lab=self.object)
         if form.is_valid():
             competition = form.create_competition()
-            sleep(2)
             return redirect('interface:competition-detail', slug=competition.slug)
         context = self.get_context_data(object=self.object)
         context["simple_form"] = form
@@ -74,38 +73,8 @@ class LabListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        labs = self.get_queryset().order_by('slug', 'lab_type')
-        
-        # Group labs by program
-        programs_data = {}
-        for program_value, program_label in LabProgram.choices:
-            program_labs = labs.filter(program=program_value)
-            bundle_dict = {}
-            
-            for lab in program_labs:
-                slug = lab.slug
-                if slug not in bundle_dict:
-                    bundle_dict[slug] = {LabType.HW: None, LabType.EXAM: None, LabType.PZ: None}
-                bundle_dict[slug][lab.lab_type] = lab
-            
-            lab_bundles = []
-            for slug, labs_by_type in bundle_dict.items():
-                available_labs = [lab for lab in labs_by_type.values() if lab is not None]
-                if available_labs:
-                    covers_with_images = [lab.cover for lab in available_labs if lab.cover]
-                    lab_bundles.append({
-                        "name": available_labs[0].name,
-                        "slug": slug,
-                        "labs": labs_by_type,
-                        "cover": covers_with_images[0] if covers_with_images else None
-                    })
-            
-            programs_data[program_value] = {
-                "label": program_label,
-                "bundles": lab_bundles
-            }
-        
-        context['programs_data'] = programs_data
+        # Лабы сгруппированы по программам и наборам в кэшированном каталоге
+        context['programs_data'] = lab_catalogue.get_catalogue()['programs']
         context['initial_program'] = self.request.GET.get("program", LabProgram.choices[0][0] if LabProgram.choices else None)
         
         return context
@@ -180,6 +149,23 @@ class CompetitionDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView)
             return True
         return competition.start <= timezone.now() <= (competition.finish + datetime.timedelta(minutes=10))
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('lab', 'level')
+
+    def get_object(self, queryset=None):
+        # test_func и DetailView.get запрашивают соревнование дважды
+        if queryset is None and getattr(self, '_competition', None) is not None:
+            return self._competition
+        competition = super().get_object(queryset)
+        if queryset is None:
+            self._competition = competition
+        return competition
+
+    def get_task_status(self):
+        if getattr(self, '_task_status', None) is None:
+            self._task_status = get_task_status(self.object, self.request.user)
+        return self._task_status
+
     def set_submitted(self, context):
         context["form"] = LabAnswerForm()
         context["submitted"] = False
@@ -193,15 +179,7 @@ class CompetitionDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView)
             if not self.request.user.is_staff and competition.finish <= timezone.now():
                 competition.lab.description = ''
             
-            answers = Answers.objects.filter(
-                lab=competition.lab,
-                user=self.request.user,
-                lab_task=None,
-                datetime__lte=competition.finish,
-                datetime__gte=competition.start
-            ).first()
-            
-            if answers is None:
+            if not self.get_task_status()['finished']:
                 answer = self.request.GET.get("answer_flag")
                 if answer:
                     if answer == lab.answer_flag:
@@ -214,8 +192,7 @@ class CompetitionDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView)
                         context["done"] = True
                         competition2user.save()
                         context["submitted"] = True
-                        answer_object = Answers(lab=lab, user=self.request.user, datetime=timezone.now())
-                        answer_object.save()
+                        Answers.mark_finished(competition, user=self.request.user)
                     else:
                         context["form"].fields["answer_flag"].label = "Неверный флаг!"
             else:
@@ -232,37 +209,28 @@ class CompetitionDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView)
         context = self.set_submitted(context)
 
         if self.request.user.is_staff:
-            solutions = Answers.objects.filter(
+            # Сама таблица результатов загружается через API, шаблону нужен только признак наличия ответов
+            context["solutions"] = Answers.objects.filter(
                 lab=competition.lab,
                 user__platoon__in=competition.platoons.all(),
                 datetime__lte=competition.finish,
                 datetime__gte=competition.start
-            ).order_by('datetime').values()
-            context["solutions"] = solutions
+            ).exists()
 
         if self.request.user.is_authenticated:
-            try:
-                competition2user = Competition2User.objects.get(competition=competition, user=self.request.user)
-                assigned_tasks = list(competition2user.tasks.all())
+            status = self.get_task_status()
+            if status['issue']:
+                done_task_ids = set(status['done_task_ids'])
+                assigned_tasks = list(LabTask.objects.filter(pk__in=status['task_ids']).order_by('pk'))
                 for task in assigned_tasks:
-                    if Answers.objects.filter(
-                        lab=competition.lab,
-                        user=self.request.user,
-                        lab_task=task,
-                        datetime__lte=competition.finish,
-                        datetime__gte=competition.start
-                    ).exists():
-                        task.done = True
-                    else:
-                        task.done = False
-            except Competition2User.DoesNotExist:
-                if self.request.user.is_staff:
-                    assigned_tasks = list(competition.tasks.all())
-                    # Для супер-юзеров показываем статус всех заданий
-                    for task in assigned_tasks:
-                        task.done = False
-                else:
-                    assigned_tasks = []
+                    task.done = task.pk in done_task_ids
+            elif self.request.user.is_staff:
+                assigned_tasks = list(competition.tasks.all())
+                # Для супер-юзеров показываем статус всех заданий
+                for task in assigned_tasks:
+                    task.done = False
+            else:
+                assigned_tasks = []
 
             context["assigned_tasks"] = assigned_tasks
 
@@ -310,8 +278,7 @@ class TeamCompetitionDetailView(CompetitionDetailView):
                 if answer_flag:
                     if answer_flag == lab.answer_flag:
                         # Create an Answer with the team field set.
-                        answer_object = Answers(lab=lab, team=self.team_relation.team, datetime=timezone.now())
-                        answer_object.save()
+                        Answers.mark_finished(competition, team=self.team_relation.team)
                         context["submitted"] = True
                     else:
                         # Optionally, you can change the form field label to notify about an incorrect flag.
@@ -326,8 +293,8 @@ class TeamCompetitionDetailView(CompetitionDetailView):
         return context
 
     def get_context_data(self, **kwargs):
+        # set_submitted уже вызван из CompetitionDetailView.get_context_data
         context = super().get_context_data(**kwargs)
-        context = self.set_submitted(context)
         if context.get("assigned_tasks", []) == [] and self.team_relation:
             context["assigned_tasks"] = self.team_relation.tasks.all()
         context["is_team_competition"] = True
@@ -345,7 +312,6 @@ class CreateKkzView(LoginRequiredMixin, UserPassesTestMixin, FormView):
 
     def form_valid(self, form):
         kkz = form.create_kkz()
-        sleep(5)
         return redirect('interface:competition-list')
 
     def get_context_data(self, **kwargs):
@@ -373,7 +339,6 @@ class CreateKkzFromLabView(LoginRequiredMixin, UserPassesTestMixin, FormView):
 
     def form_valid(self, form):
         kkz = form.create_kkz()
-        sleep(5)
         return redirect('interface:competition-list')
 
     def get_context_data(self, **kwargs):
@@ -396,10 +361,10 @@ class PlatoonDetailView(LoginRequiredMixin, DetailView, UserPassesTestMixin):  #
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["now"] = timezone.now()
-        user_list = User.objects.filter(platoon=context["platoon"]).exclude(username="admin")
-        context["user_list"] = user_list
+        context["user_list"] = progress.platoon_users_progress(context["platoon"])
+        context["progress"] = progress.platoon_progress(context["platoon"].pk)
         competitions = {}
-        comps = Competition.objects.filter(platoons=context["platoon"])
+        comps = Competition.objects.filter(platoons=context["platoon"]).select_related('lab')
         for comp in comps:
             if (comp.finish - timezone.now()).seconds < 0:
                 competitions[comp] = False
@@ -420,34 +385,15 @@ class PlatoonListView(LoginRequiredMixin, ListView, UserPassesTestMixin):  # pra
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        platoons_progress = {}
-        for platoon in context["object_list"]:
-            if platoon.number != 0:
-                platoons_progress[platoon] = PlatoonListView.get_platoon_progress(platoon)
-
-        context["object_list"] = platoons_progress
+        report = progress.get_report()
+        context["object_list"] = {
+            platoon: progress.platoon_progress(platoon.pk, report)
+            for platoon in context["object_list"]
+            if platoon.number != 0
+        }
         logging.debug(context)
         return context
 
-    @staticmethod
-    def get_platoon_progress(platoon):
-        progress_dict = {"total": 0, "submitted": 0, "progress": 0}
-        user_list = User.objects.filter(platoon=platoon).exclude(username="admin")
-        for user in user_list:
-            progress_dict["total"] += Competition2User.objects.filter(user=user).count()
-            progress_dict["submitted"] += (
-                Answers.objects.filter(user=user)
-                .values("lab")
-                .distinct()
-                .count()
-            )
-        if progress_dict["total"] == 0:
-            progress_dict["progress"] = 0
-        else:
-            progress_dict["progress"] += int((progress_dict["submitted"] / progress_dict["total"]) * 100)
-
-        return progress_dict
-
 
 class UserDetailView(LoginRequiredMixin, DetailView, UserPassesTestMixin):  # pragma: no cover
     model = User
@@ -460,22 +406,8 @@ class UserDetailView(LoginRequiredMixin, DetailView, UserPassesTestMixin):  # pr
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["user"] = User.objects.filter(username="admin").first()
-        issues = Competition2User.objects.filter(user=context["object"])
-        object_list = issues
-        context["object_list"] = object_list
-        total = len(issues)
-        context["total"] = total
-        context["submitted"] = (
-            Answers.objects.filter(user=context["object"])
-            .values("lab")
-            .distinct()
-            .count()
-        )
-        if total == 0:
-            progress = 100
-        else:
-            progress = int((context["submitted"] / total) * 100)
-        context["progress"] = progress
+        context["object_list"] = Competition2User.objects.filter(user=context["object"]).select_related('competition__lab')
+        context.update(progress.user_progress(context["object"].pk))
         logging.debug(context)
         return context
 
@@ -519,9 +451,11 @@ def change_password(request):  # pragma: no cover
             user.save()
             login(request, user)
 
-            session_manager = ensure_admin_pnet_session()
-            with session_manager:             
-                session_manager.change_user_password(user.pnet_login, user.pnet_password)
+            ProvisioningJob.enqueue(
+                ProvisioningJob.Kind.PASSWORD_CHANGE,
+                f"password:{user.pk}:{timezone.now().timestamp()}",
+                {"user_id": user.pk},
+            )
 
             return redirect('/cyberpolygon/competitions')
         else: